@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Time the situational awareness reports of pymisp.tools.analytics on a synthetic dataset, and compare the tags
+over time report with the row by row approach of examples/situational-awareness on a sample of the events.
+
+    python benchmarks/bench_analytics.py --attributes 1000000
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy
+import pandas
+
+from pymisp.tools import analytics
+
+CATEGORIES = {'Network activity': ['ip-dst', 'ip-src', 'domain', 'hostname', 'url'],
+              'Payload delivery': ['md5', 'sha1', 'sha256', 'filename', 'email-src'],
+              'External analysis': ['link', 'comment', 'text']}
+TAXONOMIES = ['tlp', 'admiralty-scale', 'osint', 'veris', 'circl', 'misp-galaxy']
+
+
+def generate(nb_attributes, attributes_per_event, nb_tags, days, end):
+    """Tables in the format of pymisp.tools.columnar.EventTables.to_pandas()"""
+    nb_events = max(1, nb_attributes // attributes_per_event)
+    rng = numpy.random.RandomState(42)
+    dates = numpy.datetime64(end, 'D') - rng.randint(0, days, nb_events).astype('timedelta64[D]')
+    events = pandas.DataFrame({'event_key': numpy.arange(nb_events), 'date': dates})
+    names = ['{}:tag-{}'.format(TAXONOMIES[i % len(TAXONOMIES)], i) if i % 5 else 'free-tag-{}'.format(i) for i in range(nb_tags)]
+    tags = pandas.DataFrame({'tag_key': numpy.arange(nb_tags), 'name': names,
+                             'colour': ['#{:06x}'.format(i * 9973 % 0xffffff) for i in range(nb_tags)]})
+    tags_per_event = rng.randint(0, 6, nb_events)
+    event_tags = pandas.DataFrame({'event_key': numpy.repeat(numpy.arange(nb_events), tags_per_event),
+                                   'tag_key': rng.randint(0, nb_tags, tags_per_event.sum())})
+    event_tags = event_tags.drop_duplicates()
+    pairs = [(category, t) for category, types in CATEGORIES.items() for t in types]
+    chosen = rng.randint(0, len(pairs), nb_attributes)
+    attributes = pandas.DataFrame({'attribute_key': numpy.arange(nb_attributes),
+                                   'event_key': rng.randint(0, nb_events, nb_attributes),
+                                   'category': pandas.Categorical([pairs[i][0] for i in chosen]),
+                                   'type': pandas.Categorical([pairs[i][1] for i in chosen])})
+    return {'events': events, 'tags': tags, 'event_tags': event_tags, 'attributes': attributes,
+            'attribute_tags': pandas.DataFrame({'attribute_key': numpy.zeros(0, dtype=int), 'tag_key': numpy.zeros(0, dtype=int)})}
+
+
+def row_by_row_tags_over_time(tables, periods, days, end):
+    """Same approach as tags_to_graphs.py: select the events of each period by iterating over the rows,
+    count their tags, and concatenate the per period counts"""
+    events = tables['events']
+    names = tables['tags'].set_index('tag_key')['name']
+    event_tags = tables['event_tags'].groupby('event_key')['tag_key'].apply(list).to_dict()
+    columns = []
+    for p in range(periods - 1, -1, -1):
+        period_end = end - timedelta(days=days * p)
+        period_begin = period_end - timedelta(days=days)
+        counts = {}
+        for _, event in events.iterrows():
+            if period_begin < event['date'].date() <= period_end:
+                for tag_key in event_tags.get(event['event_key'], []):
+                    counts[names[tag_key]] = counts.get(names[tag_key], 0) + 1
+        columns.append(pandas.Series(counts, name=str(period_end)))
+    return pandas.concat(columns, axis=1).fillna(0)
+
+
+def timed(name, func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    print('{:<28} {:>8.3f}s'.format(name, time.time() - start))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the situational awareness reports.')
+    parser.add_argument('--attributes', type=int, default=1000000, help='Amount of attributes.')
+    parser.add_argument('--attributes-per-event', type=int, default=50, help='Average amount of attributes per event.')
+    parser.add_argument('--tags', type=int, default=500, help='Amount of distinct tags.')
+    parser.add_argument('--days', type=int, default=360, help='Time span of the events, in days.')
+    parser.add_argument('--sample', type=int, default=2000, help='Amount of events for the row by row comparison (0 to skip).')
+    args = parser.parse_args()
+
+    end = date.today()
+    tables = timed('generate', generate, args.attributes, args.attributes_per_event, args.tags, args.days, end)
+    print('{} events, {} attributes, {} event tags'.format(len(tables['events']), len(tables['attributes']),
+                                                           len(tables['event_tags'])))
+    taxonomies = TAXONOMIES
+    timed('select_in_range', analytics.select_in_range, tables['events'], end - timedelta(days=28), end)
+    counts = timed('tag_counts', analytics.tag_counts, tables)
+    timed('tag_colours', analytics.tag_colours, tables)
+    over_time = timed('tag_counts_over_time', analytics.tag_counts_over_time, tables, 12, 30, end)
+    timed('linear_trend', analytics.linear_trend, over_time)
+    timed('taxonomy_breakdown', analytics.taxonomy_breakdown, counts.to_frame(), taxonomies)
+    timed('attribute_type_counts', analytics.attribute_type_counts, tables)
+    timed('tags_per_event', analytics.tags_per_event, tables, end - timedelta(days=args.days), end, 7)
+
+    if args.sample:
+        sample_events = tables['events'].iloc[:args.sample]
+        sample = dict(tables, events=sample_events,
+                      event_tags=tables['event_tags'][tables['event_tags']['event_key'] < len(sample_events)])
+        print('Comparison on {} events (12 periods of 30 days):'.format(len(sample_events)))
+        vectorized = timed('  vectorized', analytics.tag_counts_over_time, sample, 12, 30, end)
+        row_by_row = timed('  row by row', row_by_row_tags_over_time, sample, 12, 30, end)
+        row_by_row = row_by_row.reindex(index=vectorized.index, columns=vectorized.columns).fillna(0)
+        if not (row_by_row.values == vectorized.values).all():
+            print('Warning: the results are different.')
+
+
+if __name__ == '__main__':
+    main()
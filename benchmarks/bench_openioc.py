@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the BeautifulSoup and the streaming OpenIOC importers on a synthetic document.
+
+    python benchmarks/bench_openioc.py --items 50000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+try:
+    import resource
+    has_resource = True
+except ImportError:
+    has_resource = False
+
+from pymisp.tools import openioc
+
+ITEM = '''    <IndicatorItem id="{id}" condition="is">
+      <Context document="{document}" search="{search}" type="mir"/>
+      <Content type="string">{value}</Content>
+    </IndicatorItem>
+'''
+
+SIMPLE_SEARCHES = [('FileItem', 'FileItem/Md5sum', lambda i: '{:032x}'.format(i)),
+                   ('Network', 'Network/DNS', lambda i: 'host{}.example.com'.format(i)),
+                   ('PortItem', 'PortItem/remoteIP', lambda i: '10.{}.{}.{}'.format(i >> 16 & 255, i >> 8 & 255, i & 255)),
+                   ('FileItem', 'FileItem/FileName', lambda i: 'sample{}.exe'.format(i))]
+
+
+def generate(path, items):
+    """Write an OpenIOC document with about `items` indicator items, 1/10 of them in composite AND blocks"""
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="us-ascii"?>\n')
+        f.write('<ioc xmlns="http://schemas.mandiant.com/2010/ioc" id="bench">\n')
+        f.write('  <short_description>Synthetic IOC</short_description>\n')
+        f.write('  <authored_by>bench</authored_by>\n  <authored_date>2017-01-01T00:00:00</authored_date>\n')
+        f.write('  <definition>\n  <Indicator operator="OR" id="root">\n')
+        i = 0
+        while i < items:
+            if i % 20 == 0:
+                f.write('   <Indicator operator="AND" id="and{}">\n'.format(i))
+                f.write(ITEM.format(id=i, document='FileItem', search='FileItem/FileName', value='composite{}.dll'.format(i)))
+                f.write(ITEM.format(id=i + 1, document='FileItem', search='FileItem/Md5sum', value='{:032x}'.format(i)))
+                f.write('   </Indicator>\n')
+                i += 2
+                continue
+            document, search, value = random.choice(SIMPLE_SEARCHES)
+            f.write(ITEM.format(id=i, document=document, search=search, value=value(i)))
+            i += 1
+        f.write('  </Indicator>\n  </definition>\n</ioc>\n')
+
+
+def run(name, func, path):
+    start = time.time()
+    event = func(path)
+    duration = time.time() - start
+    print('{:<10} {:>8.2f}s {:>8} attributes'.format(name, duration, len(event.attributes)))
+    return event
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the OpenIOC importers.')
+    parser.add_argument('--items', type=int, default=50000, help='Amount of indicator items.')
+    parser.add_argument('--skip-bs4', action='store_true', help="Don't run the BeautifulSoup importer (slow).")
+    args = parser.parse_args()
+
+    random.seed(42)
+    fd, path = tempfile.mkstemp(suffix='.ioc')
+    os.close(fd)
+    try:
+        generate(path, args.items)
+        print('Document: {} items, {:.1f}MB'.format(args.items, os.path.getsize(path) / 1024. / 1024.))
+        start = time.time()
+        with open(path, 'rb') as f:
+            parsed = sum(1 for kind, _ in openioc.iter_openioc(f) if kind == 'attribute')
+        print('{:<10} {:>8.2f}s {:>8} attributes (parser only, no MISPEvent)'.format('iter', time.time() - start, parsed))
+        if has_resource:
+            print('Max RSS after parsing: {:.1f}MB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.))
+        streamed = run('streaming', lambda p: openioc.load_openioc_file(p, streaming=True), path)
+        if has_resource:
+            print('Max RSS after streaming: {:.1f}MB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.))
+        if not args.skip_bs4 and openioc.has_bs4:
+            soup = run('bs4', openioc.load_openioc_file, path)
+            if sorted((a.type, a.value) for a in soup.attributes) != sorted((a.type, a.value) for a in streamed.attributes):
+                print('Warning: the importers returned different attributes.')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
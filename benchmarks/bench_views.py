@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Iteration over the attributes of a large search result: plain dictionaries, read-only views
+(pymisp.mispview), MISPEvent(lazy=True).attribute_fields() and MISPEvent (on a sample, extrapolated).
+
+    python benchmarks/bench_views.py --attributes 1000000
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generators  # noqa: E402
+from pymisp import MISPEvent, view_events  # noqa: E402
+
+
+def search_result(nb_attributes, attributes_per_event):
+    """Search result ({'response': [{'Event': ...}]}). The events share the same attributes."""
+    event = generators.make_event_dict(attributes=attributes_per_event, objects=0, attribute_tags=1)['Event']
+    return {'response': [{'Event': dict(event, id=str(i + 1))} for i in range(max(1, nb_attributes // attributes_per_event))]}
+
+
+def iterate_dicts(result):
+    count = 0
+    for entry in result['response']:
+        for attribute in entry['Event']['Attribute']:
+            if attribute['to_ids'] and attribute['type'] and attribute['value']:
+                count += len([t['name'] for t in attribute.get('Tag', [])])
+    return count
+
+
+def iterate_views(result):
+    count = 0
+    for event in view_events(result):
+        for attribute in event.attributes:
+            if attribute.to_ids and attribute.type and attribute.value:
+                count += len([t.name for t in attribute.tags])
+    return count
+
+
+def iterate_fields(result):
+    count = 0
+    for entry in result['response']:
+        event = MISPEvent(lazy=True)
+        event.from_dict(**entry['Event'])
+        for attribute in event.attribute_fields():
+            if attribute.to_ids and attribute.type and attribute.value:
+                count += len(attribute.tags)
+    return count
+
+
+def iterate_events(result):
+    count = 0
+    for entry in result['response']:
+        event = MISPEvent()
+        event.load(json.loads(json.dumps(entry)))
+        for attribute in event.attributes:
+            if attribute.to_ids and attribute.type and attribute.value:
+                count += len([t.name for t in attribute.tags])
+    return count
+
+
+def timed(name, func, result, factor=1):
+    start = time.time()
+    count = func(result)
+    duration = (time.time() - start) * factor
+    print('{:<28} {:>9.3f}s{}'.format(name, duration, ' (extrapolated)' if factor != 1 else ''))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the iteration over a large search result.')
+    parser.add_argument('--attributes', type=int, default=1000000, help='Amount of attributes.')
+    parser.add_argument('--attributes-per-event', type=int, default=1000, help='Amount of attributes per event.')
+    parser.add_argument('--sample', type=int, default=2, help='Amount of events loaded as MISPEvent (0 to skip).')
+    args = parser.parse_args()
+
+    logging.getLogger('pymisp').setLevel(logging.CRITICAL)
+    result = search_result(args.attributes, args.attributes_per_event)
+    events = len(result['response'])
+    print('{} events, {} attributes'.format(events, events * args.attributes_per_event))
+    expected = timed('dictionaries', iterate_dicts, result)
+    if timed('views', iterate_views, result) != expected:
+        print('Warning: the results of the views are different.')
+    if timed('lazy attribute_fields', iterate_fields, result) != expected:
+        print('Warning: the results of attribute_fields are different.')
+    if args.sample:
+        sample = {'response': result['response'][:args.sample]}
+        timed('MISPEvent', iterate_events, sample, events / float(len(sample['response'])))
+
+
+if __name__ == '__main__':
+    main()
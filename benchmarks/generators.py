@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Synthetic data for the benchmarks: events of a configurable shape, object templates and binaries."""
+
+import json
+import os
+import random
+import struct
+import uuid
+
+from pymisp import MISPEvent
+
+# (category, type, value generator)
+ATTRIBUTE_TYPES = [('Network activity', 'ip-dst', lambda r, i: '10.{}.{}.{}'.format(i >> 16 & 255, i >> 8 & 255, i & 255)),
+                   ('Network activity', 'domain', lambda r, i: 'host{}.example.com'.format(i)),
+                   ('Network activity', 'url', lambda r, i: 'http://host{}.example.com/{}'.format(i, r.randint(0, 10 ** 6))),
+                   ('Payload delivery', 'md5', lambda r, i: '{:032x}'.format(r.getrandbits(128))),
+                   ('Payload delivery', 'sha256', lambda r, i: '{:064x}'.format(r.getrandbits(256))),
+                   ('Payload delivery', 'filename', lambda r, i: 'sample{}.exe'.format(i)),
+                   ('External analysis', 'text', lambda r, i: 'Comment number {}'.format(i))]
+
+TAGS = ['tlp:white', 'tlp:green', 'tlp:amber', 'osint:source-type="blog-post"', 'circl:incident-classification="malware"',
+        'misp-galaxy:threat-actor="Sofacy"', 'veris:action:malware:variety="Ransomware"', 'admiralty-scale:source-reliability="a"']
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _attribute(rng, i, timestamp, tags, object_relation=None):
+    category, attribute_type, value = ATTRIBUTE_TYPES[i % len(ATTRIBUTE_TYPES)]
+    attribute = {'id': str(i + 1), 'uuid': _uuid(rng), 'type': attribute_type, 'category': category,
+                 'value': value(rng, i), 'to_ids': i % 3 == 0, 'distribution': '5', 'timestamp': str(timestamp),
+                 'comment': '', 'deleted': False, 'disable_correlation': False}
+    if object_relation:
+        attribute['object_relation'] = object_relation
+    if tags:
+        attribute['Tag'] = [{'name': name, 'colour': '#ffffff'} for name in rng.sample(TAGS, tags)]
+    return attribute
+
+
+def make_event_dict(attributes=100, objects=10, attributes_per_object=5, tags=3, attribute_tags=0, references=1, seed=0):
+    """Event as returned by the API ({'Event': {...}}).
+    :attributes: Amount of attributes directly in the event
+    :objects: Amount of objects, each with attributes_per_object attributes
+    :tags: Amount of tags on the event
+    :attribute_tags: Amount of tags on each attribute
+    :references: Amount of references from each object to the previous objects (nesting)
+    """
+    rng = random.Random(seed)
+    timestamp = 1500000000 + seed
+    event = {'id': str(seed + 1), 'uuid': _uuid(rng), 'info': 'Synthetic event {}'.format(seed), 'date': '2017-12-01',
+             'timestamp': str(timestamp), 'published': False, 'analysis': '1', 'threat_level_id': '3', 'distribution': '1',
+             'Orgc': {'id': '1', 'name': 'ORGNAME', 'uuid': '5762d6e2-4c1c-4e15-8a4e-1a6ec0a83866'},
+             'Tag': [{'name': name, 'colour': '#ffffff'} for name in rng.sample(TAGS, min(tags, len(TAGS)))],
+             'Attribute': [], 'Object': []}
+    counter = 0
+    for _ in range(attributes):
+        event['Attribute'].append(_attribute(rng, counter, timestamp, attribute_tags))
+        counter += 1
+    for o in range(objects):
+        obj = {'id': str(o + 1), 'uuid': _uuid(rng), 'name': 'bench-object', 'meta-category': 'network',
+               'template_uuid': '00000000-0000-4000-8000-000000000000', 'template_version': '1', 'description': 'Synthetic',
+               'distribution': '5', 'timestamp': str(timestamp), 'Attribute': [], 'ObjectReference': []}
+        for a in range(attributes_per_object):
+            obj['Attribute'].append(_attribute(rng, counter, timestamp, attribute_tags, 'relation-{}'.format(a)))
+            counter += 1
+        for previous in event['Object'][-references:] if references else []:
+            obj['ObjectReference'].append({'uuid': _uuid(rng), 'object_uuid': obj['uuid'],
+                                           'referenced_uuid': previous['uuid'], 'relationship_type': 'related-to'})
+        event['Object'].append(obj)
+    return {'Event': event}
+
+
+def make_event(**kwargs):
+    """MISPEvent loaded from make_event_dict(**kwargs)"""
+    event = MISPEvent()
+    event.load(make_event_dict(**kwargs))
+    return event
+
+
+def write_object_template(directory, name='bench-object', relations=10):
+    """Write a synthetic object template (directory/name/definition.json), usable with misp_objects_path_custom"""
+    attributes = {}
+    for i in range(relations):
+        category, attribute_type, _ = ATTRIBUTE_TYPES[i % len(ATTRIBUTE_TYPES)]
+        attributes['relation-{}'.format(i)] = {'misp-attribute': attribute_type, 'categories': [category],
+                                               'ui-priority': 1, 'description': 'Relation {}'.format(i)}
+    definition = {'name': name, 'meta-category': 'network', 'description': 'Synthetic template',
+                  'uuid': '00000000-0000-4000-8000-000000000000', 'version': 1,
+                  'attributes': attributes, 'requiredOneOf': list(attributes.keys())[:1]}
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    with open(os.path.join(path, 'definition.json'), 'w') as f:
+        json.dump(definition, f)
+    return directory
+
+
+def make_elf(size=64 * 1024, seed=0):
+    """Minimal ELF64 (x86-64) executable: headers, one PT_LOAD segment and `size` bytes of pseudo-random code"""
+    rng = random.Random(seed)
+    code = bytes(bytearray(rng.getrandbits(8) for _ in range(size)))
+    base, header_size, phdr_size = 0x400000, 64, 56
+    entry = base + header_size + phdr_size
+    ehdr = struct.pack('<4sBBBBB7xHHIQQQIHHHHHH', b'\x7fELF', 2, 1, 1, 0, 0, 2, 0x3e, 1, entry, header_size, 0, 0,
+                       header_size, phdr_size, 1, 64, 0, 0)
+    total = header_size + phdr_size + len(code)
+    phdr = struct.pack('<IIQQQQQQ', 1, 5, 0, base, base, total, total, 0x1000)
+    return ehdr + phdr + code
+
+
+def make_pe(size=64 * 1024, seed=0):
+    """Minimal PE32 executable: DOS header, PE headers, one .text section with `size` bytes of pseudo-random code"""
+    rng = random.Random(seed)
+    file_alignment, section_alignment = 0x200, 0x1000
+    raw_size = (size + file_alignment - 1) // file_alignment * file_alignment
+    image_size = section_alignment + (size + section_alignment - 1) // section_alignment * section_alignment
+    code = bytes(bytearray(rng.getrandbits(8) for _ in range(size))) + b'\x00' * (raw_size - size)
+    dos = b'MZ' + b'\x00' * 58 + struct.pack('<I', 64)
+    coff = struct.pack('<4sHHIIIHH', b'PE\x00\x00', 0x14c, 1, 0, 0, 0, 224, 0x0102)
+    optional = struct.pack('<HBBIIIIIIIIIHHHHHHIIIIHHIIIIII', 0x10b, 14, 0, raw_size, 0, 0, section_alignment,
+                           section_alignment, 0, 0x400000, section_alignment, file_alignment, 6, 0, 0, 0, 6, 0, 0,
+                           image_size, file_alignment, 0, 3, 0, 0x100000, 0x1000, 0x100000, 0x1000, 0, 16)
+    optional += b'\x00' * (8 * 16)
+    section = struct.pack('<8sIIIIIIHHI', b'.text', size, section_alignment, raw_size, file_alignment, 0, 0, 0, 0, 0x60000020)
+    headers = dos + coff + optional + section
+    return headers + b'\x00' * (file_alignment - len(headers)) + code
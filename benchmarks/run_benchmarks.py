@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of the core model and of the client, with stored baselines.
+
+    python benchmarks/run_benchmarks.py                      # run all, compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py -k search --quick    # subset, small shapes
+    python benchmarks/run_benchmarks.py --save               # store the results as the new baseline
+
+Each benchmark is timed `repeat` times after a warmup, the median is compared with the baseline and the
+benchmarks slower than the baseline by more than the threshold are reported (exit code 1 with --strict).
+The client benchmarks run against tests/misp_stub_server.py, so no MISP instance is needed.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generators  # noqa: E402
+from pymisp import MISPEvent, MISPObject, PyMISP, __version__  # noqa: E402
+from pymisp.tools import make_binary_objects  # noqa: E402
+from pymisp.tools.event_diff import diff_events  # noqa: E402
+from pymisp.tools.ioc_filter import IOCFilters  # noqa: E402
+from pymisp.tools.ioc_matcher import IOCMatcher  # noqa: E402
+from pymisp.tools.log_sightings import LogSightingPipeline  # noqa: E402
+from pymisp.tools.sighting_buffer import SightingBuffer  # noqa: E402
+from tests.misp_stub_server import MISPStubServer  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+BENCHMARKS = []
+
+
+class Skip(Exception):
+    pass
+
+
+def benchmark(name, operations=1):
+    """Register a benchmark. The decorated function gets the shape (dictionary) and returns the callable to time.
+    :operations: amount of operations done by one call, used to report the throughput"""
+    def decorator(func):
+        BENCHMARKS.append((name, func, operations))
+        return func
+    return decorator
+
+
+# ### Model ###
+
+@benchmark('event.load')
+def bench_load(shape):
+    data = json.dumps(generators.make_event_dict(**shape['event']))
+
+    def run():
+        MISPEvent().load(data)
+    return run
+
+
+@benchmark('event.load.lazy')
+def bench_load_lazy(shape):
+    data = json.dumps(generators.make_event_dict(**shape['event']))
+
+    def run():
+        MISPEvent(lazy=True).load(data)
+    return run
+
+
+@benchmark('event.attribute_fields')
+def bench_attribute_fields(shape):
+    data = generators.make_event_dict(**shape['event'])['Event']
+
+    def run():
+        event = MISPEvent(lazy=True)
+        event.from_dict(**json.loads(json.dumps(data)))
+        for fields in event.attribute_fields():
+            fields.value
+    return run
+
+
+@benchmark('event.from_dict')
+def bench_from_dict(shape):
+    data = generators.make_event_dict(**shape['event'])['Event']
+
+    def run():
+        MISPEvent().from_dict(**json.loads(json.dumps(data)))
+    return run
+
+
+@benchmark('event.to_dict')
+def bench_to_dict(shape):
+    event = generators.make_event(**shape['event'])
+    return event.to_dict
+
+
+@benchmark('event.to_json')
+def bench_to_json(shape):
+    event = generators.make_event(**shape['event'])
+    return event.to_json
+
+
+@benchmark('event.diff')
+def bench_diff(shape):
+    old = generators.make_event(**shape['event'])
+    new = generators.make_event(**shape['event'])
+    for attribute in new.attributes[::10]:
+        attribute.comment = 'Modified'
+
+    def run():
+        diff_events(old, new)
+    return run
+
+
+@benchmark('ioc_matcher.match', operations=10000)
+def bench_ioc_matcher(shape):
+    event = generators.make_event_dict(**shape['event'])
+    matcher = IOCMatcher(events=[event])
+    # A value in 10 is an indicator of the event, the others are IPs, hostnames and URLs without match
+    values = [a['value'] for a in event['Event']['Attribute']]
+    observed = []
+    for i in range(10000):
+        if i % 10 == 0:
+            observed.append(values[i % len(values)])
+        elif i % 3 == 0:
+            observed.append('172.{}.{}.{}'.format(i >> 16, (i >> 8) & 255, i & 255))
+        elif i % 3 == 1:
+            observed.append('host{}.example.org'.format(i))
+        else:
+            observed.append('https://host{}.example.org/index.html'.format(i))
+
+    def run():
+        matcher.match(observed)
+    return run
+
+
+@benchmark('ioc_filter.lookup', operations=10000)
+def bench_ioc_filter(shape):
+    event = generators.make_event_dict(**shape['event'])
+    filters = IOCFilters.from_events([event])
+    values = [a['value'] for a in event['Event']['Attribute']]
+    observed = [values[i % len(values)] if i % 10 == 0 else 'host{}.example.org'.format(i) for i in range(10000)]
+
+    def run():
+        for value in observed:
+            filters.lookup(value)
+    return run
+
+
+@benchmark('log_sightings.process', operations=10000)
+def bench_log_sightings(shape):
+    event = generators.make_event_dict(**shape['event'])
+    matcher = IOCMatcher(events=[event])
+    values = [a['value'] for a in event['Event']['Attribute']]
+    # Proxy log lines, one in 100 contains an indicator of the event
+    lines = ['2018-01-01 12:00:00 172.16.{}.{} GET https://host{}.example.org/index.html 200 {}\n'.format(
+             (i >> 8) & 255, i & 255, i, values[i % len(values)] if i % 100 == 0 else '-') for i in range(10000)]
+
+    def run():
+        LogSightingPipeline(matcher).process_lines(lines)
+    return run
+
+
+@benchmark('event.add_attribute', operations=1000)
+def bench_add_attribute(shape):
+    def run():
+        event = MISPEvent()
+        for i in range(1000):
+            event.add_attribute('ip-dst', '10.0.{}.{}'.format(i >> 8, i & 255), to_ids=True)
+    return run
+
+
+@benchmark('event.add_attributes.deduplicate', operations=1000)
+def bench_add_attributes(shape):
+    # Half of the values are duplicates
+    attributes = [{'type': 'ip-dst', 'value': '10.0.{}.{}'.format(i >> 9, (i >> 1) & 255), 'to_ids': True} for i in range(1000)]
+
+    def run():
+        MISPEvent().add_attributes(attributes)
+    return run
+
+
+@benchmark('object.create', operations=100)
+def bench_object(shape):
+    relations = shape['object_relations']
+    templates = tempfile.mkdtemp()
+    generators.write_object_template(templates, relations=relations)
+    values = [(generators.ATTRIBUTE_TYPES[i % len(generators.ATTRIBUTE_TYPES)][1], 'value{}'.format(i)) for i in range(relations)]
+
+    def run():
+        for _ in range(100):
+            obj = MISPObject('bench-object', strict=True, misp_objects_path_custom=templates)
+            for i, (attribute_type, value) in enumerate(values):
+                obj.add_attribute('relation-{}'.format(i), value=value)
+            obj.to_dict()
+    run.cleanup = lambda: shutil.rmtree(templates)
+    return run
+
+
+def _binary_benchmark(make_binary, filename):
+    def setup(shape):
+        data = make_binary(shape['binary_size'])
+        try:
+            make_binary_objects(pseudofile=BytesIO(data), filename=filename)
+        except Exception as e:
+            raise Skip('make_binary_objects unavailable: {}'.format(e))
+
+        def run():
+            make_binary_objects(pseudofile=BytesIO(data), filename=filename)
+        return run
+    return setup
+
+
+benchmark('make_binary_objects.pe')(_binary_benchmark(generators.make_pe, 'bench.exe'))
+benchmark('make_binary_objects.elf')(_binary_benchmark(generators.make_elf, 'bench.elf'))
+
+
+# ### Client ###
+
+def _client(shape):
+    server = MISPStubServer(latency=shape['latency']).start()
+    server.load_events(generators.make_event_dict(seed=i, **shape['event']) for i in range(shape['events']))
+    misp = PyMISP(server.url, server.key)
+    return server, misp
+
+
+@benchmark('client.get_event')
+def bench_get_event(shape):
+    server, misp = _client(shape)
+
+    def run():
+        misp.get_event(1)
+    run.cleanup = server.stop
+    return run
+
+
+@benchmark('client.search')
+def bench_search(shape):
+    server, misp = _client(shape)
+    value = generators.make_event_dict(seed=0, **shape['event'])['Event']['Attribute'][0]['value']
+
+    def run():
+        misp.search(values=value)
+    run.cleanup = server.stop
+    return run
+
+
+@benchmark('client.search_attributes')
+def bench_search_attributes(shape):
+    server, misp = _client(shape)
+
+    def run():
+        misp.search(controller='attributes', type_attribute='ip-dst')
+    run.cleanup = server.stop
+    return run
+
+
+@benchmark('client.sighting_buffer', operations=10000)
+def bench_sighting_buffer(shape):
+    server, misp = _client(shape)
+    values = [a['value'] for a in generators.make_event_dict(seed=0, **shape['event'])['Event']['Attribute'][:100]]
+
+    def run():
+        # 10000 sightings of 100 values, sent in one request
+        sightings = SightingBuffer(misp, start=False)
+        for i in range(10000):
+            sightings.add(value=values[i % len(values)], source='benchmark', timestamp=1500000000)
+        sightings.flush()
+    run.cleanup = server.stop
+    return run
+
+
+SHAPES = {
+    'default': {'event': {'attributes': 500, 'objects': 50, 'attributes_per_object': 5, 'tags': 3, 'attribute_tags': 1,
+                          'references': 1},
+                'object_relations': 10, 'binary_size': 256 * 1024, 'events': 20, 'latency': 0, 'repeat': 7},
+    'quick': {'event': {'attributes': 50, 'objects': 5, 'attributes_per_object': 5, 'tags': 3, 'attribute_tags': 1,
+                        'references': 1},
+              'object_relations': 10, 'binary_size': 16 * 1024, 'events': 5, 'latency': 0, 'repeat': 3},
+}
+
+
+def run_benchmark(func, shape, operations):
+    run = func(shape)
+    try:
+        run()  # warmup
+        timings = []
+        for _ in range(shape['repeat']):
+            start = time.time()
+            run()
+            timings.append(time.time() - start)
+    finally:
+        if hasattr(run, 'cleanup'):
+            run.cleanup()
+    timings.sort()
+    median = timings[len(timings) // 2]
+    return {'median': median, 'min': timings[0], 'max': timings[-1], 'ops_per_sec': operations / median if median else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the PyMISP benchmarks.')
+    parser.add_argument('-k', '--filter', help='Only run the benchmarks matching this regular expression.')
+    parser.add_argument('--quick', action='store_true', help='Small shapes and few repetitions.')
+    parser.add_argument('--repeat', type=int, help='Amount of timed runs per benchmark.')
+    parser.add_argument('--attributes', type=int, help='Attributes per synthetic event.')
+    parser.add_argument('--objects', type=int, help='Objects per synthetic event.')
+    parser.add_argument('--latency', type=float, help='Latency of the stub server, in seconds.')
+    parser.add_argument('--baseline', default=BASELINE, help='Baseline file.')
+    parser.add_argument('--save', action='store_true', help='Store the results as the new baseline.')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Ratio to the baseline considered a regression.')
+    parser.add_argument('--strict', action='store_true', help='Exit with 1 if a regression is found.')
+    parser.add_argument('--output', help='Write the results (JSON) to this file.')
+    args = parser.parse_args()
+
+    logging.getLogger('pymisp').setLevel(logging.CRITICAL)
+    shape_name = 'quick' if args.quick else 'default'
+    shape = json.loads(json.dumps(SHAPES[shape_name]))
+    if args.repeat:
+        shape['repeat'] = args.repeat
+    if args.attributes is not None:
+        shape['event']['attributes'] = args.attributes
+    if args.objects is not None:
+        shape['event']['objects'] = args.objects
+    if args.latency is not None:
+        shape['latency'] = args.latency
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('shape') != shape:
+            print('Warning: the baseline was recorded with another shape, the comparison is not meaningful.')
+
+    results = {}
+    regressions = []
+    print('{:<28} {:>10} {:>10} {:>12} {:>9}'.format('benchmark', 'median', 'min', 'ops/s', 'baseline'))
+    for name, func, operations in BENCHMARKS:
+        if args.filter and not re.search(args.filter, name):
+            continue
+        try:
+            result = run_benchmark(func, shape, operations)
+        except Skip as e:
+            print('{:<28} skipped ({})'.format(name, e))
+            continue
+        results[name] = result
+        comparison = ''
+        reference = baseline.get('results', {}).get(name)
+        if reference:
+            ratio = result['median'] / reference['median']
+            comparison = '{:.2f}x'.format(ratio)
+            if ratio > args.threshold:
+                comparison += ' !'
+                regressions.append(name)
+        print('{:<28} {:>9.4f}s {:>9.4f}s {:>12.1f} {:>9}'.format(name, result['median'], result['min'],
+                                                                  result['ops_per_sec'] or 0, comparison))
+
+    report = {'pymisp': __version__, 'python': platform.python_version(), 'machine': platform.machine(),
+              'shape': shape, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.save:
+        if baseline and args.filter:
+            # Keep the baseline of the benchmarks that didn't run
+            report['results'] = dict(baseline.get('results', {}), **results)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('Baseline saved in {}'.format(args.baseline))
+    if regressions:
+        print('Regressions (> {}x the baseline): {}'.format(args.threshold, ', '.join(regressions)))
+        if args.strict:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
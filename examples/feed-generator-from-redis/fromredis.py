@@ -6,7 +6,7 @@ import json
 import argparse
 import datetime
 import time
-import redis
+from collections import deque
 
 import settings
 
@@ -29,13 +29,25 @@ class RedisToMISPFeed:
     SUFFIX_OBJ = '_object'
     SUFFIX_LIST = [SUFFIX_SIGH, SUFFIX_ATTR, SUFFIX_OBJ]
 
-    def __init__(self):
+    def __init__(self, serv=None, generator=None, batch_size=None):
+        """serv and generator can be passed to use an other redis client
+        (or a fake one) and feed generator"""
         self.host = settings.host
         self.port = settings.port
         self.db = settings.db
-        self.serv = redis.StrictRedis(self.host, self.port, self.db, decode_responses=True)
+        if serv is None:
+            import redis
+            serv = redis.StrictRedis(self.host, self.port, self.db, decode_responses=True)
+        self.serv = serv
 
-        self.generator = FeedGenerator()
+        self.generator = generator if generator is not None else FeedGenerator()
+        # Amount of items popped from redis in one round trip
+        self.batch_size = batch_size or getattr(settings, 'batch_size', 1000)
+
+        # Throughput counter: (time, processed) samples over the last rate_window seconds
+        self.processed = 0
+        self.rate_window = 60
+        self.rate_samples = deque([(time.time(), 0)])
 
         self.keynames = []
         for k in settings.keyname_pop:
@@ -49,29 +61,69 @@ class RedisToMISPFeed:
     def consume(self):
         self.update_last_action("Started consuming redis")
         while True:
-            for key in self.keynames:
-                while True:
-                    data = self.pop(key)
-                    if data is None:
-                        break
-                    try:
-                        self.perform_action(key, data)
-                    except Exception as error:
-                        self.save_error_to_redis(error, data)
-
-            beautyful_sleep(5, self.format_last_action())
+            if not self.consume_once():
+                beautyful_sleep(5, self.format_last_action())
+
+    def consume_once(self):
+        """Empty all the keys once, returns the amount of items processed"""
+        processed = 0
+        for key in self.keynames:
+            while True:
+                popped = self._pop_raw(key, self.batch_size)
+                if not popped:
+                    break
+                batch = self._decode(popped)
+                self.process_batch(key, batch)
+                processed += len(batch)
+                # Compare the raw amount: the items that failed to decode don't mean the key is empty
+                if len(popped) < self.batch_size:
+                    break
+        return processed
+
+    def _pop_raw(self, key, count):
+        """Pop up to count raw items (in RPOP order) in a single round trip"""
+        pipe = self.serv.pipeline(transaction=True)
+        pipe.lrange(key, -count, -1)
+        pipe.ltrim(key, 0, -count - 1)
+        popped, _ = pipe.execute()
+        return list(reversed(popped))
+
+    def _decode(self, popped):
+        """Decode the raw items, the invalid ones are pushed to the error key"""
+        batch = []
+        for item in popped:
+            try:
+                batch.append(json.loads(item))
+            except ValueError as error:
+                self.save_error_to_redis(error, item)
+        return batch
+
+    def pop_batch(self, key, count=None):
+        """Pop up to count items (in RPOP order) in a single round trip"""
+        return self._decode(self._pop_raw(key, count or self.batch_size))
 
     def pop(self, key):
-        popped = self.serv.rpop(key)
-        if popped is None:
-            return None
-        try:
-            popped = json.loads(popped)
-        except ValueError as error:
-            self.save_error_to_redis(error, popped)
-        except ValueError as error:
-            self.save_error_to_redis(error, popped)
-        return popped
+        batch = self.pop_batch(key, 1)
+        return batch[0] if batch else None
+
+    def process_batch(self, key, batch):
+        """Add a batch of items to the feed, the feed is written once for the whole batch"""
+        with self.generator.batch():
+            for data in batch:
+                try:
+                    self.perform_action(key, data)
+                except Exception as error:
+                    self.save_error_to_redis(error, data)
+        self.processed += len(batch)
+        now = time.time()
+        self.rate_samples.append((now, self.processed))
+        while len(self.rate_samples) > 1 and self.rate_samples[1][0] <= now - self.rate_window:
+            self.rate_samples.popleft()
+
+    def throughput(self):
+        """Items processed per second over the last rate_window seconds (reading it doesn't reset it)"""
+        start, start_processed = self.rate_samples[0]
+        return (self.processed - start_processed) / max(time.time() - start, 1e-6)
 
     def perform_action(self, key, data):
         # sighting
@@ -109,9 +161,11 @@ class RedisToMISPFeed:
         self.last_action_time = datetime.datetime.now()
 
     def format_last_action(self):
-        return "Last action: [{}] @ {}".format(
+        return "Last action: [{}] @ {} - {} items processed ({:.1f}/s)".format(
             self.last_action,
             self.last_action_time.isoformat().replace('T', ' '),
+            self.processed,
+            self.throughput(),
         )
 
 
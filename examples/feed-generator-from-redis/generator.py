@@ -7,8 +7,10 @@ import hashlib
 import datetime
 import time
 import uuid
+from contextlib import contextmanager
 
-from pymisp import MISPEvent
+from pymisp import MISPEvent, MISPEncode
+from pymisp.tools.feed_cache import HashIndex, atomic_write, read_hashes_csv, update_hash_index
 
 import settings
 
@@ -51,12 +53,22 @@ class FeedGenerator:
         It handles the event creation, manifest file and cache file
         (hashes.csv).
 
+        The additions are appended to a journal (<event uuid>.journal) every
+        flushing_interval, and the whole event is only rewritten every
+        compaction_interval, together with the cache file and the manifest
+        (so they only reference what is in the event files). On restart, the
+        journal is replayed on the last written version of the event.
+
         """
         self.sys_templates = get_system_templates()
         self.constructor_dict = settings.constructor_dict
 
         self.flushing_interval = settings.flushing_interval
         self.flushing_next = time.time() + self.flushing_interval
+        self.compaction_interval = getattr(settings, 'compaction_interval', 60*60)
+        self.compaction_next = time.time() + self.compaction_interval
+        self.journal = []
+        self._in_batch = False
 
         self.manifest = {}
         self.attributeHashes = []
@@ -65,7 +77,10 @@ class FeedGenerator:
         event_date_str, self.current_event_uuid, self.event_name = self.get_last_event_from_manifest()
         temp = [int(x) for x in event_date_str.split('-')]
         self.current_event_date = datetime.date(temp[0], temp[1], temp[2])
-        self.current_event = self._get_event_from_id(self.current_event_uuid)
+        self.current_event = self._load_event(self.current_event_uuid)
+        if os.path.exists(self._journal_path(self.current_event_uuid)):
+            # Recovered from the journal, start again from a clean state
+            self.compact_event()
 
     def add_sighting_on_attribute(self, sight_type, attr_uuid, **data):
         """Add a sighting on an attribute.
@@ -78,7 +93,8 @@ class FeedGenerator:
     def add_attribute_to_event(self, attr_type, attr_value, **attr_data):
         """Add an attribute to the daily event"""
         self.update_daily_event_id()
-        self.current_event.add_attribute(attr_type, attr_value, **attr_data)
+        attribute = self.current_event.add_attribute(attr_type, attr_value, **attr_data)
+        self._journal_add('Attribute', attribute)
         self._add_hash(attr_type, attr_value)
         self._after_addition()
         return True
@@ -109,35 +125,61 @@ class FeedGenerator:
             misp_object = obj_constr(data)
 
         self.current_event.add_object(misp_object)
+        self._journal_add('Object', misp_object)
         for attr_type, attr_value in data.items():
             self._add_hash(attr_type, attr_value)
 
         self._after_addition()
         return True
 
+    @contextmanager
+    def batch(self):
+        """Group additions: the event, its journal and the hash cache are
+        written at most once, at the end of the batch."""
+        self._in_batch = True
+        try:
+            yield self
+        finally:
+            self._in_batch = False
+            self._after_addition()
+
     def _after_addition(self):
         """Write event on disk"""
+        if self._in_batch:
+            return
         now = time.time()
-        if self.flushing_next <= now:
+        if self.compaction_next <= now:
+            self.compact_event()
+            self.compaction_next = now + self.compaction_interval
+            self.flushing_next = now + self.flushing_interval
+        elif self.flushing_next <= now:
             self.flush_event()
             self.flushing_next = now + self.flushing_interval
 
+    # Journal
+    def _journal_path(self, event_uuid):
+        return os.path.join(settings.outputdir, event_uuid+'.journal')
+
+    def _journal_add(self, kind, entity):
+        self.journal.append(json.dumps({kind: entity}, cls=MISPEncode) + '\n')
+
     # Cache
-    def _add_hash(self, attr_type, attr_value):
+    def _add_hash(self, attr_type, attr_value, event_uuid=None):
+        event_uuid = event_uuid or self.current_event_uuid
         if ('|' in attr_type or attr_type == 'malware-sample'):
             split = attr_value.split('|')
             self.attributeHashes.append([
                 hashlib.md5(str(split[0]).encode("utf-8")).hexdigest(),
-                self.current_event_uuid
+                event_uuid
             ])
             self.attributeHashes.append([
                 hashlib.md5(str(split[1]).encode("utf-8")).hexdigest(),
-                self.current_event_uuid
+                event_uuid
             ])
         else:
             self.attributeHashes.append([
                 hashlib.md5(str(attr_value).encode("utf-8")).hexdigest(),
-                self.current_event_uuid
+                event_uuid
             ])
 
     # Manifest
@@ -148,7 +190,19 @@ class FeedGenerator:
         # create new event and save manifest
         self.create_daily_event()
 
-    def flush_event(self, new_event=None):
+    def flush_event(self):
+        """Append the pending additions to the journal of the current event"""
+        if self.journal:
+            print('Writting journal on disk'+' '*50)
+            with open(self._journal_path(self.current_event_uuid), 'a') as f:
+                f.write(''.join(self.journal))
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal = []
+
+    def compact_event(self, new_event=None):
+        """Write the whole event on disk, update the cache file and the
+        manifest, and drop the journal"""
         print('Writting event on disk'+' '*50)
         if new_event is not None:
             event_uuid = new_event['uuid']
@@ -157,11 +211,17 @@ class FeedGenerator:
             event_uuid = self.current_event_uuid
             event = self.current_event
 
-        eventFile = open(os.path.join(settings.outputdir, event_uuid+'.json'), 'w')
-        eventFile.write(event.to_json())
-        eventFile.close()
-
-        self.save_hashes()
+        atomic_write(os.path.join(settings.outputdir, event_uuid+'.json'), event.to_json())
+        if new_event is None:
+            # Everything in the journal is in the event file now
+            self.journal = []
+            self.save_hashes()
+            # Bump the timestamp, the consumers only fetch the events updated since their last pull
+            self.manifest[event_uuid] = self._addEventToManifest(event)
+            self.manifest[event_uuid]['timestamp'] = int(time.time())
+            self.save_manifest()
+            if os.path.exists(self._journal_path(event_uuid)):
+                os.remove(self._journal_path(event_uuid))
 
     def save_manifest(self):
         try:
@@ -177,10 +237,16 @@ class FeedGenerator:
         if len(self.attributeHashes) == 0:
             return False
         try:
-            hashFile = open(os.path.join(settings.outputdir, 'hashes.csv'), 'a')
-            for element in self.attributeHashes:
-                hashFile.write('{},{}\n'.format(element[0], element[1]))
-            hashFile.close()
+            index_path = os.path.join(settings.outputdir, 'hashes.idx')
+            csv_path = os.path.join(settings.outputdir, 'hashes.csv')
+            entries = self.attributeHashes
+            if not os.path.exists(index_path) and os.path.exists(csv_path):
+                # Feed generated before the hash index, import the existing hashes
+                entries = list(read_hashes_csv(csv_path)) + entries
+            # The index is deduplicated, hashes.csv is regenerated from it for compatibility
+            update_hash_index(index_path, entries)
+            with HashIndex(index_path) as index:
+                index.to_csv(csv_path)
             self.attributeHashes = []
             print('Hash saved' + ' '*30)
         except Exception as e:
@@ -234,18 +300,37 @@ class FeedGenerator:
     def update_daily_event_id(self):
         if self.current_event_date != datetime.date.today():  # create new event
             # save current event on disk
-            self.flush_event()
+            self.compact_event()
             self.current_event = self.create_daily_event()
             self.current_event_date = datetime.date.today()
             self.current_event_uuid = self.current_event.get('uuid')
             self.event_name = self.current_event.info
 
-    def _get_event_from_id(self, event_uuid):
+    def _load_event(self, event_uuid):
+        """Load the last written version of an event, and replay its journal"""
         with open(os.path.join(settings.outputdir, '%s.json' % event_uuid), 'r') as f:
             event_dict = json.load(f)['Event']
-            event = MISPEvent()
-            event.from_dict(**event_dict)
-            return event
+        journal_path = self._journal_path(event_uuid)
+        if os.path.exists(journal_path):
+            # Skip what was already written, if the journal wasn't removed after the last compaction
+            known = set(a.get('uuid') for a in event_dict.get('Attribute', []))
+            known |= set(o.get('uuid') for o in event_dict.get('Object', []))
+            with open(journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Partial line, interrupted write
+                        continue
+                    for kind, data in entry.items():
+                        if data.get('uuid') not in known:
+                            event_dict.setdefault(kind, []).append(data)
+                            # The hashes are only saved at compaction, the ones of the journal were lost
+                            for attribute in ([data] if kind == 'Attribute' else data.get('Attribute', [])):
+                                self._add_hash(attribute['type'], attribute['value'], event_uuid)
+        event = MISPEvent()
+        event.from_dict(**event_dict)
+        return event
 
     def create_daily_event(self):
         new_uuid = gen_uuid()
@@ -270,7 +355,7 @@ class FeedGenerator:
         event['Orgc'] = org_dict
 
         # save event on disk
-        self.flush_event(new_event=event)
+        self.compact_event(new_event=event)
         # add event to manifest
         self.manifest[event['uuid']] = self._addEventToManifest(event)
         self.save_manifest()
@@ -8,8 +8,13 @@ db=0
 keyname_pop=['cowrie']
 
 # OTHERS
-## How frequent the event should be written on disk
+## How frequent the new attributes and objects should be written on disk
+## (appended to the journal of the event)
 flushing_interval=5*60
+## How frequent the whole event should be rewritten (and the journal emptied)
+compaction_interval=60*60
+## Amount of items popped from redis in one round trip, and added to the feed at once
+batch_size=1000
 ## The redis list keyname in which to put items that generated an error
 keyname_error='feed-generation-error'
 
@@ -37,3 +37,7 @@ filters = {'published':'true'}
 # 5: Inherit Event
 valid_attribute_distribution_levels = ['0', '1', '2', '3', '4', '5']
 
+
+# Amount of events fetched concurrently. Only the new and modified events
+# (compared to the manifest of the existing feed) are fetched.
+workers = 10
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from keys import misp_url, misp_key, misp_verifycert
+import argparse
+import logging
+import sys
+
+from pymisp import PyMISP
+from pymisp.tools.ioc_matcher import IOCMatcher
+from pymisp.tools.log_sightings import LogSightingPipeline, follow_file
+from pymisp.tools.sighting_buffer import SightingBuffer
+
+
+def init(url, key):
+    return PyMISP(url, key, misp_verifycert, 'json')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add sightings for the indicators of a feed found in log files (or stdin).')
+    parser.add_argument("-d", "--feed", required=True, help="Directory of a MISP feed with the IOCs (see feed-generator).")
+    parser.add_argument("-s", "--source", default='logs', help="Source of the sightings.")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="Amount of processes matching the lines.")
+    parser.add_argument("-f", "--follow", action='store_true', help="Follow the log file (tail -f).")
+    parser.add_argument("--window", type=int, default=60, help="Seconds during which the identical sightings are coalesced.")
+    parser.add_argument("logs", nargs='*', help="Log files (default: stdin).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    misp = init(misp_url, misp_key)
+    matcher = IOCMatcher.from_directory(args.feed, to_ids_only=True)
+    print('{} indicators loaded.'.format(len(matcher)))
+
+    with SightingBuffer(misp, window=args.window) as sightings:
+        pipeline = LogSightingPipeline(matcher, sightings, source=args.source, workers=args.workers)
+        try:
+            if args.follow:
+                if len(args.logs) != 1:
+                    sys.exit('Only one log file can be followed.')
+                pipeline.process_lines(follow_file(args.logs[0]))
+            elif args.logs:
+                pipeline.process_files(args.logs)
+            else:
+                pipeline.process_lines(sys.stdin)
+        except KeyboardInterrupt:
+            pass
+    print('{lines} lines ({lines_per_sec:.0f}/s), {matches} matches ({matches_per_sec:.1f}/s), {sightings} sightings'.format(**pipeline.stats))
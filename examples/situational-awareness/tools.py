@@ -12,68 +12,38 @@ import re
 import matplotlib.pyplot as plt
 from matplotlib import pylab
 import os
-import date_tools
-from dateutil.parser import parse
+from datetime import datetime
+from pymisp.tools.analytics import tag_taxonomies
 
 # ############### Tools ################
 
 
 def selectInRange(Events, begin=None, end=None):
-    inRange = []
-    for i, Event in Events.iterrows():
-        if date_tools.dateInRange(parse(Event['date']), begin, end):
-            inRange.append(Event.tolist())
-    inRange = pandas.DataFrame(inRange)
-    temp = Events.columns.tolist()
+    if begin is None:
+        begin = datetime(1970, 1, 1)
+    if end is None:
+        end = datetime.now()
+    dates = pandas.to_datetime(Events['date'])
+    inRange = Events[(dates >= begin) & (dates <= end)]
     if inRange.empty:
         return None
-    inRange.columns = temp
-    return inRange
+    return inRange.reset_index(drop=True)
 
 
 def getTaxonomies(dataframe):
-    taxonomies = Taxonomies()
-    taxonomies = list(taxonomies.keys())
-    notInTaxo = []
-    count = 0
-    for taxonomy in taxonomies:
-        empty = True
-        for it in dataframe.iterrows():
-            if it[0].startswith(taxonomy):
-                empty = False
-                dataframe = dataframe.drop([it[0]])
-                count = count + 1
-        if empty is True:
-            notInTaxo.append(taxonomy)
-    if dataframe.empty:
-        emptyOther = True
-    else:
-        emptyOther = False
-    for taxonomy in notInTaxo:
-        taxonomies.remove(taxonomy)
-    return taxonomies, emptyOther
+    taxonomies = tag_taxonomies(dataframe.index, list(Taxonomies().keys()))
+    emptyOther = not taxonomies.isnull().any()
+    return taxonomies.dropna().unique().tolist(), emptyOther
 
 
 def buildDoubleIndex(index1, index2, datatype):
-    it = -1
-    newindex1 = []
-    for index in index2:
-        if index == 0:
-            it += 1
-        newindex1.append(index1[it])
-    arrays = [newindex1, index2]
-    tuples = list(zip(*arrays))
-    return pandas.MultiIndex.from_tuples(tuples, names=['event', datatype])
+    # A new event starts each time the inner index goes back to 0
+    newindex1 = numpy.asarray(index1)[numpy.cumsum(numpy.asarray(index2) == 0) - 1]
+    return pandas.MultiIndex.from_arrays([newindex1, index2], names=['event', datatype])
 
 
 def buildNewColumn(index2, column):
-    it = -1
-    newcolumn = []
-    for index in index2:
-        if index == 0:
-            it += 1
-        newcolumn.append(column[it])
-    return newcolumn
+    return numpy.asarray(column)[numpy.cumsum(numpy.asarray(index2) == 0) - 1].tolist()
 
 
 def addColumn(dataframe, columnList, columnName):
@@ -97,14 +67,7 @@ def getCopyDataframe(dataframe):
 
 
 def createDictTagsColour(colourDict, tags):
-    temp = tags.groupby(['name', 'colour']).count()['id']
-    levels_name = temp.index.levels[0]
-    levels_colour = temp.index.levels[1]
-    labels_name = temp.index.labels[0]
-    labels_colour = temp.index.labels[1]
-
-    for i in range(len(labels_name)):
-        colourDict[levels_name[labels_name[i]]] = levels_colour[labels_colour[i]]
+    colourDict.update(zip(tags['name'], tags['colour']))
 
 
 def createTagsPlotStyle(dataframe, colourDict, taxonomy=None):
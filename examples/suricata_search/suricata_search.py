@@ -11,40 +11,18 @@ https://github.com/raw-data/pymisp-suricata_search
 
 import argparse
 import os
-import queue
 import sys
-from threading import Thread, enumerate
 from keys import misp_url, misp_key, misp_verifycert
 
 try:
     from pymisp import PyMISP
+    from pymisp.tools.nids import NIDSExporter, HEADER
 except ImportError as err:
     sys.stderr.write("ERROR: {}\n".format(err))
     sys.stderr.write("\t[try] with pip install pymisp\n")
     sys.stderr.write("\t[try] with pip3 install pymisp\n")
     sys.exit(1)
 
-HEADER = """
-#This part might still contain bugs, use and your own risk and report any issues.
-#
-# MISP export of IDS rules - optimized for suricata
-#
-# These NIDS rules contain some variables that need to exist in your configuration.
-# Make sure you have set:
-#
-# $HOME_NET	- Your internal network range
-# $EXTERNAL_NET - The network considered as outside
-# $SMTP_SERVERS - All your internal SMTP servers
-# $HTTP_PORTS   - The ports used to contain HTTP traffic (not required with suricata export)
-# 
-"""
-
-# queue for events matching searched term/s
-IDS_EVENTS = queue.Queue()
-
-# queue for downloaded Suricata rules
-DOWNLOADED_RULES = queue.Queue()
-
 # Default number of threads to use
 THREAD = 4
 
@@ -59,111 +37,42 @@ def init():
     return PyMISP(misp_url, misp_key, misp_verifycert, 'json')
 
 
-def search(misp, quiet, noevent, **kwargs):
-    """ Start search in MISP """
-
-    result = misp.search(**kwargs)
-
-    # fetch all events matching **kwargs
-    track_events = 0
-    skip_events = list()
-    for event in result['response']:
-        event_id = event["Event"].get("id")
-        track_events += 1
-
-        to_ids = False
-        for attribute in event["Event"]["Attribute"]:
-            to_ids_event = attribute["to_ids"]
-            if to_ids_event:
-                to_ids = True
-                break
-
-        # if there is at least one eligible event to_ids, add event_id
-        if to_ids:
-            # check if the event_id is not blacklisted by the user
-            if isinstance(noevent, list):
-                if event_id not in noevent[0]:
-                    to_ids_event = (event_id, misp)
-                    IDS_EVENTS.put(to_ids_event)
-                else:
-                    skip_events.append(event_id)
-            else:
-                to_ids_event = (event_id, misp)
-                IDS_EVENTS.put(to_ids_event)
-
-    if not quiet:
-        print ("\t[i] matching events: {}".format(track_events))
-        if len(skip_events) > 0:
-            print ("\t[i] skipped {0} events -> {1}".format(len(skip_events),skip_events))
-        print ("\t[i] events selected for IDS export: {}".format(IDS_EVENTS.qsize()))
-
-
-def collect_rules(thread):
-    """ Dispatch tasks to Suricata_processor worker """
-
-    for x in range(int(thread)):
-        th = Thread(target=suricata_processor, args=(IDS_EVENTS, ))
-        th.start()
-
-    for x in enumerate():
-        if x.name == "MainThread":
-            continue
-        x.join()
-
-
-def suricata_processor(ids_events):
-    """ Trigger misp.download_suricata_rule_event """
+def search(exporter, param, terms, quiet, noevent):
+    """ Search the events with IDS attributes matching the terms """
 
-    while not ids_events.empty():
-        event_id, misp = ids_events.get()
-        ids_rules = misp.download_suricata_rule_event(event_id).text
+    event_ids = []
+    for term in terms:
+        kwargs = {param: term}
+        if not quiet:
+            print("[+] Searching for: {}".format(kwargs))
+        for event_id in exporter.search_events(exclude=noevent, **kwargs):
+            if event_id not in event_ids:
+                event_ids.append(event_id)
 
-        for r in ids_rules.split("\n"):
-            # skip header
-            if not r.startswith("#"):
-                if len(r) > 0: DOWNLOADED_RULES.put(r)
+    if not quiet:
+        print("\t[i] events selected for IDS export: {}".format(len(event_ids)))
+    return event_ids
 
 
-def return_rules(output, quiet):
+def return_rules(exporter, event_ids, output, quiet):
     """ Return downloaded rules to user """
 
-    rules = set()
-    while not DOWNLOADED_RULES.empty():
-        rules.add(DOWNLOADED_RULES.get())
-
     if output is None:
 
         if not quiet:
-            print ("[+] Displaying rules")
+            print("[+] Displaying rules")
 
-        print (HEADER)
-        for r in rules: print (r)
-        print ("#")
+        print(HEADER.format(engine='suricata'))
+        for r in exporter.iter_rules(event_ids):
+            print(r)
+        print("#")
 
     else:
 
+        stats = exporter.export(output, event_ids=event_ids)
         if not quiet:
-            print ("[+] Writing rules to {}".format(output))
-            print ("[+] Generated {} rules".format(len(rules)))
-
-        with open(output, 'w') as f:
-            f.write(HEADER)
-            f.write("\n".join(r for r in rules))
-            f.write("\n"+"#")
-
-
-def format_request(param, term, misp, quiet, output, thread, noevent):
-    """ Format request and start search """
-
-    kwargs = {param: term}
-
-    if not quiet:
-        print ("[+] Searching for: {}".format(kwargs))
-
-    search(misp, quiet, noevent, **kwargs)
-
-    # collect Suricata rules
-    collect_rules(thread)
+            print("[+] Rules written to {}".format(output))
+            print("[+] Generated {} rules ({} duplicates removed)".format(stats['rules'], stats['duplicates']))
 
 
 if __name__ == "__main__":
@@ -202,15 +111,9 @@ if __name__ == "__main__":
         print ("[i] Connecting to MISP instance: {}".format(misp_url))
         print ("[i] Note: duplicated IDS rules will be removed")
 
-    # Based on # of terms, format request
-    if "," in args.search:
-        for term in args.search.split(","):
-            term = term.strip()
-            misp = init()
-            format_request(args.param, term, misp, args.quiet, args.output, args.thread, args.noevent)
-    else:
-        misp = init()
-        format_request(args.param, args.search, misp, args.quiet, args.output, args.thread, args.noevent)
+    exporter = NIDSExporter(init(), workers=int(args.thread))
+    terms = [term.strip() for term in args.search.split(",")]
+    event_ids = search(exporter, args.param, terms, args.quiet, args.noevent[0] if args.noevent else None)
 
     # return collected rules
-    return_rules(args.output, args.quiet)
+    return_rules(exporter, event_ids, args.output, args.quiet)
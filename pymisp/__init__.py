@@ -1,6 +1,8 @@
 __version__ = '2.4.92'
+import importlib
 import logging
 import functools
+import sys
 import warnings
 
 FORMAT = "%(levelname)s [%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
@@ -30,17 +32,47 @@ def deprecated(func):
     return new_func
 
 
+# Names imported on first access (PEP 562, python >= 3.7): the API pulls requests and dateutil, the tools pull
+# optional dependencies (lief, bs4, py2neo, ...). Short-lived scripts only using MISPEvent don't pay for them.
+_LAZY_ATTRIBUTES = {
+    'PyMISP': ('.api', 'PyMISP'),
+    'AbstractMISPObjectGenerator': ('.tools', 'AbstractMISPObjectGenerator'),
+    'Neo4j': ('.tools', 'Neo4j'),
+    'stix': ('.tools.stix', None),
+    'openioc': ('.tools.openioc', None),
+    'load_warninglists': ('.tools.load_warninglists', None),
+    'ext_lookups': ('.tools.ext_lookups', None),
+    'api': ('.api', None),
+    'tools': ('.tools', None),
+}
+
 try:
     from .exceptions import PyMISPError, NewEventError, NewAttributeError, MissingDependency, NoURL, NoKey, InvalidMISPObject, UnknownMISPObjectTemplate, PyMISPInvalidFormat  # noqa
-    from .api import PyMISP  # noqa
     from .abstract import AbstractMISP, MISPEncode, MISPTag  # noqa
     from .mispevent import MISPEvent, MISPAttribute, MISPObjectReference, MISPObjectAttribute, MISPObject, MISPUser, MISPOrganisation, MISPSighting   # noqa
-    from .tools import AbstractMISPObjectGenerator  # noqa
-    from .tools import Neo4j  # noqa
-    from .tools import stix  # noqa
-    from .tools import openioc  # noqa
-    from .tools import load_warninglists  # noqa
-    from .tools import ext_lookups  # noqa
+    from .mispview import EventView, AttributeView, ObjectView, TagView, view_events, view_attributes  # noqa
+    if sys.version_info < (3, 7):
+        from .api import PyMISP  # noqa
+        from .tools import AbstractMISPObjectGenerator  # noqa
+        from .tools import Neo4j  # noqa
+        from .tools import stix  # noqa
+        from .tools import openioc  # noqa
+        from .tools import load_warninglists  # noqa
+        from .tools import ext_lookups  # noqa
     logger.debug('pymisp loaded properly')
 except ImportError as e:
     logger.warning('Unable to load pymisp properly: {}'.format(e))
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    module = importlib.import_module(module_name, __name__)
+    value = getattr(module, attribute) if attribute else module
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
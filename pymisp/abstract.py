@@ -11,6 +11,7 @@ import six  # Remove that import when discarding python2 support.
 import logging
 
 from .exceptions import PyMISPInvalidFormat
+from .profiling import phase
 
 
 logger = logging.getLogger('pymisp')
@@ -128,7 +129,8 @@ class AbstractMISP(collections.MutableMapping):
 
     def to_json(self):
         """Dump recursively any class of type MISPAbstract to a json string"""
-        return json.dumps(self, cls=MISPEncode, sort_keys=True, indent=2)
+        with phase('to_json'):
+            return json.dumps(self, cls=MISPEncode, sort_keys=True, indent=2)
 
     def __getitem__(self, key):
         try:
@@ -161,8 +163,9 @@ class AbstractMISP(collections.MutableMapping):
             val = getattr(self, p)
             if isinstance(val, AbstractMISP) and val.edited:
                 self.__edited = True
-            elif isinstance(val, list) and all(isinstance(a, AbstractMISP) for a in val):
-                if any(a.edited for a in val):
+            elif isinstance(val, list):
+                # list.__iter__: the items of the lazy lists not created yet (dictionaries) can't have been edited
+                if any(isinstance(a, AbstractMISP) and a.edited for a in list.__iter__(val)):
                     self.__edited = True
         return self.__edited
 
@@ -32,6 +32,7 @@ except ImportError:
 
 try:
     import requests
+    from . import metrics
     HAVE_REQUESTS = True
 except ImportError:
     HAVE_REQUESTS = False
@@ -55,9 +56,10 @@ class PyMISP(object):
     :param proxies: Proxy dict as describes here: http://docs.python-requests.org/en/master/user/advanced/#proxies
     :param cert: Client certificate, as described there: http://docs.python-requests.org/en/master/user/advanced/#client-side-certificates
     :param asynch: Use asynchronous processing where possible
+    :param metrics: Instrumentation (see pymisp.metrics) receiving the measures of every request, nothing is measured if None
     """
 
-    def __init__(self, url, key, ssl=True, out_type='json', debug=None, proxies=None, cert=None, asynch=False):
+    def __init__(self, url, key, ssl=True, out_type='json', debug=None, proxies=None, cert=None, asynch=False, metrics=None):
         if not url:
             raise NoURL('Please provide the URL of your MISP instance.')
         if not key:
@@ -69,6 +71,8 @@ class PyMISP(object):
         self.proxies = proxies
         self.cert = cert
         self.asynch = asynch
+        self.metrics = metrics
+        self.__session = self.__prepare_session()
         if asynch and not ASYNC_OK:
             logger.critical("You turned on Async, but don't have requests_futures installed")
             self.asynch = False
@@ -132,6 +136,13 @@ class PyMISP(object):
             raise PyMISPError('The MISP server your are trying to reach is outdated (<2.4.52). Please use PyMISP v2.4.51.1 (pip install -I PyMISP==v2.4.51.1) and/or contact your administrator.')
         return describe_types
 
+    def __prepare_session(self):
+        """Session shared by the synchronous requests: the connections are kept alive between them"""
+        session = requests.Session()
+        if self.metrics is not None:
+            metrics.instrument_session(session)
+        return session
+
     def __prepare_request(self, request_type, url, data=None,
                           background_callback=None, output_type='json'):
         if logger.isEnabledFor(logging.DEBUG):
@@ -145,7 +156,7 @@ class PyMISP(object):
         if self.asynch and background_callback is not None:
             s = FuturesSession()
         else:
-            s = requests.Session()
+            s = self.__session
         prepped = s.prepare_request(req)
         prepped.headers.update(
             {'Authorization': self.key,
@@ -156,9 +167,20 @@ class PyMISP(object):
             logger.debug(prepped.headers)
         if self.asynch and background_callback is not None:
             return s.send(prepped, verify=self.ssl, proxies=self.proxies, cert=self.cert, background_callback=background_callback)
+        elif self.metrics is not None:
+            return self.__send_instrumented(s, prepped)
         else:
             return s.send(prepped, verify=self.ssl, proxies=self.proxies, cert=self.cert)
 
+    def __send_instrumented(self, session, prepped):
+        record = metrics.RequestRecord(prepped.method, prepped.url, metrics.endpoint_template(self.root_url, prepped.url))
+        try:
+            response = metrics.send(session, prepped, record, verify=self.ssl, proxies=self.proxies, cert=self.cert)
+        finally:
+            self.metrics.request(record)
+        response._pymisp_record = record
+        return response
+
     # #####################
     # ### Core helpers ####
     # #####################
@@ -213,11 +235,17 @@ class PyMISP(object):
             else:
                 errors.append(response.json())
                 logger.critical('Something bad happened on the server-side: {}'.format(response.json()))
+        record = getattr(response, '_pymisp_record', None)
+        if record is not None:
+            start = metrics.clock()
         try:
             to_return = response.json()
         except ValueError:
             # It the server didn't return a JSON blob, we've a problem.
             raise PyMISPError('Unknown error (something is very broken server-side: {})'.format(response.text))
+        if record is not None:
+            record.decode = metrics.clock() - start
+            self.metrics.decoded(record)
 
         if isinstance(to_return, (list, str)):
             to_return = {'response': to_return}
@@ -1661,6 +1689,16 @@ class PyMISP(object):
         response = self.__prepare_request('GET', url, output_type='rules')
         return response
 
+    def download_nids_rules(self, event_id, engine='suricata'):
+        """Download the NIDS rules of one event (the response, rules file as text).
+
+        :param event_id: ID of the event
+        :param engine: suricata or snort
+        """
+        url = urljoin(self.root_url, 'events/nids/{}/download/{}'.format(engine, event_id))
+        response = self.__prepare_request('GET', url, output_type='rules')
+        return response
+
     # ############## Text ###############
 
     def get_all_attributes_txt(self, type_attr, tags=False, eventId=False, allowNonIDS=False, date_from=False, date_to=False, last=False, enforceWarninglist=False, allowNotPublished=False):
@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Request level instrumentation of PyMISP.
+
+    aggregator = MetricsAggregator()
+    misp = PyMISP(url, key, metrics=aggregator)
+    ...
+    print(aggregator.summary())
+    print(aggregator.to_prometheus())
+
+Any object implementing the Instrumentation interface can be passed as `metrics`. When it is None (the default),
+the requests are sent exactly as before and nothing is measured.
+"""
+
+import random
+import re
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+try:
+    from requests.packages.urllib3.connection import HTTPConnection, HTTPSConnection
+    from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    has_connect_timing = True
+except ImportError:
+    has_connect_timing = False
+
+_ID_RE = re.compile(r'^\d+$')
+_UUID_RE = re.compile(r'^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$', re.I)
+_HASH_RE = re.compile(r'^([0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{64}|[0-9a-f]{128})$', re.I)
+
+PHASES = ('total', 'connect', 'server', 'transfer', 'decode')
+
+# Monotonic clock for the durations (python 2: time.time, the only one available)
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def endpoint_template(root_url, url):
+    """Path of the URL relative to the MISP root, with the IDs, UUIDs and hashes replaced by placeholders
+    (events/1234 -> events/{id}), so the requests on the same endpoint are aggregated together."""
+    path = url.split('?', 1)[0]
+    root = root_url.rstrip('/')
+    if path.startswith(root):
+        path = path[len(root):]
+    segments = []
+    for segment in path.strip('/').split('/'):
+        name, dot, extension = segment.partition('.')
+        if _ID_RE.match(name):
+            name = '{id}'
+        elif _UUID_RE.match(name):
+            name = '{uuid}'
+        elif _HASH_RE.match(name):
+            name = '{hash}'
+        segments.append(name + dot + extension)
+    return '/'.join(segments)
+
+
+class RequestRecord(object):
+
+    def __init__(self, method, url, endpoint):
+        """Measures of one request. The durations are in seconds, None if they couldn't be measured.
+        :server: from the request being sent to the response headers (including the connection, if any)
+        :connect: part of server spent opening connections
+        :transfer: download of the response body
+        :decode: JSON decoding of the response"""
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint
+        self.status = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.connect = None
+        self.server = None
+        self.transfer = None
+        self.decode = None
+        self.total = None
+        self.error = None
+
+    def __repr__(self):
+        return '<{self.__class__.__name__}({self.method} {self.endpoint} {self.status} {self.total})>'.format(self=self)
+
+
+class Instrumentation(object):
+    """Interface of the objects passed as `metrics` to PyMISP"""
+
+    def request(self, record):
+        """Called once the response (or the error) of a request is received"""
+        pass
+
+    def decoded(self, record):
+        """Called after the JSON of the response is decoded by PyMISP (record.decode is set)"""
+        pass
+
+
+# ### Connection timing ###
+
+_local = threading.local()
+
+
+def _timed_connect(connect):
+    def wrapper(self):
+        start = clock()
+        try:
+            return connect(self)
+        finally:
+            if getattr(_local, 'record', None) is not None:
+                _local.record.connect = (_local.record.connect or 0) + clock() - start
+    return wrapper
+
+
+if has_connect_timing:
+    class _TimedHTTPConnection(HTTPConnection):
+        connect = _timed_connect(HTTPConnection.connect)
+
+    class _TimedHTTPSConnection(HTTPSConnection):
+        connect = _timed_connect(HTTPSConnection.connect)
+
+    class _TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _TimedHTTPConnection
+
+    class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = _TimedHTTPSConnection
+
+
+class TimingAdapter(HTTPAdapter):
+    """HTTPAdapter measuring the time spent opening connections (see RequestRecord.connect)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimingAdapter, self).init_poolmanager(*args, **kwargs)
+        if has_connect_timing:
+            self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                       'https': _TimedHTTPSConnectionPool}
+
+
+def instrument_session(session):
+    """Mount a TimingAdapter on a session, once when it is created: the adapter holds the connection pools"""
+    adapter = TimingAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def send(session, prepped, record, **kwargs):
+    """Send a prepared request with a session (see instrument_session for the connect phase) and fill the record"""
+    body = prepped.body or b''
+    record.request_bytes = len(body.encode('utf-8') if not isinstance(body, bytes) else body)
+    _local.record = record
+    start = clock()
+    try:
+        response = session.send(prepped, stream=True, **kwargs)
+        headers = clock()
+        content = response.content
+        end = clock()
+    except Exception as e:
+        record.total = clock() - start
+        record.error = e
+        raise
+    finally:
+        _local.record = None
+    record.status = response.status_code
+    record.server = headers - start
+    record.transfer = end - headers
+    record.total = end - start
+    record.response_bytes = len(content or b'')
+    retries = getattr(response.raw, 'retries', None)
+    record.retries = len(getattr(retries, 'history', None) or ())
+    return response
+
+
+# ### Aggregation ###
+
+class _EndpointStats(object):
+
+    def __init__(self, max_samples, rng):
+        self.count = 0
+        self.errors = 0
+        self.statuses = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.sums = dict((phase, 0.) for phase in PHASES)
+        self.samples = dict((phase, []) for phase in PHASES)
+        self._seen = dict((phase, 0) for phase in PHASES)
+        self._max_samples = max_samples
+        self._random = rng
+
+    def add_sample(self, phase, value):
+        if value is None:
+            return
+        self.sums[phase] += value
+        self._seen[phase] += 1
+        samples = self.samples[phase]
+        if len(samples) < self._max_samples:
+            samples.append(value)
+        else:
+            # Reservoir sampling: the percentiles stay representative with a bounded memory
+            position = self._random.randint(0, self._seen[phase] - 1)
+            if position < self._max_samples:
+                samples[position] = value
+
+    def samples_count(self, phase):
+        return self._seen[phase]
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+class MetricsAggregator(Instrumentation):
+
+    def __init__(self, quantiles=(0.5, 0.9, 0.99), max_samples=10000):
+        """In-memory aggregation of the requests per (method, endpoint), with latency percentiles
+        :quantiles: Quantiles reported in the summary and the Prometheus exposition
+        :max_samples: Amount of latencies kept per endpoint and phase (reservoir sampling)
+        """
+        self.quantiles = quantiles
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def _stats(self, record):
+        key = (record.method, record.endpoint)
+        if key not in self.stats:
+            self.stats[key] = _EndpointStats(self.max_samples, self._random)
+        return self.stats[key]
+
+    def request(self, record):
+        with self._lock:
+            stats = self._stats(record)
+            stats.count += 1
+            status = str(record.status) if record.status is not None else 'error'
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if record.status is None or record.status >= 400:
+                stats.errors += 1
+            stats.request_bytes += record.request_bytes
+            stats.response_bytes += record.response_bytes
+            stats.retries += record.retries
+            for phase in ('total', 'connect', 'server', 'transfer'):
+                stats.add_sample(phase, getattr(record, phase))
+
+    def decoded(self, record):
+        with self._lock:
+            self._stats(record).add_sample('decode', record.decode)
+
+    def percentile(self, endpoint, q, phase='total', method=None):
+        """Latency percentile (seconds) of an endpoint, None if there is no measure"""
+        with self._lock:
+            values = []
+            for (m, e), stats in self.stats.items():
+                if e == endpoint and (method is None or m == method):
+                    values += stats.samples[phase]
+        return _percentile(values, q)
+
+    def summary(self):
+        """{(method, endpoint): {count, errors, statuses, request_bytes, response_bytes, retries,
+        <phase>: {mean, p50, p90, ...}}}"""
+        to_return = {}
+        with self._lock:
+            for key, stats in self.stats.items():
+                entry = {'count': stats.count, 'errors': stats.errors, 'statuses': dict(stats.statuses),
+                         'request_bytes': stats.request_bytes, 'response_bytes': stats.response_bytes,
+                         'retries': stats.retries}
+                for phase in PHASES:
+                    seen = stats.samples_count(phase)
+                    if not seen:
+                        continue
+                    entry[phase] = {'mean': stats.sums[phase] / seen}
+                    for q in self.quantiles:
+                        entry[phase]['p{:g}'.format(q * 100)] = _percentile(stats.samples[phase], q)
+                to_return[key] = entry
+        return to_return
+
+    def to_prometheus(self, prefix='pymisp'):
+        """Prometheus text exposition format (version 0.0.4) of the aggregated metrics"""
+        lines = []
+
+        def labels(method, endpoint, **extra):
+            items = [('endpoint', endpoint), ('method', method)] + sorted(extra.items())
+            return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items) + '}'
+
+        with self._lock:
+            stats = sorted(self.stats.items())
+            lines += ['# HELP {}_requests_total Requests sent to MISP.'.format(prefix),
+                      '# TYPE {}_requests_total counter'.format(prefix)]
+            for (method, endpoint), s in stats:
+                for status, count in sorted(s.statuses.items()):
+                    lines.append('{}_requests_total{} {}'.format(prefix, labels(method, endpoint, status=status), count))
+            for name, attribute, description in (('request_bytes', 'request_bytes', 'Bytes sent to MISP.'),
+                                                 ('response_bytes', 'response_bytes', 'Bytes received from MISP.'),
+                                                 ('retries', 'retries', 'Retries of the requests.')):
+                lines += ['# HELP {}_{}_total {}'.format(prefix, name, description),
+                          '# TYPE {}_{}_total counter'.format(prefix, name)]
+                for (method, endpoint), s in stats:
+                    lines.append('{}_{}_total{} {}'.format(prefix, name, labels(method, endpoint), getattr(s, attribute)))
+            lines += ['# HELP {}_request_duration_seconds Duration of the requests, per phase.'.format(prefix),
+                      '# TYPE {}_request_duration_seconds summary'.format(prefix)]
+            for (method, endpoint), s in stats:
+                for phase in PHASES:
+                    seen = s.samples_count(phase)
+                    if not seen:
+                        continue
+                    for q in self.quantiles:
+                        lines.append('{}_request_duration_seconds{} {!r}'.format(
+                            prefix, labels(method, endpoint, phase=phase, quantile=q), _percentile(s.samples[phase], q)))
+                    lines.append('{}_request_duration_seconds_sum{} {!r}'.format(prefix, labels(method, endpoint, phase=phase), s.sums[phase]))
+                    lines.append('{}_request_duration_seconds_count{} {}'.format(prefix, labels(method, endpoint, phase=phase), seen))
+        return '\n'.join(lines) + '\n'
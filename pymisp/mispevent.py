@@ -9,11 +9,13 @@ from io import BytesIO
 from zipfile import ZipFile
 import hashlib
 import sys
+import itertools
 import uuid
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 from . import deprecated
 from .abstract import AbstractMISP
+from .profiling import phase
 from .exceptions import UnknownMISPObjectTemplate, InvalidMISPObject, PyMISPError, NewEventError, NewAttributeError
 
 import six  # Remove that import when discarding python2 support.
@@ -40,31 +42,22 @@ if six.PY2:
         def dst(self, dt):
             return timedelta(0)
 
-try:
-    from dateutil.parser import parse
-except ImportError:
-    logger.exception("Cannot import dateutil")
-    pass
+# dateutil, jsonschema and gpg are imported when they are needed, to keep `import pymisp` fast.
 
-try:
-    import jsonschema
-except ImportError:
-    logger.exception("Cannot import jsonschema")
-    pass
 
-try:
-    # pyme renamed to gpg the 2016-10-28
-    import gpg
-    from gpg.constants.sig import mode
-    has_pyme = True
-except ImportError:
+def _gpg():
+    """Returns the gpg module and the signature modes (pyme renamed to gpg the 2016-10-28)"""
     try:
-        # pyme renamed to gpg the 2016-10-28
-        import pyme as gpg
-        from pyme.constants.sig import mode
-        has_pyme = True
+        import gpg
+        from gpg.constants.sig import mode
     except ImportError:
-        has_pyme = False
+        try:
+            import pyme as gpg
+            from pyme.constants.sig import mode
+        except ImportError:
+            raise PyMISPError('pyme is required, please install: pip install --pre pyme3. You will also need libgpg-error-dev and libgpgme11-dev.')
+    return gpg, mode
+
 
 # Least dirty way to support python 2 and 3
 try:
@@ -83,8 +76,97 @@ def _int_to_str(d):
     return d
 
 
+AttributeFields = namedtuple('AttributeFields', ['uuid', 'type', 'value', 'category', 'to_ids', 'tags'])
+
+
+class _LazyList(list):
+    """List of MISP entities kept as dictionaries, each one is created (with factory) on first access"""
+
+    def __init__(self, items, factory):
+        super(_LazyList, self).__init__(items)
+        self._factory = factory
+
+    def _get(self, index):
+        item = list.__getitem__(self, index)
+        if isinstance(item, dict):
+            item = self._factory(item)
+            list.__setitem__(self, index, item)
+        return item
+
+    def materialize(self):
+        for i in range(len(self)):
+            self._get(i)
+        return self
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+        return self._get(index)
+
+    def __getslice__(self, i, j):  # python 2
+        return self.__getitem__(slice(i, j))
+
+    def __iter__(self):
+        i = 0
+        while i < len(self):
+            yield self._get(i)
+            i += 1
+
+    def __reversed__(self):
+        return list.__reversed__(self.materialize())
+
+    def __contains__(self, item):
+        return list.__contains__(self.materialize(), item)
+
+    def __eq__(self, other):
+        return list.__eq__(self.materialize(), other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return list(self) + other
+
+    def __repr__(self):
+        return list.__repr__(self.materialize())
+
+    def index(self, *args):
+        return list.index(self.materialize(), *args)
+
+    def count(self, item):
+        return list.count(self.materialize(), item)
+
+    def remove(self, item):
+        list.remove(self.materialize(), item)
+
+    def pop(self, *args):
+        if args:
+            self._get(args[0])
+        elif len(self):
+            self._get(-1)
+        return list.pop(self, *args)
+
+    def sort(self, *args, **kwargs):
+        list.sort(self.materialize(), *args, **kwargs)
+
+    def copy(self):
+        return list(self)
+
+
+def _raw_items(entities):
+    """Items of a list of entities, without creating the ones not materialized yet (dictionaries)"""
+    if isinstance(entities, _LazyList):
+        return list.__iter__(entities)
+    return iter(entities)
+
+
 class MISPAttribute(AbstractMISP):
 
+    # Amount of in place edits of the type or value of an attribute (any of them), see MISPEvent.add_attributes
+    _key_edits = 0
+
     def __init__(self, describe_types=None, strict=False):
         """Represents an Attribute
             :describe_type: Use it is you want to overwrite the defualt describeTypes.json file (you don't)
@@ -92,10 +174,11 @@ class MISPAttribute(AbstractMISP):
         """
         super(MISPAttribute, self).__init__()
         if not describe_types:
-            ressources_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
-            with open(os.path.join(ressources_path, 'describeTypes.json'), 'r') as f:
-                t = json.load(f)
-            describe_types = t['result']
+            with phase('attribute.describe_types'):
+                ressources_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
+                with open(os.path.join(ressources_path, 'describeTypes.json'), 'r') as f:
+                    t = json.load(f)
+                describe_types = t['result']
         self.__categories = describe_types['categories']
         self._types = describe_types['types']
         self.__category_type_mapping = describe_types['category_type_mappings']
@@ -104,6 +187,11 @@ class MISPAttribute(AbstractMISP):
         self.uuid = str(uuid.uuid4())
         self.ShadowAttribute = []
 
+    def __setattr__(self, name, value):
+        if (name == 'type' or name == 'value') and name in self.__dict__:
+            MISPAttribute._key_edits += 1
+        super(MISPAttribute, self).__setattr__(name, value)
+
     @property
     def known_types(self):
         """Returns a list of all the known MISP attributes types"""
@@ -294,8 +382,7 @@ class MISPAttribute(AbstractMISP):
 
     def verify(self, gpg_uid):  # pragma: no cover
         # Not used
-        if not has_pyme:
-            raise PyMISPError('pyme is required, please install: pip install --pre pyme3. You will also need libgpg-error-dev and libgpgme11-dev.')
+        gpg, mode = _gpg()
         signed_data = self._serialize()
         with gpg.Context() as c:
             keys = list(c.keylist(gpg_uid))
@@ -313,8 +400,7 @@ class MISPAttribute(AbstractMISP):
 
     def sign(self, gpg_uid, passphrase=None):  # pragma: no cover
         # Not used
-        if not has_pyme:
-            raise PyMISPError('pyme is required, please install: pip install --pre pyme3. You will also need libgpg-error-dev and libgpgme11-dev.')
+        gpg, mode = _gpg()
         to_sign = self._serialize()
         with gpg.Context() as c:
             keys = list(c.keylist(gpg_uid))
@@ -347,8 +433,13 @@ class MISPAttribute(AbstractMISP):
 
 class MISPEvent(AbstractMISP):
 
-    def __init__(self, describe_types=None, strict_validation=False):
+    def __init__(self, describe_types=None, strict_validation=False, lazy=False):
+        """Represents an Event
+            :lazy: from_dict keeps the attributes and objects as dictionaries, they are converted to MISPAttribute
+                and MISPObject on first access. attribute_fields() reads the common fields without converting them.
+        """
         super(MISPEvent, self).__init__()
+        self._lazy = lazy
         ressources_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
         if strict_validation:
             with open(os.path.join(ressources_path, 'schema.json'), 'r') as f:
@@ -362,10 +453,13 @@ class MISPEvent(AbstractMISP):
             describe_types = t['result']
 
         self._types = describe_types['types']
+        self.__sane_default = describe_types['sane_defaults']
         self.Attribute = []
         self.Object = []
         self.RelatedEvent = []
         self.ShadowAttribute = []
+        # Keys of the attributes for add_attributes: (list indexed, amount indexed, last item indexed, edits, set of keys)
+        self.__attribute_keys = (None, 0, None, 0, set())
 
     @property
     def known_types(self):
@@ -421,7 +515,8 @@ class MISPEvent(AbstractMISP):
             # python2 and python3 compatible to find if we have a file
             json_event = json_event.read()
         if isinstance(json_event, basestring):
-            json_event = json.loads(json_event)
+            with phase('event.json_decode'):
+                json_event = json.loads(json_event)
         if json_event.get('response'):
             event = json_event.get('response')[0]
         else:
@@ -433,13 +528,17 @@ class MISPEvent(AbstractMISP):
                 'attribute_count' in event.get('Event') and
                 event.get('Event').get('attribute_count') is None):
             event['Event']['attribute_count'] = '0'
-        jsonschema.validate(event, self.__json_schema)
+        with phase('event.schema_validation'):
+            import jsonschema
+            jsonschema.validate(event, self.__json_schema)
         e = event.get('Event')
-        self.from_dict(**e)
+        with phase('event.from_dict'):
+            self.from_dict(**e)
 
     def set_date(self, date, ignore_invalid=False):
         """Set a date for the event (string, datetime, or date object)"""
         if isinstance(date, basestring) or isinstance(date, unicode):
+            from dateutil.parser import parse
             self.date = parse(date).date()
         elif isinstance(date, datetime.datetime):
             self.date = date.date()
@@ -483,8 +582,11 @@ class MISPEvent(AbstractMISP):
         if kwargs.get('date'):
             self.set_date(kwargs.pop('date'))
         if kwargs.get('Attribute'):
-            for a in kwargs.pop('Attribute'):
-                self.add_attribute(**a)
+            if self._lazy:
+                self.Attribute = _LazyList(kwargs.pop('Attribute'), self._attribute_from_dict)
+            else:
+                for a in kwargs.pop('Attribute'):
+                    self.add_attribute(**a)
 
         # All other keys
         if kwargs.get('id'):
@@ -511,16 +613,66 @@ class MISPEvent(AbstractMISP):
                 sub_event.load(rel_event)
                 self.RelatedEvent.append(sub_event)
         if kwargs.get('Tag'):
-            for tag in kwargs.pop('Tag'):
-                self.add_tag(tag)
+            with phase('tag.create'):
+                for tag in kwargs.pop('Tag'):
+                    self.add_tag(tag)
         if kwargs.get('Object'):
-            for obj in kwargs.pop('Object'):
-                self.add_object(obj)
+            if self._lazy:
+                self.Object = _LazyList(kwargs.pop('Object'), self._object_from_dict)
+            else:
+                for obj in kwargs.pop('Object'):
+                    self.add_object(obj)
 
         super(MISPEvent, self).from_dict(**kwargs)
 
+    def _attribute_from_dict(self, attribute):
+        with phase('attribute.create'):
+            misp_attribute = MISPAttribute()
+            misp_attribute.from_dict(**attribute)
+        return misp_attribute
+
+    def _object_from_dict(self, obj):
+        obj = dict(obj)
+        with phase('object.create'):
+            misp_obj = MISPObject(name=obj.pop('name'), strict=obj.pop('strict', False),
+                                  default_attributes_parameters=obj.pop('default_attributes_parameters', {}),
+                                  **obj)
+            misp_obj.from_dict(**obj)
+        return misp_obj
+
+    def _fields(self, attribute):
+        if not isinstance(attribute, dict):
+            return AttributeFields(getattr(attribute, 'uuid', None), attribute.type, attribute.value,
+                                   attribute.category, attribute.to_ids, tuple(tag.name for tag in attribute.tags))
+        defaults = self.__sane_default.get(attribute.get('type'), {})
+        category = attribute.get('category')
+        if category is None:
+            category = defaults.get('default_category')
+        to_ids = attribute.get('to_ids')
+        if to_ids is None:
+            to_ids = defaults.get('to_ids', 0)
+        if not isinstance(to_ids, bool):
+            to_ids = bool(int(to_ids))
+        tags = tuple(tag['name'] if isinstance(tag, dict) else tag for tag in attribute.get('Tag') or [])
+        return AttributeFields(attribute.get('uuid'), attribute.get('type'), attribute.get('value'), category, to_ids, tags)
+
+    def attribute_fields(self, objects=True):
+        """Iterate over AttributeFields(uuid, type, value, category, to_ids, tags) of the attributes of the event
+        (and of the objects), without creating the MISPAttributes not materialized yet (see lazy).
+        The values are read-only, the tags are the names."""
+        for attribute in _raw_items(self.Attribute):
+            yield self._fields(attribute)
+        if objects:
+            for obj in _raw_items(self.Object):
+                for attribute in ((obj.get('Attribute') or []) if isinstance(obj, dict) else obj.attributes):
+                    yield self._fields(attribute)
+
     def to_dict(self):
         to_return = super(MISPEvent, self).to_dict()
+        for key in ('Attribute', 'Object'):
+            if isinstance(to_return.get(key), _LazyList):
+                # The JSON encoder reads the items of the lists directly
+                to_return[key] = list(to_return[key])
 
         if to_return.get('date'):
             if isinstance(self.date, datetime.datetime):
@@ -612,8 +764,9 @@ class MISPEvent(AbstractMISP):
         if isinstance(value, list):
             attr_list = [self.add_attribute(type=type, value=a, **kwargs) for a in value]
         else:
-            attribute = MISPAttribute()
-            attribute.from_dict(type=type, value=value, **kwargs)
+            with phase('attribute.create'):
+                attribute = MISPAttribute()
+                attribute.from_dict(type=type, value=value, **kwargs)
             self.attributes.append(attribute)
         self.edited = True
         if attr_list:
@@ -621,6 +774,64 @@ class MISPEvent(AbstractMISP):
         else:
             return attribute
 
+    @staticmethod
+    def _attribute_key(type, value):
+        if not isinstance(value, basestring):
+            value = str(value)
+        return (type, value)
+
+    def _get_attribute_keys(self):
+        """Set of (type, value) of the attributes of the event (not the ones of the objects).
+        Kept between the calls: only the attributes appended since the last call are indexed. The set is rebuilt
+        if the list was replaced or shortened, if its last indexed item changed (removed, replaced), or if the type
+        or value of an attribute was edited in place. Replacing an item in the middle of the list isn't detected."""
+        indexed_list, indexed, last, edits, keys = self.__attribute_keys
+        if (indexed_list is not self.Attribute or edits != MISPAttribute._key_edits or len(self.Attribute) < indexed
+                or (indexed and list.__getitem__(self.Attribute, indexed - 1) is not last)):
+            indexed, keys = 0, set()
+        for a in itertools.islice(_raw_items(self.Attribute), indexed, None):
+            if isinstance(a, dict):
+                keys.add(self._attribute_key(a.get('type'), a.get('value')))
+            else:
+                keys.add(self._attribute_key(a.type, a.value))
+        last = list.__getitem__(self.Attribute, -1) if self.Attribute else None
+        self.__attribute_keys = (self.Attribute, len(self.Attribute), last, MISPAttribute._key_edits, keys)
+        return keys
+
+    def add_attributes(self, attributes, deduplicate=True):
+        """Add attributes in bulk, skipping the ones already in the event (same type and value)
+        :attributes: MISPAttributes or dictionaries (type and value are required, a list of values adds one attribute per value)
+        :deduplicate: If False, all the attributes are added
+        Returns (list of the new MISPAttributes, list of the duplicate inputs). No MISPAttribute is created for the duplicates.
+        """
+        new = []
+        duplicates = []
+        self._add_attributes(attributes, deduplicate, self._get_attribute_keys() if deduplicate else set(), new, duplicates)
+        if new:
+            self.edited = True
+            # Index the new attributes (their keys are already in the set)
+            self._get_attribute_keys()
+        return new, duplicates
+
+    def _add_attributes(self, attributes, deduplicate, keys, new, duplicates):
+        for attribute in attributes:
+            if isinstance(attribute, MISPAttribute):
+                key = self._attribute_key(attribute.type, attribute.value)
+            elif isinstance(attribute.get('value'), list):
+                self._add_attributes((dict(attribute, value=v) for v in attribute['value']), deduplicate, keys, new, duplicates)
+                continue
+            else:
+                key = self._attribute_key(attribute.get('type'), attribute.get('value'))
+            if deduplicate and key in keys:
+                duplicates.append(attribute)
+                continue
+            if isinstance(attribute, MISPAttribute):
+                self.attributes.append(attribute)
+            else:
+                attribute = self.add_attribute(**attribute)
+            keys.add(key)
+            new.append(attribute)
+
     def get_object_by_id(self, object_id):
         """Get an object by ID (the ID is the one set by the server when creating the new object)"""
         for obj in self.objects:
@@ -640,15 +851,17 @@ class MISPEvent(AbstractMISP):
         if isinstance(obj, MISPObject):
             misp_obj = obj
         elif isinstance(obj, dict):
-            misp_obj = MISPObject(name=obj.pop('name'), strict=obj.pop('strict', False),
-                                  default_attributes_parameters=obj.pop('default_attributes_parameters', {}),
-                                  **obj)
-            misp_obj.from_dict(**obj)
+            with phase('object.create'):
+                misp_obj = MISPObject(name=obj.pop('name'), strict=obj.pop('strict', False),
+                                      default_attributes_parameters=obj.pop('default_attributes_parameters', {}),
+                                      **obj)
+                misp_obj.from_dict(**obj)
         elif kwargs:
-            misp_obj = MISPObject(name=kwargs.pop('name'), strict=kwargs.pop('strict', False),
-                                  default_attributes_parameters=kwargs.pop('default_attributes_parameters', {}),
-                                  **kwargs)
-            misp_obj.from_dict(**kwargs)
+            with phase('object.create'):
+                misp_obj = MISPObject(name=kwargs.pop('name'), strict=kwargs.pop('strict', False),
+                                      default_attributes_parameters=kwargs.pop('default_attributes_parameters', {}),
+                                      **kwargs)
+                misp_obj.from_dict(**kwargs)
         else:
             raise InvalidMISPObject("An object to add to an existing Event needs to be either a MISPObject, or a plain python dictionary")
         self.Object.append(misp_obj)
@@ -673,8 +886,7 @@ class MISPEvent(AbstractMISP):
 
     def sign(self, gpg_uid, passphrase=None):  # pragma: no cover
         # Not used
-        if not has_pyme:
-            raise PyMISPError('pyme is required, please install: pip install --pre pyme3. You will also need libgpg-error-dev and libgpgme11-dev.')
+        gpg, mode = _gpg()
         to_sign = self._serialize()
         with gpg.Context() as c:
             keys = list(c.keylist(gpg_uid))
@@ -696,8 +908,7 @@ class MISPEvent(AbstractMISP):
 
     def verify(self, gpg_uid):  # pragma: no cover
         # Not used
-        if not has_pyme:
-            raise PyMISPError('pyme is required, please install: pip install --pre pyme3. You will also need libgpg-error-dev and libgpgme11-dev.')
+        gpg, mode = _gpg()
         to_return = {}
         signed_data = self._serialize()
         with gpg.Context() as c:
@@ -873,8 +1084,9 @@ class MISPObject(AbstractMISP):
             else:
                 self._known_template = False
         if self._known_template:
-            with open(template_path, 'r') as f:
-                self._definition = json.load(f)
+            with phase('object.template_load'):
+                with open(template_path, 'r') as f:
+                    self._definition = json.load(f)
             setattr(self, 'meta-category', self._definition['meta-category'])
             self.template_uuid = self._definition['uuid']
             self.description = self._definition['description']
@@ -999,17 +1211,18 @@ class MISPObject(AbstractMISP):
         dictionary with all the keys supported by MISPAttribute"""
         if value.get('value') is None:
             return None
-        if self._known_template:
-            if self._definition['attributes'].get(object_relation):
-                attribute = MISPObjectAttribute(self._definition['attributes'][object_relation])
+        with phase('object.add_attribute'):
+            if self._known_template:
+                if self._definition['attributes'].get(object_relation):
+                    attribute = MISPObjectAttribute(self._definition['attributes'][object_relation])
+                else:
+                    # Woopsie, this object_relation is unknown, no sane defaults for you.
+                    logger.warning("The template ({}) doesn't have the object_relation ({}) you're trying to add.".format(self.name, object_relation))
+                    attribute = MISPObjectAttribute({})
             else:
-                # Woopsie, this object_relation is unknown, no sane defaults for you.
-                logger.warning("The template ({}) doesn't have the object_relation ({}) you're trying to add.".format(self.name, object_relation))
                 attribute = MISPObjectAttribute({})
-        else:
-            attribute = MISPObjectAttribute({})
-        # Overwrite the parameters of self._default_attributes_parameters with the ones of value
-        attribute.from_dict(object_relation=object_relation, **dict(self._default_attributes_parameters, **value))
+            # Overwrite the parameters of self._default_attributes_parameters with the ones of value
+            attribute.from_dict(object_relation=object_relation, **dict(self._default_attributes_parameters, **value))
         self.__fast_attribute_access[object_relation].append(attribute)
         self.Attribute.append(attribute)
         self.edited = True
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Read-only views over the JSON returned by MISP (search, search_index, get_event, ...).
+
+The views wrap the dictionaries without copying or validating them, and expose the same names as
+MISPEvent/MISPAttribute/MISPObject (attributes, objects, tags, type, value, ...):
+
+    for event in view_events(misp.search(values='8.8.8.8')):
+        for attribute in event.attributes:
+            print(attribute.type, attribute.value, [tag.name for tag in attribute.tags])
+
+The other keys of the dictionaries are available as attributes too (event.Orgc, attribute.first_seen, ...).
+Use to_misp() to get a full (editable) MISPEvent/MISPAttribute.
+"""
+
+import datetime
+import json
+import sys
+
+from .mispevent import MISPEvent, MISPAttribute
+
+if sys.version_info >= (3, 3):
+    _utc = datetime.timezone.utc
+else:
+    from .mispevent import UTC
+    _utc = UTC()
+
+
+def _int(value):
+    return int(value) if value is not None else None
+
+
+def _bool(value):
+    if value is None or isinstance(value, bool):
+        return value
+    return bool(int(value))
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    return datetime.datetime.fromtimestamp(int(value), _utc)
+
+
+class _View(object):
+    """Read-only access to a dictionary, by key or attribute"""
+
+    __slots__ = ('_data', )
+
+    def __init__(self, data):
+        object.__setattr__(self, '_data', data)
+
+    def __getattr__(self, name):
+        if name == '_data':
+            # Not initialized (copy, pickle)
+            raise AttributeError(name)
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is read-only.'.format(self.__class__.__name__))
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def to_dict(self):
+        """The wrapped dictionary (not a copy)"""
+        return self._data
+
+    def to_json(self):
+        return json.dumps(self._data, sort_keys=True, indent=2)
+
+
+class TagView(_View):
+
+    __slots__ = ()
+
+    @property
+    def name(self):
+        return self._data.get('name')
+
+    def __repr__(self):
+        return '<{self.__class__.__name__}(name={self.name})'.format(self=self)
+
+
+def _tags(tags):
+    return [TagView(tag) for tag in tags or ()]
+
+
+class AttributeView(_View):
+
+    __slots__ = ()
+
+    @property
+    def uuid(self):
+        return self._data.get('uuid')
+
+    @property
+    def type(self):
+        return self._data.get('type')
+
+    @property
+    def value(self):
+        return self._data.get('value')
+
+    @property
+    def category(self):
+        return self._data.get('category')
+
+    @property
+    def to_ids(self):
+        return _bool(self._data.get('to_ids'))
+
+    @property
+    def comment(self):
+        return self._data.get('comment')
+
+    @property
+    def object_relation(self):
+        return self._data.get('object_relation')
+
+    @property
+    def deleted(self):
+        return _bool(self._data.get('deleted'))
+
+    @property
+    def id(self):
+        return _int(self._data.get('id'))
+
+    @property
+    def event_id(self):
+        return _int(self._data.get('event_id'))
+
+    @property
+    def object_id(self):
+        return _int(self._data.get('object_id'))
+
+    @property
+    def distribution(self):
+        return _int(self._data.get('distribution'))
+
+    @property
+    def timestamp(self):
+        return _timestamp(self._data.get('timestamp'))
+
+    @property
+    def tags(self):
+        return _tags(self._data.get('Tag'))
+
+    @property
+    def shadow_attributes(self):
+        return [AttributeView(a) for a in self._data.get('ShadowAttribute') or ()]
+
+    def to_misp(self):
+        """Editable copy of the attribute, as MISPAttribute"""
+        attribute = MISPAttribute()
+        attribute.from_dict(**json.loads(json.dumps(self._data)))
+        return attribute
+
+    def __repr__(self):
+        return '<{self.__class__.__name__}(type={self.type}, value={self.value})'.format(self=self)
+
+
+class ObjectView(_View):
+
+    __slots__ = ()
+
+    @property
+    def uuid(self):
+        return self._data.get('uuid')
+
+    @property
+    def name(self):
+        return self._data.get('name')
+
+    @property
+    def id(self):
+        return _int(self._data.get('id'))
+
+    @property
+    def distribution(self):
+        return _int(self._data.get('distribution'))
+
+    @property
+    def timestamp(self):
+        return _timestamp(self._data.get('timestamp'))
+
+    @property
+    def attributes(self):
+        return [AttributeView(a) for a in self._data.get('Attribute') or ()]
+
+    @property
+    def references(self):
+        return [_View(r) for r in self._data.get('ObjectReference') or ()]
+
+    def get_attributes_by_relation(self, object_relation):
+        return [AttributeView(a) for a in self._data.get('Attribute') or () if a.get('object_relation') == object_relation]
+
+    def __repr__(self):
+        return '<{self.__class__.__name__}(name={self.name})'.format(self=self)
+
+
+class EventView(_View):
+
+    __slots__ = ()
+
+    def __init__(self, data):
+        """:data: Event as dictionary, with or without the 'Event' key"""
+        if 'Event' in data and 'info' not in data:
+            data = data['Event']
+        super(EventView, self).__init__(data)
+
+    @property
+    def uuid(self):
+        return self._data.get('uuid')
+
+    @property
+    def info(self):
+        return self._data.get('info')
+
+    @property
+    def id(self):
+        return _int(self._data.get('id'))
+
+    @property
+    def date(self):
+        date = self._data.get('date')
+        if date is None:
+            return None
+        return datetime.datetime.strptime(date, '%Y-%m-%d').date()
+
+    @property
+    def published(self):
+        return _bool(self._data.get('published'))
+
+    @property
+    def distribution(self):
+        return _int(self._data.get('distribution'))
+
+    @property
+    def threat_level_id(self):
+        return _int(self._data.get('threat_level_id'))
+
+    @property
+    def analysis(self):
+        return _int(self._data.get('analysis'))
+
+    @property
+    def timestamp(self):
+        return _timestamp(self._data.get('timestamp'))
+
+    @property
+    def attributes(self):
+        return [AttributeView(a) for a in self._data.get('Attribute') or ()]
+
+    @property
+    def objects(self):
+        return [ObjectView(o) for o in self._data.get('Object') or ()]
+
+    @property
+    def tags(self):
+        if 'Tag' in self._data:
+            return _tags(self._data['Tag'])
+        # Format of events/index
+        return [TagView(event_tag['Tag']) for event_tag in self._data.get('EventTag') or ()]
+
+    @property
+    def related_events(self):
+        return [EventView(e) for e in self._data.get('RelatedEvent') or ()]
+
+    def all_attributes(self):
+        """Iterate over the attributes of the event and of its objects"""
+        for attribute in self._data.get('Attribute') or ():
+            yield AttributeView(attribute)
+        for obj in self._data.get('Object') or ():
+            for attribute in obj.get('Attribute') or ():
+                yield AttributeView(attribute)
+
+    def to_misp(self, lazy=False):
+        """Editable copy of the event, as MISPEvent"""
+        event = MISPEvent(lazy=lazy)
+        event.load({'Event': json.loads(json.dumps(self._data))})
+        return event
+
+    def __repr__(self):
+        return '<{self.__class__.__name__}(info={self.info})'.format(self=self)
+
+
+def _entries(response):
+    if isinstance(response, dict):
+        response = response.get('response', [response])
+    return response
+
+
+def view_events(response):
+    """List of EventViews of a search (controller events), search_index or get_event response"""
+    return [EventView(event) for event in _entries(response)]
+
+
+def view_attributes(response):
+    """List of AttributeViews of a search on the attributes controller ({'response': {'Attribute': [...]}})
+    or of a list of attributes"""
+    entries = _entries(response)
+    if isinstance(entries, dict):
+        entries = entries.get('Attribute', [])
+    return [AttributeView(attribute) for attribute in entries]
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Opt-in profiling of the phases of event loading and serialization.
+
+    profiler = PhaseProfiler()
+    with profiler:
+        event = MISPEvent()
+        event.load(data)
+    print(profiler.format_table())
+
+The phases (see PHASES) are measured in the thread where the profiler is active, the other threads are not
+affected. For production use, profile a sample of the calls:
+
+    profiler = PhaseProfiler(sample_rate=0.01)
+    with profiler.sample():
+        ...
+
+The results can also be exported as pstats.Stats (profiler.to_pstats(), profiler.dump_stats(path)), readable by
+the usual cProfile tools.
+"""
+
+import logging
+import random
+import threading
+import time
+
+try:
+    import tracemalloc
+    has_tracemalloc = True
+except ImportError:
+    has_tracemalloc = False
+
+logger = logging.getLogger('pymisp')
+
+PHASES = {
+    'event.json_decode': 'MISPEvent.load: JSON decoding',
+    'event.schema_validation': 'MISPEvent.load: validation with the JSON schema',
+    'event.from_dict': 'MISPEvent.from_dict',
+    'attribute.create': 'MISPEvent.add_attribute: creation of one attribute',
+    'attribute.describe_types': 'MISPAttribute.__init__: loading of describeTypes.json',
+    'tag.create': 'MISPEvent.from_dict: creation of the tags of the event',
+    'object.create': 'MISPEvent.add_object: creation of one object',
+    'object.template_load': 'MISPObject.__init__: loading of the object template',
+    'object.add_attribute': 'MISPObject.add_attribute',
+    'to_json': 'AbstractMISP.to_json',
+}
+
+_local = threading.local()
+
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name):
+    """Context manager measuring a phase if a profiler is active in this thread (no-op otherwise)"""
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        return _NULL_PHASE
+    return _Phase(profiler, name)
+
+
+class _Phase(object):
+
+    __slots__ = ('profiler', 'name', 'start', 'memory', 'children')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.children = 0.
+        self.memory = tracemalloc.get_traced_memory()[0] if self.profiler._tracing else None
+        _local.stack.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        duration = time.time() - self.start
+        allocated = tracemalloc.get_traced_memory()[0] - self.memory if self.memory is not None else None
+        stack = _local.stack
+        stack.pop()
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            parent.children += duration
+        self.profiler._add(self.name, parent.name if parent is not None else None, duration, duration - self.children, allocated)
+        return False
+
+
+class _PhaseStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.own = 0.
+        self.allocated = None
+
+    def add(self, duration, own, allocated):
+        self.count += 1
+        self.total += duration
+        self.own += own
+        if allocated is not None:
+            self.allocated = (self.allocated or 0) + allocated
+
+
+class _StatsExport(object):
+    """Minimal profiler-like object accepted by pstats.Stats"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class PhaseProfiler(object):
+
+    def __init__(self, track_allocations=False, sample_rate=1., seed=None):
+        """Aggregates the time (and optionally the memory) spent in each phase
+        :track_allocations: Also measure the memory allocated in each phase (tracemalloc, slow)
+        :sample_rate: Probability of profiling a block run with sample()
+        """
+        if track_allocations and not has_tracemalloc:
+            logger.warning('tracemalloc is not available, the allocations will not be tracked.')
+            track_allocations = False
+        self.track_allocations = track_allocations
+        self.sample_rate = sample_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tracing = False
+        self._started_tracemalloc = False
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.callers = {}
+            self.samples = 0
+
+    def _add(self, name, parent, duration, own, allocated):
+        with self._lock:
+            if name not in self.stats:
+                self.stats[name] = _PhaseStats()
+            self.stats[name].add(duration, own, allocated)
+            if parent is not None:
+                if (parent, name) not in self.callers:
+                    self.callers[(parent, name)] = _PhaseStats()
+                self.callers[(parent, name)].add(duration, own, None)
+
+    def __enter__(self):
+        if getattr(_local, 'profiler', None) is not None:
+            raise RuntimeError('A profiler is already active in this thread.')
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._tracing = self.track_allocations
+        _local.profiler = self
+        _local.stack = []
+        with self._lock:
+            self.samples += 1
+        return self
+
+    def __exit__(self, *args):
+        _local.profiler = None
+        _local.stack = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        return False
+
+    def sample(self):
+        """Context manager profiling the block with a probability of sample_rate"""
+        if self._random.random() < self.sample_rate:
+            return self
+        return _NULL_PHASE
+
+    def summary(self):
+        """List of {phase, count, total, own, mean, allocated}, sorted by total time (seconds, bytes)"""
+        with self._lock:
+            rows = [{'phase': name, 'count': s.count, 'total': s.total, 'own': s.own, 'mean': s.total / s.count,
+                     'allocated': s.allocated} for name, s in self.stats.items()]
+        return sorted(rows, key=lambda r: r['total'], reverse=True)
+
+    def format_table(self):
+        """Summary as a text table. own is the time spent in the phase itself, without the nested phases."""
+        lines = ['{:<26} {:>8} {:>10} {:>10} {:>11} {:>12}'.format('phase', 'count', 'total (s)', 'own (s)', 'mean (ms)', 'allocated')]
+        for row in self.summary():
+            allocated = '{:.1f}KB'.format(row['allocated'] / 1024.) if row['allocated'] is not None else '-'
+            lines.append('{:<26} {:>8} {:>10.4f} {:>10.4f} {:>11.4f} {:>12}'.format(
+                row['phase'], row['count'], row['total'], row['own'], row['mean'] * 1000, allocated))
+        return '\n'.join(lines)
+
+    def to_pstats(self):
+        """Results as pstats.Stats: one pseudo function per phase, the nested phases are the callees"""
+        import pstats
+
+        def key(name):
+            return ('pymisp', 0, name)
+
+        with self._lock:
+            stats = {}
+            for name, s in self.stats.items():
+                callers = {}
+                for (parent, child), c in self.callers.items():
+                    if child == name:
+                        callers[key(parent)] = (c.count, c.count, c.own, c.total)
+                stats[key(name)] = (s.count, s.count, s.own, s.total, callers)
+        return pstats.Stats(_StatsExport(stats))
+
+    def dump_stats(self, path):
+        """Write the results in the cProfile/pstats file format"""
+        self.to_pstats().dump_stats(path)
+
+
+def profile(track_allocations=False):
+    """Shortcut for a PhaseProfiler profiling every call: with profile() as profiler: ..."""
+    return PhaseProfiler(track_allocations=track_allocations)
@@ -1,20 +1,59 @@
+import importlib
 import sys
 
-from .vtreportobject import VTReportObject  # noqa
-from .neo4j import Neo4j  # noqa
-from .fileobject import FileObject  # noqa
-from .peobject import PEObject, PESectionObject  # noqa
-from .elfobject import ELFObject, ELFSectionObject  # noqa
-from .machoobject import MachOObject, MachOSectionObject  # noqa
-from .create_misp_object import make_binary_objects  # noqa
-from .abstractgenerator import AbstractMISPObjectGenerator  # noqa
-from .genericgenerator import GenericObjectGenerator  # noqa
-from .openioc import load_openioc, load_openioc_file  # noqa
-from .sbsignatureobject import SBSignatureObject  # noqa
-from .fail2banobject import Fail2BanObject  # noqa
-from .domainipobject import DomainIPObject  # noqa
-from .asnobject import ASNObject  # noqa
-from .geolocationobject import GeolocationObject  # noqa
+# Name -> submodule. On python >= 3.7, the submodules (and their optional dependencies) are imported on first access.
+_LAZY_ATTRIBUTES = {
+    'VTReportObject': '.vtreportobject',
+    'Neo4j': '.neo4j',
+    'FileObject': '.fileobject',
+    'PEObject': '.peobject',
+    'PESectionObject': '.peobject',
+    'ELFObject': '.elfobject',
+    'ELFSectionObject': '.elfobject',
+    'MachOObject': '.machoobject',
+    'MachOSectionObject': '.machoobject',
+    'make_binary_objects': '.create_misp_object',
+    'AbstractMISPObjectGenerator': '.abstractgenerator',
+    'GenericObjectGenerator': '.genericgenerator',
+    'load_openioc': '.openioc',
+    'load_openioc_file': '.openioc',
+    'load_openioc_stream': '.openioc',
+    'SBSignatureObject': '.sbsignatureobject',
+    'Fail2BanObject': '.fail2banobject',
+    'DomainIPObject': '.domainipobject',
+    'ASNObject': '.asnobject',
+    'GeolocationObject': '.geolocationobject',
+    'EMailObject': '.emailobject',
+}
 
-if sys.version_info >= (3, 6):
-    from .emailobject import EMailObject  # noqa
+if sys.version_info < (3, 7):
+    from .vtreportobject import VTReportObject  # noqa
+    from .neo4j import Neo4j  # noqa
+    from .fileobject import FileObject  # noqa
+    from .peobject import PEObject, PESectionObject  # noqa
+    from .elfobject import ELFObject, ELFSectionObject  # noqa
+    from .machoobject import MachOObject, MachOSectionObject  # noqa
+    from .create_misp_object import make_binary_objects  # noqa
+    from .abstractgenerator import AbstractMISPObjectGenerator  # noqa
+    from .genericgenerator import GenericObjectGenerator  # noqa
+    from .openioc import load_openioc, load_openioc_file, load_openioc_stream  # noqa
+    from .sbsignatureobject import SBSignatureObject  # noqa
+    from .fail2banobject import Fail2BanObject  # noqa
+    from .domainipobject import DomainIPObject  # noqa
+    from .asnobject import ASNObject  # noqa
+    from .geolocationobject import GeolocationObject  # noqa
+
+    if sys.version_info >= (3, 6):
+        from .emailobject import EMailObject  # noqa
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
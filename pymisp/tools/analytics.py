@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Situational awareness reports (tags over time, taxonomies, attribute types, tags per event) computed with
+vectorized pandas operations on the tables of pymisp.tools.columnar.EventTables.to_pandas()."""
+
+from datetime import datetime
+
+try:
+    import numpy
+    import pandas
+    has_pandas = True
+except ImportError:
+    has_pandas = False
+
+try:
+    from pytaxonomies import Taxonomies
+    has_pytaxonomies = True
+except ImportError:
+    has_pytaxonomies = False
+
+
+def _check_pandas():
+    if not has_pandas:
+        raise Exception('pandas is required, please install: pip install pandas')
+
+
+def _to_datetime64(date):
+    if date is None:
+        return None
+    return numpy.datetime64(pandas.Timestamp(date).normalize().date(), 'D')
+
+
+def select_in_range(events, begin=None, end=None, column='date'):
+    """Events (DataFrame) with a date between begin and end (included)
+    :begin: defaults to epoch
+    :end: defaults to today"""
+    _check_pandas()
+    dates = events[column].values.astype('datetime64[D]')
+    begin = _to_datetime64(begin) if begin is not None else numpy.datetime64('1970-01-01', 'D')
+    end = _to_datetime64(end) if end is not None else _to_datetime64(datetime.now())
+    return events[(dates >= begin) & (dates <= end)]
+
+
+def event_tag_names(tables):
+    """DataFrame of the tags of the events: event_key, date, name, colour"""
+    _check_pandas()
+    event_tags = tables['event_tags'].merge(tables['tags'], on='tag_key')
+    return event_tags.merge(tables['events'][['event_key', 'date']], on='event_key')[['event_key', 'date', 'name', 'colour']]
+
+
+def tag_counts(tables, include_attributes=False):
+    """Amount of events (and attributes, if include_attributes) tagged with each tag, sorted descending"""
+    _check_pandas()
+    keys = tables['event_tags']['tag_key']
+    if include_attributes:
+        keys = pandas.concat([keys, tables['attribute_tags']['tag_key']])
+    counts = numpy.bincount(keys.values, minlength=len(tables['tags']))
+    return pandas.Series(counts, index=tables['tags']['name'].values).sort_values(ascending=False)
+
+
+def tag_colours(tables):
+    """{tag name: colour}"""
+    _check_pandas()
+    return dict(zip(tables['tags']['name'], tables['tags']['colour']))
+
+
+def tag_counts_over_time(tables, periods, days=1, end=None):
+    """Amount of events tagged with each tag, in consecutive periods of `days` days ending at `end`.
+    Returns a DataFrame (tags x end date of the periods, oldest first), filled with 0.
+    A period contains the events with end - days < date <= end."""
+    _check_pandas()
+    end = _to_datetime64(end) if end is not None else _to_datetime64(datetime.now())
+    tags = event_tag_names(tables)
+    age = (end - tags['date'].values.astype('datetime64[D]')).astype('timedelta64[D]').astype(numpy.int64)
+    period = age // days
+    mask = (age >= 0) & (period < periods)
+    columns = [str(end - numpy.timedelta64(days * p, 'D')) for p in range(periods - 1, -1, -1)]
+    if not mask.any():
+        return pandas.DataFrame(columns=columns, dtype=numpy.int64)
+    # Oldest period first
+    position = periods - 1 - period[mask]
+    names = pandas.Categorical(tags['name'].values[mask])
+    counts = numpy.zeros((len(names.categories), periods), dtype=numpy.int64)
+    numpy.add.at(counts, (names.codes, position), 1)
+    return pandas.DataFrame(counts, index=names.categories, columns=columns)
+
+
+def linear_trend(dataframe):
+    """Least squares line of each row of a DataFrame (x = column position), same shape as the input"""
+    _check_pandas()
+    y = dataframe.values.astype(float)
+    x = numpy.arange(y.shape[1], dtype=float)
+    x_centered = x - x.mean()
+    slope = (y - y.mean(axis=1, keepdims=True)).dot(x_centered) / (x_centered ** 2).sum()
+    intercept = y.mean(axis=1) - slope * x.mean()
+    return pandas.DataFrame(numpy.outer(slope, x) + intercept[:, None], index=dataframe.index, columns=dataframe.columns)
+
+
+def tag_taxonomies(tag_names, taxonomies=None):
+    """Taxonomy (namespace) of each tag, None for the tags that aren't in a known taxonomy.
+    :tag_names: iterable of tag names
+    :taxonomies: names of the known taxonomies, defaults to the ones of pytaxonomies"""
+    _check_pandas()
+    if taxonomies is None:
+        if not has_pytaxonomies:
+            raise Exception('pytaxonomies is required, please install: pip install pytaxonomies')
+        taxonomies = list(Taxonomies().keys())
+    names = pandas.Series(list(tag_names), dtype=object)
+    namespaces = names.str.split(':', n=1).str[0]
+    # dtype=object: pandas 3 would infer a string dtype, with NaN instead of None
+    return pandas.Series(numpy.where(namespaces.isin(set(taxonomies)), namespaces.values, None), index=names.values, dtype=object)
+
+
+def taxonomy_breakdown(dataframe, taxonomies=None):
+    """Split a DataFrame indexed by tag name by taxonomy.
+    Returns {taxonomy: sub-DataFrame}, the tags without taxonomy are under the None key."""
+    _check_pandas()
+    groups = tag_taxonomies(dataframe.index, taxonomies).fillna('')
+    to_return = {}
+    for taxonomy, group in dataframe.groupby(groups.values):
+        to_return[taxonomy or None] = group
+    return to_return
+
+
+def attribute_type_counts(tables):
+    """Amount of attributes per (category, type), for the treemaps"""
+    _check_pandas()
+    attributes = tables['attributes']
+    return attributes.groupby(['category', 'type'], observed=True).size().rename('count')
+
+
+def tags_per_event(tables, begin, end, days):
+    """Distribution of the amount of tags per event, in periods of `days` days between begin and end.
+    Returns a DataFrame: date (end of the period), tags (amount of tags on the event), events (amount of events)"""
+    _check_pandas()
+    end = _to_datetime64(end)
+    begin = _to_datetime64(begin)
+    events = select_in_range(tables['events'], begin + numpy.timedelta64(1, 'D'), end)
+    nb_tags = numpy.bincount(tables['event_tags']['event_key'].values, minlength=len(tables['events']))
+    age = (end - events['date'].values.astype('datetime64[D]')).astype('timedelta64[D]').astype(numpy.int64)
+    period_end = end - (age // days * days).astype('timedelta64[D]')
+    counts = pandas.DataFrame({'date': period_end, 'tags': nb_tags[events['event_key'].values]})
+    return counts.groupby(['date', 'tags']).size().rename('events').reset_index()
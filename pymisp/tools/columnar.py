@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Columnar representation of MISP events, for analytics.
+
+The events (JSON, as returned by the API) are flattened in one pass into column lists, without creating
+MISPEvent/MISPAttribute objects, and the columns are then converted at once to NumPy arrays, pandas
+DataFrames or Arrow tables. The tables are linked by integer keys (position in the referenced table):
+
+    * events: event_key, id, uuid, info, date, timestamp, published, analysis, threat_level_id, distribution, orgc
+    * objects: object_key, event_key, id, uuid, name, meta_category, distribution, timestamp
+    * attributes: attribute_key, event_key, object_key (-1 if not in an object), id, uuid, type, category, value,
+      to_ids, distribution, timestamp, comment
+    * tags: tag_key, name, colour (one row per distinct tag)
+    * event_tags: event_key, tag_key
+    * attribute_tags: attribute_key, tag_key
+    * sightings: attribute_key, event_key, type, date_sighting, source, org
+"""
+
+import json
+
+from .. import MISPEvent
+
+try:
+    import numpy
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+try:
+    import pandas
+    has_pandas = True
+except ImportError:
+    has_pandas = False
+
+try:
+    import pyarrow
+    has_pyarrow = True
+except ImportError:
+    has_pyarrow = False
+
+# Column kinds: int (missing: -1), bool, str, category (repeated strings), date (YYYY-MM-DD), timestamp (epoch)
+SCHEMA = {
+    'events': [('event_key', 'int'), ('id', 'int'), ('uuid', 'str'), ('info', 'str'), ('date', 'date'),
+               ('timestamp', 'timestamp'), ('published', 'bool'), ('analysis', 'int'), ('threat_level_id', 'int'),
+               ('distribution', 'int'), ('orgc', 'category')],
+    'objects': [('object_key', 'int'), ('event_key', 'int'), ('id', 'int'), ('uuid', 'str'), ('name', 'category'),
+                ('meta_category', 'category'), ('distribution', 'int'), ('timestamp', 'timestamp')],
+    'attributes': [('attribute_key', 'int'), ('event_key', 'int'), ('object_key', 'int'), ('id', 'int'), ('uuid', 'str'),
+                   ('type', 'category'), ('category', 'category'), ('value', 'str'), ('to_ids', 'bool'),
+                   ('distribution', 'int'), ('timestamp', 'timestamp'), ('comment', 'str')],
+    'tags': [('tag_key', 'int'), ('name', 'str'), ('colour', 'str')],
+    'event_tags': [('event_key', 'int'), ('tag_key', 'int')],
+    'attribute_tags': [('attribute_key', 'int'), ('tag_key', 'int')],
+    'sightings': [('attribute_key', 'int'), ('event_key', 'int'), ('type', 'int'), ('date_sighting', 'timestamp'),
+                  ('source', 'category'), ('org', 'category')],
+}
+
+_TRUE = (True, 1, '1', 'true', 'True')
+
+
+def _iter_events(events):
+    if isinstance(events, MISPEvent):
+        events = [events]
+    elif isinstance(events, dict):
+        events = events.get('response', [events])
+    for event in events:
+        if isinstance(event, MISPEvent):
+            # Already loaded, go through the JSON dump to get plain dictionaries
+            event = json.loads(event.to_json())
+        yield event.get('Event', event)
+
+
+def _to_int(values):
+    to_return = []
+    for v in values:
+        try:
+            to_return.append(int(v))
+        except (TypeError, ValueError):
+            to_return.append(-1)
+    return to_return
+
+
+class EventTables(object):
+
+    def __init__(self, events=None):
+        """Columnar tables of events (see the module documentation)
+        :events: MISPEvent, event as dictionary, list of them, or a search result ({'response': [...]})
+        """
+        self.columns = {table: {name: [] for name, _ in schema} for table, schema in SCHEMA.items()}
+        self._tag_keys = {}
+        if events is not None:
+            self.add_events(events)
+
+    def __len__(self):
+        return len(self.columns['events']['event_key'])
+
+    def _tag_key(self, tag):
+        name = tag.get('name')
+        key = self._tag_keys.get(name)
+        if key is None:
+            tags = self.columns['tags']
+            key = len(tags['tag_key'])
+            self._tag_keys[name] = key
+            tags['tag_key'].append(key)
+            tags['name'].append(name)
+            tags['colour'].append(tag.get('colour'))
+        return key
+
+    def add_events(self, events):
+        for event in _iter_events(events):
+            self.add_event(event)
+
+    def add_event(self, event):
+        """Append an event (dictionary, as returned by the API) to the tables"""
+        event = event.get('Event', event)
+        c = self.columns['events']
+        event_key = len(c['event_key'])
+        c['event_key'].append(event_key)
+        for field in ('id', 'uuid', 'info', 'date', 'timestamp', 'published', 'analysis', 'threat_level_id', 'distribution'):
+            c[field].append(event.get(field))
+        c['orgc'].append(event.get('Orgc', {}).get('name'))
+
+        event_tags = self.columns['event_tags']
+        for tag in event.get('Tag', []):
+            event_tags['event_key'].append(event_key)
+            event_tags['tag_key'].append(self._tag_key(tag))
+
+        for attribute in event.get('Attribute', []):
+            self._add_attribute(attribute, event_key, -1)
+
+        c = self.columns['objects']
+        for obj in event.get('Object', []):
+            object_key = len(c['object_key'])
+            c['object_key'].append(object_key)
+            c['event_key'].append(event_key)
+            for field in ('id', 'uuid', 'name', 'distribution', 'timestamp'):
+                c[field].append(obj.get(field))
+            c['meta_category'].append(obj.get('meta-category'))
+            for attribute in obj.get('Attribute', []):
+                self._add_attribute(attribute, event_key, object_key)
+
+    def _add_attribute(self, attribute, event_key, object_key):
+        c = self.columns['attributes']
+        attribute_key = len(c['attribute_key'])
+        c['attribute_key'].append(attribute_key)
+        c['event_key'].append(event_key)
+        c['object_key'].append(object_key)
+        for field in ('id', 'uuid', 'type', 'category', 'value', 'to_ids', 'distribution', 'timestamp', 'comment'):
+            c[field].append(attribute.get(field))
+
+        attribute_tags = self.columns['attribute_tags']
+        for tag in attribute.get('Tag', []):
+            attribute_tags['attribute_key'].append(attribute_key)
+            attribute_tags['tag_key'].append(self._tag_key(tag))
+
+        sightings = self.columns['sightings']
+        for sighting in attribute.get('Sighting', []):
+            sightings['attribute_key'].append(attribute_key)
+            sightings['event_key'].append(event_key)
+            sightings['type'].append(sighting.get('type', 0))
+            sightings['date_sighting'].append(sighting.get('date_sighting'))
+            sightings['source'].append(sighting.get('source'))
+            sightings['org'].append(sighting.get('Organisation', {}).get('name'))
+
+    def _numpy_column(self, values, kind):
+        if kind in ('int', 'timestamp'):
+            return numpy.array(_to_int(values), dtype=numpy.int64)
+        if kind == 'bool':
+            return numpy.array([v in _TRUE for v in values], dtype=bool)
+        if kind == 'date':
+            return numpy.array([v if v else 'NaT' for v in values], dtype='datetime64[D]')
+        return numpy.array(values, dtype=object)
+
+    def to_numpy(self):
+        """Returns {table: {column: numpy array}}. The timestamps are int64 (seconds), the dates datetime64[D]."""
+        if not has_numpy:
+            raise Exception('numpy is required, please install: pip install numpy')
+        return {table: {name: self._numpy_column(self.columns[table][name], kind) for name, kind in schema}
+                for table, schema in SCHEMA.items()}
+
+    def to_pandas(self):
+        """Returns {table: pandas.DataFrame}. The timestamps and the dates are converted to datetime64[ns] (whatever
+        the default resolution of the pandas version), the repeated strings (types, categories, ...) are categoricals."""
+        if not has_pandas:
+            raise Exception('pandas is required, please install: pip install pandas')
+        arrays = self.to_numpy()
+        to_return = {}
+        for table, schema in SCHEMA.items():
+            data = {}
+            for name, kind in schema:
+                column = arrays[table][name]
+                if kind == 'timestamp':
+                    column = numpy.where(column < 0, numpy.datetime64('NaT', 's'), column.astype('datetime64[s]')).astype('datetime64[ns]')
+                elif kind == 'date':
+                    column = column.astype('datetime64[ns]')
+                elif kind == 'category':
+                    column = pandas.Categorical(column)
+                data[name] = column
+            to_return[table] = pandas.DataFrame(data, columns=[name for name, _ in schema])
+        return to_return
+
+    def to_arrow(self):
+        """Returns {table: pyarrow.Table}. The repeated strings are dictionary encoded."""
+        if not has_pyarrow:
+            raise Exception('pyarrow is required, please install: pip install pyarrow')
+        arrays = self.to_numpy()
+        to_return = {}
+        for table, schema in SCHEMA.items():
+            columns = []
+            for name, kind in schema:
+                column = arrays[table][name]
+                if kind == 'timestamp':
+                    column = pyarrow.array(column, mask=column < 0).cast(pyarrow.timestamp('s'))
+                elif kind == 'category':
+                    column = pyarrow.array(column, type=pyarrow.string()).dictionary_encode()
+                elif kind == 'str':
+                    column = pyarrow.array(column, type=pyarrow.string())
+                else:
+                    column = pyarrow.array(column)
+                columns.append(column)
+            to_return[table] = pyarrow.Table.from_arrays(columns, names=[name for name, _ in schema])
+        return to_return
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Diff, patch and three-way merge of MISPEvents.
+
+The attributes, objects, object attributes and references are matched by uuid (the references by
+referenced_uuid and relationship_type) using hash indexes, so the cost is linear in the size of the events.
+A changeset is a list of Change(op, path, old, new):
+
+    * ('info',): field of the event (op: modify)
+    * ('Tag', name): tag of the event (op: add, remove)
+    * ('Attribute', uuid), ('Object', uuid), ('Object', uuid, 'Attribute', uuid),
+      ('Object', uuid, 'ObjectReference', (referenced_uuid, relationship_type)): entity (op: add, remove, the
+      old/new values are the full entity, as a dictionary)
+    * entity path + (field,), entity path + ('Tag', name): field or tag of an entity
+
+    changeset = diff_events(old, new)
+    changeset.apply(other_event)
+    misp.update_event(event_id, changeset.to_update(new))    # Only the changed parts
+
+    changeset, conflicts = merge_events(base, ours, theirs)
+    changeset.apply(ours)
+"""
+
+import base64
+import datetime
+from collections import namedtuple
+
+import six
+
+from ..abstract import AbstractMISP
+from ..exceptions import PyMISPError
+from ..mispevent import MISPEvent, MISPObject
+
+_SCALARS = six.string_types + (bool, )
+
+Change = namedtuple('Change', ['op', 'path', 'old', 'new'])
+Conflict = namedtuple('Conflict', ['path', 'ours', 'theirs'])
+
+# Set by MISP when the event is stored, or used as keys: not compared
+IGNORED_FIELDS = frozenset(['uuid', 'id', 'event_id', 'object_id', 'timestamp', 'publish_timestamp', 'attribute_count',
+                            'org_id', 'orgc_id', 'locked', 'proposal_email_lock'])
+
+
+def _reference_key(reference):
+    return (reference.referenced_uuid, reference.relationship_type)
+
+
+def _uuid(entity):
+    return entity.uuid
+
+
+def _children(entity):
+    """Nested entities of an entity: [(kind, list, key function)]"""
+    if isinstance(entity, MISPEvent):
+        return [('Attribute', entity.attributes, _uuid), ('Object', entity.objects, _uuid)]
+    if isinstance(entity, MISPObject):
+        return [('Attribute', entity.attributes, _uuid), ('ObjectReference', entity.references, _reference_key)]
+    return []
+
+
+def _to_dict(entity):
+    if isinstance(entity, MISPEvent):
+        return entity.to_dict()['Event']
+    if isinstance(entity, MISPObject):
+        # No validation against the template
+        return AbstractMISP.to_dict(entity)
+    return entity.to_dict()
+
+
+def _fields(entity, ignored):
+    """Scalar fields of an entity, normalized like the JSON export (integers as strings).
+    Read directly from the properties: to_dict checks recursively if the entity is edited, which is slow."""
+    to_return = {}
+    for key in entity.properties:
+        if key in ignored:
+            continue
+        value = getattr(entity, key, None)
+        if isinstance(value, _SCALARS):
+            pass
+        elif value is None or isinstance(value, (list, dict, AbstractMISP)):
+            continue
+        elif isinstance(value, datetime.datetime):
+            value = str(entity._datetime_to_timestamp(value))
+        elif isinstance(value, datetime.date):
+            value = value.isoformat()
+        elif hasattr(value, 'getvalue'):
+            # Attachments and malware samples
+            value = base64.b64encode(value.getvalue()).decode()
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        to_return[key] = value
+    return to_return
+
+
+def _tags(entity):
+    return [tag.name for tag in getattr(entity, 'Tag', [])]
+
+
+def _plain(entity):
+    """Entity as a JSON-able dictionary, with the nested entities"""
+    to_return = {}
+    for key, value in _to_dict(entity).items():
+        if isinstance(value, AbstractMISP):
+            value = _plain(value)
+        elif isinstance(value, list):
+            value = [_plain(v) if isinstance(v, AbstractMISP) else v for v in value]
+        to_return[key] = value
+    return to_return
+
+
+def _entity_path(path):
+    """Path of the entity affected by a change"""
+    if len(path) % 2:
+        return path[:-1]
+    if path[-2] == 'Tag':
+        return path[:-2]
+    return path
+
+
+def _ancestors(path):
+    """Paths of the entities containing the entity or field at path"""
+    return [path[:i] for i in range(2, len(path), 2)]
+
+
+def _index(event):
+    """{entity path: entity} of all the entities of an event"""
+    index = {}
+
+    def walk(entity, path):
+        index[path] = entity
+        for kind, children, key in _children(entity):
+            for child in children:
+                walk(child, path + (kind, key(child)))
+    walk(event, ())
+    return index
+
+
+def _diff_entity(old, new, path, ignored, changes):
+    old_fields = _fields(old, ignored)
+    new_fields = _fields(new, ignored)
+    if old_fields != new_fields:
+        for key in sorted(set(old_fields) | set(new_fields)):
+            if old_fields.get(key) != new_fields.get(key):
+                changes.append(Change('modify', path + (key,), old_fields.get(key), new_fields.get(key)))
+    old_tags = _tags(old)
+    new_tags = _tags(new)
+    if old_tags != new_tags:
+        old_set, new_set = set(old_tags), set(new_tags)
+        changes += [Change('remove', path + ('Tag', name), name, None) for name in old_tags if name not in new_set]
+        changes += [Change('add', path + ('Tag', name), None, name) for name in new_tags if name not in old_set]
+    for (kind, old_children, key), (_, new_children, _) in zip(_children(old), _children(new)):
+        new_index = dict((key(child), child) for child in new_children)
+        old_index = {}
+        for child in old_children:
+            child_key = key(child)
+            old_index[child_key] = child
+            if child_key not in new_index:
+                changes.append(Change('remove', path + (kind, child_key), _plain(child), None))
+        for child in new_children:
+            child_key = key(child)
+            if child_key in old_index:
+                _diff_entity(old_index[child_key], child, path + (kind, child_key), ignored, changes)
+            else:
+                changes.append(Change('add', path + (kind, child_key), None, _plain(child)))
+
+
+def diff_events(old, new, ignored=IGNORED_FIELDS):
+    """Changes turning the event old into new
+    :old: MISPEvent
+    :new: MISPEvent
+    :ignored: Fields not compared
+    """
+    changes = []
+    _diff_entity(old, new, (), ignored, changes)
+    return Changeset(changes)
+
+
+def _add_child(parent, kind, data):
+    data = dict(data)
+    if isinstance(parent, MISPEvent):
+        if kind == 'Attribute':
+            return parent.add_attribute(**data)
+        parent.add_object(data)
+        return parent.objects[-1]
+    if kind == 'Attribute':
+        return parent.add_attribute(data.pop('object_relation'), **data)
+    parent.add_reference(**data)
+    return parent.references[-1]
+
+
+def apply_changeset(event, changeset):
+    """Apply a changeset to an event (in place)"""
+    index = _index(event)
+
+    def get(path):
+        if path not in index:
+            raise PyMISPError('Unable to apply the change, {} is not in the event.'.format('/'.join(str(p) for p in path)))
+        return index[path]
+
+    # The removals are grouped by parent, each list of entities is filtered once
+    removals = {}
+    for change in changeset:
+        if change.op == 'remove' and change.path[-2] != 'Tag':
+            get(change.path)
+            removals.setdefault((change.path[:-2], change.path[-2]), set()).add(change.path[-1])
+    for (parent_path, kind), keys in removals.items():
+        parent = get(parent_path)
+        for child_kind, children, key in _children(parent):
+            if child_kind == kind:
+                children[:] = [child for child in children if key(child) not in keys]
+        if isinstance(parent, MISPObject):
+            # Reset the cache of the attributes by relation
+            parent.attributes = parent.attributes
+        parent.edited = True
+    removed = set(parent_path + (kind, key) for (parent_path, kind), keys in removals.items() for key in keys)
+    if removed:
+        for path in [path for path in index if path in removed or any(a in removed for a in _ancestors(path))]:
+            index.pop(path)
+
+    for change in changeset:
+        entity_path = _entity_path(change.path)
+        if change.op in ('add', 'remove') and entity_path == change.path:
+            if change.op == 'add':
+                child = _add_child(get(change.path[:-2]), change.path[-2], change.new)
+                index.update((change.path + path, entity) for path, entity in _index(child).items())
+            continue
+        entity = get(entity_path)
+        if change.path[-2:-1] == ('Tag',) and len(change.path) % 2 == 0:
+            if change.op == 'add':
+                if change.new not in _tags(entity):
+                    entity.add_tag(change.new)
+            else:
+                entity.Tag = [tag for tag in entity.Tag if tag.name != change.old]
+                entity.edited = True
+            continue
+        field = change.path[-1]
+        if change.new is None:
+            if hasattr(entity, field):
+                delattr(entity, field)
+            entity.edited = True
+        elif field == 'date' and isinstance(entity, MISPEvent):
+            entity.set_date(change.new)
+        else:
+            setattr(entity, field, change.new)
+        if field == 'object_relation' and len(entity_path) == 4:
+            parent = get(entity_path[:2])
+            parent.attributes = parent.attributes
+    return event
+
+
+def _for_update(data):
+    data = dict(data)
+    # Without timestamp, MISP considers the entity as newer than the stored one
+    data.pop('timestamp', None)
+    return data
+
+
+class Changeset(object):
+
+    def __init__(self, changes=None):
+        """List of changes between two events (see diff_events)"""
+        self.changes = list(changes or [])
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return '<{self.__class__.__name__}(changes={count})'.format(self=self, count=len(self.changes))
+
+    def filter(self, op=None, kind=None):
+        """Changes with this operation (add, remove, modify) and/or on this kind of entity
+        (Event, Attribute, Object, ObjectReference, Tag)"""
+        to_return = []
+        for change in self.changes:
+            if op is not None and change.op != op:
+                continue
+            if kind is not None:
+                entity_path = _entity_path(change.path)
+                if kind == 'Tag':
+                    if change.path[-2:-1] != ('Tag',) or len(change.path) % 2:
+                        continue
+                elif (entity_path[-2] if entity_path else 'Event') != kind:
+                    continue
+            to_return.append(change)
+        return to_return
+
+    def apply(self, event):
+        """Apply the changes to an event (in place)"""
+        return apply_changeset(event, self)
+
+    def to_update(self, event):
+        """Minimal payload for PyMISP.update_event: the fields of the event, and only the attributes and objects
+        added or modified (the removed ones are flagged as deleted).
+        :event: The event with the changes applied (the new event passed to diff_events)
+        Note: MISP doesn't detach tags on update, the removed tags (filter('remove', 'Tag')) have to be
+        detached with PyMISP.untag.
+        """
+        touched = set()
+        removed = {}
+        for change in self.changes:
+            entity_path = _entity_path(change.path)
+            if change.op == 'remove' and entity_path == change.path:
+                removed[entity_path] = change.old
+            else:
+                touched.add(entity_path)
+            touched.update(_ancestors(entity_path))
+
+        payload = _fields(event, ('timestamp', 'publish_timestamp', 'attribute_count'))
+        tags = [change.new for change in self.changes if change.op == 'add' and change.path[:1] == ('Tag',)]
+        if tags:
+            payload['Tag'] = [{'name': name} for name in tags]
+
+        def deleted(path, kind):
+            return [dict(_for_update(data), deleted=True) for p, data in sorted(removed.items(), key=lambda r: str(r[0]))
+                    if p[:-2] == path and p[-2] == kind]
+
+        attributes = [_for_update(_plain(a)) for a in event.attributes if ('Attribute', a.uuid) in touched]
+        attributes += deleted((), 'Attribute')
+        if attributes:
+            payload['Attribute'] = attributes
+        objects = []
+        for obj in event.objects:
+            path = ('Object', obj.uuid)
+            if path not in touched:
+                continue
+            data = _for_update(_plain(obj))
+            data['Attribute'] = [_for_update(_plain(a)) for a in obj.attributes if path + ('Attribute', a.uuid) in touched]
+            data['Attribute'] += deleted(path, 'Attribute')
+            data['ObjectReference'] = data.get('ObjectReference', []) + deleted(path, 'ObjectReference')
+            objects.append(data)
+        objects += deleted((), 'Object')
+        if objects:
+            payload['Object'] = objects
+        return {'Event': payload}
+
+
+def merge_events(base, ours, theirs, resolve='ours', ignored=IGNORED_FIELDS):
+    """Three-way merge: changes bringing theirs' modifications (relative to base) to ours, and the conflicts.
+    Two changes conflict when they set the same field, tag or entity to different values, or when an entity
+    removed on one side is modified on the other.
+    :resolve: Side winning the conflicts (ours: the conflicting changes of theirs are skipped)
+    Returns (Changeset to apply on ours, [Conflict])
+    """
+    if resolve not in ('ours', 'theirs'):
+        raise PyMISPError('resolve has to be ours or theirs.')
+    ours_changes = diff_events(base, ours, ignored)
+    theirs_changes = diff_events(base, theirs, ignored)
+    ours_by_path = dict((change.path, change) for change in ours_changes)
+    ours_touched = set(ancestor for change in ours_changes for ancestor in _ancestors(change.path))
+    theirs_index = None
+    readded = set()
+    changes = []
+    conflicts = []
+    for change in theirs_changes:
+        if any(ancestor in readded for ancestor in _ancestors(change.path)):
+            # Already in the entity added again from theirs
+            continue
+        mine = ours_by_path.get(change.path)
+        if mine is not None:
+            if mine.op == change.op and mine.new == change.new:
+                continue
+            conflicts.append(Conflict(change.path, mine, change))
+            if resolve == 'theirs':
+                if change.op == 'add' and _entity_path(change.path) == change.path:
+                    changes.append(Change('remove', change.path, mine.new, None))
+                changes.append(change._replace(old=mine.new))
+            continue
+        removed_ancestor = None
+        for ancestor in _ancestors(change.path):
+            if ancestor in ours_by_path and ours_by_path[ancestor].op == 'remove':
+                removed_ancestor = ancestor
+                break
+        if removed_ancestor is not None:
+            conflicts.append(Conflict(change.path, ours_by_path[removed_ancestor], change))
+            if resolve == 'theirs':
+                if theirs_index is None:
+                    theirs_index = _index(theirs)
+                if removed_ancestor in theirs_index:
+                    changes.append(Change('add', removed_ancestor, None, _plain(theirs_index[removed_ancestor])))
+                    readded.add(removed_ancestor)
+            continue
+        if change.op == 'remove' and change.path in ours_touched:
+            conflicts.append(Conflict(change.path, next(c for c in ours_changes if change.path in _ancestors(c.path)), change))
+            if resolve == 'ours':
+                continue
+        changes.append(change)
+    return Changeset(changes), conflicts
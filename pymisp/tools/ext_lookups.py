@@ -1,6 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import bisect
+import re
+import threading
+from collections import defaultdict
+
 try:
     from pymispgalaxies import Clusters
     has_pymispgalaxies = True
@@ -9,35 +14,208 @@ except ImportError:
 
 try:
     from pytaxonomies import Taxonomies
-    has_pymispgalaxies = True
+    has_pytaxonomies = True
 except ImportError:
-    has_pymispgalaxies = False
+    has_pytaxonomies = False
+
+
+_lock = threading.RLock()
+_galaxies_index = None
+_taxonomies_index = None
+
+
+class _AffixIndex(object):
+
+    def __init__(self, tokens):
+        """Sorted lists of the tokens and of the reversed tokens, to find the ones
+        starting or ending with a string in logarithmic time."""
+        self._prefixes = sorted(set(tokens))
+        self._suffixes = sorted(set(t[::-1] for t in tokens))
+
+    def _starting_with(self, sorted_tokens, query):
+        start = bisect.bisect_left(sorted_tokens, query)
+        end = start
+        while end < len(sorted_tokens) and sorted_tokens[end].startswith(query):
+            end += 1
+        return sorted_tokens[start:end]
+
+    def search(self, query):
+        """Returns the tokens starting or ending with query"""
+        found = set(self._starting_with(self._prefixes, query))
+        found.update(t[::-1] for t in self._starting_with(self._suffixes, query[::-1]))
+        return found
+
+
+class GalaxiesIndex(object):
+
+    def __init__(self, clusters=None):
+        """Loaded galaxies, with a machinetag index and an index of the trigrams of the lowercase search strings.
+        :clusters: pymispgalaxies.Clusters instance, loaded from the package if None
+        """
+        if clusters is None:
+            if not has_pymispgalaxies:
+                raise Exception('pymispgalaxies is required, please install: pip install pymispgalaxies')
+            clusters = Clusters()
+        self.clusters = clusters
+        self.machinetags = {}  # machinetag: (cluster, cluster value)
+        self.searchable = defaultdict(list)  # lowercase searchable string: [(cluster, cluster value)]
+        for cluster in self.clusters.values():
+            for cluster_value in cluster.values():
+                self.machinetags['misp-galaxy:{}="{}"'.format(cluster.type, cluster_value.value)] = (cluster, cluster_value)
+                for s in set(s.lower() for s in cluster_value.searchable):
+                    self.searchable[s].append((cluster, cluster_value))
+        self._strings = list(self.searchable)
+        self._trigrams = defaultdict(list)  # trigram: [position of the search strings in self._strings]
+        for position, s in enumerate(self._strings):
+            for trigram in set(s[i:i + 3] for i in range(len(s) - 2)):
+                self._trigrams[trigram].append(position)
+
+    def revert_machinetag(self, machinetag):
+        """Returns (cluster, cluster value), raises KeyError if the machinetag is unknown"""
+        return self.machinetags[machinetag]
+
+    def _matching_strings(self, query):
+        """Positions of the search strings containing query: the candidates are the strings having all
+        the trigrams of the query (all the strings for the queries shorter than 3 characters)"""
+        if len(query) < 3:
+            candidates = range(len(self._strings))
+        else:
+            postings = sorted((self._trigrams.get(query[i:i + 3], []) for i in range(len(query) - 2)), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(posting)
+            candidates = sorted(candidates)
+        return [position for position in candidates if query in self._strings[position]]
+
+    def search(self, query):
+        """Same output as pymispgalaxies.Clusters.search: [(cluster, [cluster values])]"""
+        found = defaultdict(list)
+        seen = set()
+        for position in self._matching_strings(query.lower()):
+            for cluster, cluster_value in self.searchable[self._strings[position]]:
+                if (cluster.type, cluster_value.value) in seen:
+                    continue
+                seen.add((cluster.type, cluster_value.value))
+                found[cluster.type].append(cluster_value)
+        return [(self.clusters[name], values) for name, values in found.items()]
+
+
+class TaxonomiesIndex(object):
+
+    def __init__(self, taxonomies=None):
+        """Loaded taxonomies, with a machinetag index and an index of the lowercase tokens of the machinetags.
+        :taxonomies: pytaxonomies.Taxonomies instance, loaded from the package if None
+        """
+        if taxonomies is None:
+            if not has_pytaxonomies:
+                raise Exception('pytaxonomies is required, please install: pip install pytaxonomies')
+            taxonomies = Taxonomies()
+        self.taxonomies = taxonomies
+        self.machinetags = {}  # machinetag: (taxonomy, predicate[, entry])
+        self._tokens = defaultdict(list)  # lowercase token: [machinetag]
+        self._tokens_expanded = defaultdict(list)  # lowercase token: [expanded machinetag]
+        self._positions = {}  # (expanded) machinetag: position in the taxonomies, to return the results in the same order
+        for taxonomy in self.taxonomies.values():
+            for predicate_name, predicate in taxonomy.items():
+                machinetag = '{}:{}'.format(taxonomy.name, predicate_name)
+                self.machinetags[machinetag] = (taxonomy, predicate)
+                if not predicate:
+                    self._index_tokens(self._tokens, machinetag)
+                    self._index_tokens(self._tokens_expanded, machinetag)
+                    continue
+                for entry_name, entry in predicate.items():
+                    machinetag = '{}:{}="{}"'.format(taxonomy.name, predicate_name, entry_name)
+                    self.machinetags[machinetag] = (taxonomy, predicate, entry)
+                    self._index_tokens(self._tokens, machinetag)
+                    self._index_tokens(self._tokens_expanded, '{}:{}="{}"'.format(taxonomy.name, predicate_name, entry.expanded))
+        self._affixes = _AffixIndex(list(self._tokens))
+        self._affixes_expanded = _AffixIndex(list(self._tokens_expanded))
+
+    def _index_tokens(self, index, machinetag):
+        self._positions.setdefault(machinetag, len(self._positions))
+        for token in set(e.lower() for e in re.findall('[^:="]*', machinetag) if e):
+            index[token].append(machinetag)
+
+    def revert_machinetag(self, machinetag):
+        """Returns (taxonomy, predicate, entry), or (taxonomy, predicate) if the machinetag has no value.
+        Raises KeyError if the machinetag is unknown"""
+        return self.machinetags[machinetag]
+
+    def search(self, query, expanded=False):
+        """Returns the machinetags having a part (namespace, predicate or value) starting or ending with the query.
+        Same order as pytaxonomies.Taxonomies.search, but each machinetag is only returned once."""
+        query = query.lower()
+        if expanded:
+            affixes, tokens = self._affixes_expanded, self._tokens_expanded
+        else:
+            affixes, tokens = self._affixes, self._tokens
+        found = set()
+        for token in affixes.search(query):
+            found.update(tokens[token])
+        return sorted(found, key=self._positions.__getitem__)
+
+
+def get_galaxies_index():
+    """Process-wide GalaxiesIndex, loaded on first use"""
+    global _galaxies_index
+    with _lock:
+        if _galaxies_index is None:
+            _galaxies_index = GalaxiesIndex()
+    return _galaxies_index
+
+
+def get_taxonomies_index():
+    """Process-wide TaxonomiesIndex, loaded on first use"""
+    global _taxonomies_index
+    with _lock:
+        if _taxonomies_index is None:
+            _taxonomies_index = TaxonomiesIndex()
+    return _taxonomies_index
+
+
+def reset_cache():
+    """Drop the loaded galaxies and taxonomies, they will be reloaded on next use"""
+    global _galaxies_index, _taxonomies_index
+    with _lock:
+        _galaxies_index = None
+        _taxonomies_index = None
 
 
 def revert_tag_from_galaxies(tag):
-    clusters = Clusters()
     try:
-        return clusters.revert_machinetag(tag)
-    except Exception:
+        return get_galaxies_index().revert_machinetag(tag)
+    except KeyError:
         return []
 
 
 def revert_tag_from_taxonomies(tag):
-    taxonomies = Taxonomies()
     try:
-        return taxonomies.revert_machinetag(tag)
-    except Exception:
+        return get_taxonomies_index().revert_machinetag(tag)
+    except KeyError:
         return []
 
 
+def revert_tags_from_galaxies(tags):
+    """Batch version of revert_tag_from_galaxies, returns {tag: (cluster, cluster value)}, [] for the unknown tags"""
+    index = get_galaxies_index()
+    return {tag: index.machinetags.get(tag, []) for tag in tags}
+
+
+def revert_tags_from_taxonomies(tags):
+    """Batch version of revert_tag_from_taxonomies, returns {tag: (taxonomy, predicate[, entry])}, [] for the unknown tags"""
+    index = get_taxonomies_index()
+    return {tag: index.machinetags.get(tag, []) for tag in tags}
+
+
 def search_taxonomies(query):
-    taxonomies = Taxonomies()
-    found = taxonomies.search(query)
+    index = get_taxonomies_index()
+    found = index.search(query)
     if not found:
-        found = taxonomies.search(query, expanded=True)
+        found = index.search(query, expanded=True)
     return found
 
 
 def search_galaxies(query):
-    clusters = Clusters()
-    return clusters.search(query)
+    return get_galaxies_index().search(query)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Quick lookup cache of a MISP feed: md5 of the attribute values, with the UUID of the events they're in.
+
+Binary replacement for hashes.csv, all the integers are big endian:
+    * header (24 bytes): magic 'MISPFCI\\0', format version (uint16), 2 padding bytes,
+      amount of events (uint32), amount of records (uint64)
+    * events table: 16 bytes per event UUID
+    * records (20 bytes each): md5 digest (16 bytes) + index of the event in the events table (uint32).
+      The records are sorted and unique, the lookups are binary searches on the memory-mapped file.
+"""
+
+import binascii
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+import six
+
+from ..exceptions import PyMISPError
+
+MAGIC = b'MISPFCI\x00'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('>8sHxxIQ')
+_EVENT_INDEX = struct.Struct('>I')
+RECORD_SIZE = 20
+
+
+@contextmanager
+def atomic_open(path, mode='w'):
+    """Open a temporary file in the same directory as path, moved to path when the block exits without error.
+    Readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        if hasattr(os, 'replace'):
+            os.replace(tmp_path, path)
+        else:
+            os.rename(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def atomic_write(path, data, mode='w'):
+    """Write a file atomically (see atomic_open)"""
+    with atomic_open(path, mode) as f:
+        f.write(data)
+
+
+def value_digest(value):
+    """md5 digest of a value, as in hashes.csv"""
+    if not isinstance(value, six.binary_type):
+        value = six.text_type(value).encode('utf-8')
+    return hashlib.md5(value).digest()
+
+
+def read_hashes_csv(path):
+    """Yields (md5, event uuid) from a hashes.csv file"""
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                md5, event_uuid = line.split(',', 1)
+                yield md5, event_uuid
+
+
+def _build(entries, events=None, records=None):
+    events = list(events or [])
+    event_indexes = {e: i for i, e in enumerate(events)}
+    records = set(records or [])
+    for md5, event_uuid in entries:
+        if event_uuid not in event_indexes:
+            event_indexes[event_uuid] = len(events)
+            events.append(event_uuid)
+        try:
+            digest = binascii.unhexlify(md5)
+        except (TypeError, binascii.Error):
+            raise PyMISPError('Invalid md5: {}'.format(md5))
+        if len(digest) != 16:
+            raise PyMISPError('Invalid md5: {}'.format(md5))
+        records.add(digest + _EVENT_INDEX.pack(event_indexes[event_uuid]))
+    try:
+        events_table = b''.join(uuid.UUID(e).bytes for e in events)
+    except ValueError as e:
+        raise PyMISPError('Invalid event UUID: {}'.format(e))
+    records = sorted(records)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, len(events), len(records)) + events_table + b''.join(records)
+
+
+def write_hash_index(path, entries):
+    """Write a hash index (atomically), replacing the existing one.
+    :entries: Iterable of (md5 hexdigest, event uuid), duplicates are dropped"""
+    atomic_write(path, _build(entries), 'wb')
+
+
+def update_hash_index(path, entries):
+    """Add entries to a hash index, created if it doesn't exist.
+    The existing events keep their position in the events table, so the existing records are merged as is."""
+    if not os.path.exists(path):
+        return write_hash_index(path, entries)
+    with HashIndex(path) as index:
+        data = _build(entries, index.events, index.iter_records())
+    atomic_write(path, data, 'wb')
+
+
+def csv_to_hash_index(csv_path, index_path):
+    """Convert a hashes.csv file to a hash index"""
+    write_hash_index(index_path, read_hashes_csv(csv_path))
+
+
+class HashIndex(object):
+
+    def __init__(self, path):
+        """Read only access to a hash index, the file is memory mapped and not loaded."""
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise PyMISPError('Invalid hash index (empty file): {}'.format(path))
+        if len(self._mmap) < _HEADER.size:
+            self.close()
+            raise PyMISPError('Invalid hash index: {}'.format(path))
+        magic, version, self._events_count, self._records_count = _HEADER.unpack(self._mmap[:_HEADER.size])
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise PyMISPError('Invalid hash index (unknown format): {}'.format(path))
+        self._records_offset = _HEADER.size + 16 * self._events_count
+        if len(self._mmap) != self._records_offset + RECORD_SIZE * self._records_count:
+            self.close()
+            raise PyMISPError('Invalid hash index (truncated): {}'.format(path))
+        self._events = None
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._records_count
+
+    @property
+    def events(self):
+        """UUIDs of the events, in the order of the events table"""
+        if self._events is None:
+            self._events = [str(uuid.UUID(bytes=self._mmap[_HEADER.size + 16 * i:_HEADER.size + 16 * (i + 1)]))
+                            for i in range(self._events_count)]
+        return self._events
+
+    def _event(self, event_index):
+        offset = _HEADER.size + 16 * event_index
+        return str(uuid.UUID(bytes=self._mmap[offset:offset + 16]))
+
+    def _digest_at(self, position):
+        offset = self._records_offset + RECORD_SIZE * position
+        return self._mmap[offset:offset + 16]
+
+    def lookup_digest(self, digest):
+        """Returns the UUIDs of the events containing a value (by md5 digest)"""
+        low, high = 0, self._records_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._digest_at(middle) < digest:
+                low = middle + 1
+            else:
+                high = middle
+        to_return = []
+        while low < self._records_count and self._digest_at(low) == digest:
+            offset = self._records_offset + RECORD_SIZE * low + 16
+            to_return.append(self._event(_EVENT_INDEX.unpack(self._mmap[offset:offset + 4])[0]))
+            low += 1
+        return to_return
+
+    def lookup_md5(self, md5):
+        """Returns the UUIDs of the events containing a value (by md5 hexdigest)"""
+        return self.lookup_digest(binascii.unhexlify(md5))
+
+    def lookup(self, value):
+        """Returns the UUIDs of the events containing a value"""
+        return self.lookup_digest(value_digest(value))
+
+    def lookup_many(self, values):
+        """Returns {value: [event uuids]} for the values in the feed"""
+        to_return = {}
+        for value in values:
+            if value in to_return:
+                continue
+            events = self.lookup(value)
+            if events:
+                to_return[value] = events
+        return to_return
+
+    def __contains__(self, value):
+        return bool(self.lookup(value))
+
+    def iter_records(self):
+        """Raw records (digest + event index), sorted"""
+        for position in range(self._records_count):
+            offset = self._records_offset + RECORD_SIZE * position
+            yield self._mmap[offset:offset + RECORD_SIZE]
+
+    def iter_entries(self):
+        """Yields (md5 hexdigest, event uuid), sorted by md5"""
+        events = self.events
+        for record in self.iter_records():
+            md5 = binascii.hexlify(record[:16])
+            if not isinstance(md5, str):
+                md5 = md5.decode()
+            yield md5, events[_EVENT_INDEX.unpack(record[16:])[0]]
+
+    def to_csv(self, path):
+        """Write the index as hashes.csv, for the tools that don't support the binary format"""
+        atomic_write(path, ''.join('{},{}\n'.format(md5, event_uuid) for md5, event_uuid in self.iter_entries()))
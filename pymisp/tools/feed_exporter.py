@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Export events from a MISP instance as a MISP feed (one JSON file per event, manifest.json,
+the hash index hashes.idx (see feed_cache) and hashes.csv).
+
+The export is incremental: the timestamps of the events in the index are compared with the ones in the
+existing manifest, and only the new or modified events are fetched and written.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from multiprocessing.pool import ThreadPool
+
+from ..exceptions import PyMISPError
+from .feed_cache import atomic_write, write_hash_index, read_hashes_csv, HashIndex
+
+logger = logging.getLogger('pymisp')
+
+OBJECTS_FIELDS = {
+    'Attribute': {'uuid', 'value', 'category', 'type', 'comment', 'data', 'timestamp', 'to_ids', 'object_relation'},
+    'Event': {'uuid', 'info', 'threat_level_id', 'analysis', 'timestamp', 'publish_timestamp', 'published', 'date'},
+    'Object': {'name', 'meta-category', 'description', 'template_uuid', 'template_version', 'uuid', 'timestamp',
+               'distribution', 'sharing_group_id', 'comment'},
+    'ObjectReference': {'uuid', 'timestamp', 'relationship_type', 'comment', 'object_uuid', 'referenced_uuid'},
+    'Orgc': {'name', 'uuid'},
+    'Tag': {'name', 'colour', 'exportable'}
+}
+
+OBJECTS_TO_SAVE = {
+    'Orgc': {},
+    'Tag': {},
+    'Attribute': {
+        'Tag': {}
+    },
+    'Object': {
+        'Attribute': {
+            'Tag': {}
+        },
+        'ObjectReference': {}
+    }
+}
+
+DEFAULT_DISTRIBUTIONS = ['0', '1', '2', '3', '4', '5']
+
+
+def attribute_hashes(attribute):
+    """md5 of the value of an attribute (of each part for composite attributes), as used in hashes.csv"""
+    if '|' in attribute['type'] or attribute['type'] == 'malware-sample':
+        values = attribute['value'].split('|')[:2]
+    else:
+        values = [attribute['value']]
+    return [hashlib.md5(value.encode('utf-8')).hexdigest() for value in values]
+
+
+def _extract(container, container_type, leaf, valid_distributions, hashes):
+    if container_type in ['Attribute', 'Object'] and str(container.get('distribution')) not in valid_distributions:
+        return False
+    to_return = {field: container[field] for field in OBJECTS_FIELDS[container_type] if field in container}
+    if container_type == 'Attribute':
+        hashes += attribute_hashes(container)
+    for child_type, child_leaf in leaf.items():
+        child_container = container.get(child_type)
+        if not child_container:
+            continue
+        if isinstance(child_container, dict):
+            to_return[child_type] = _extract(child_container, child_type, child_leaf, valid_distributions, hashes)
+        else:
+            to_return[child_type] = []
+            for element in child_container:
+                processed = _extract(element, child_type, child_leaf, valid_distributions, hashes)
+                if processed:
+                    to_return[child_type].append(processed)
+    return to_return
+
+
+def extract_event(event, valid_distributions=DEFAULT_DISTRIBUTIONS):
+    """Strip an event (as returned by the API) down to what is published in a feed.
+    :event: {'Event': {...}}
+    :valid_distributions: Distribution levels of the attributes and objects to keep
+    Returns (feed event, [md5 of the values])"""
+    hashes = []
+    valid_distributions = [str(d) for d in valid_distributions]
+    extracted = _extract(event['Event'], 'Event', OBJECTS_TO_SAVE, valid_distributions, hashes)
+    return {'Event': extracted}, hashes
+
+
+def manifest_entry(index_event):
+    """Entry of the manifest for an event of the index"""
+    tags = [{'name': event_tag['Tag']['name'], 'colour': event_tag['Tag']['colour']}
+            for event_tag in index_event.get('EventTag', [])]
+    return {'Orgc': index_event['Orgc'],
+            'Tag': tags,
+            'info': index_event['info'],
+            'date': index_event['date'],
+            'analysis': index_event['analysis'],
+            'threat_level_id': index_event['threat_level_id'],
+            'timestamp': index_event['timestamp']}
+
+
+class FeedExporter(object):
+
+    def __init__(self, pymisp_instance, output_dir, valid_distributions=DEFAULT_DISTRIBUTIONS, workers=10, write_csv=True):
+        """Incremental feed export
+        :pymisp_instance: Already instantialized PyMISP instance.
+        :output_dir: Directory of the feed
+        :valid_distributions: Distribution levels of the attributes and objects to export
+        :workers: Amount of events fetched concurrently
+        :write_csv: Also write hashes.csv, next to the binary hash index
+        """
+        self.misp = pymisp_instance
+        self.output_dir = output_dir
+        self.valid_distributions = [str(d) for d in valid_distributions]
+        self.workers = workers
+        self.write_csv = write_csv
+        self.manifest_path = os.path.join(output_dir, 'manifest.json')
+        self.hashes_path = os.path.join(output_dir, 'hashes.csv')
+        self.hash_index_path = os.path.join(output_dir, 'hashes.idx')
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r') as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                logger.warning('Invalid manifest ({}), exporting all the events.'.format(self.manifest_path))
+                return {}
+
+    def load_hashes(self):
+        """Returns {event uuid: [md5]} from the hash index (or hashes.csv, for feeds exported without it)"""
+        hashes = {}
+        if os.path.exists(self.hash_index_path):
+            with HashIndex(self.hash_index_path) as index:
+                entries = list(index.iter_entries())
+        elif os.path.exists(self.hashes_path):
+            entries = read_hashes_csv(self.hashes_path)
+        else:
+            entries = []
+        for md5, event_uuid in entries:
+            hashes.setdefault(event_uuid, []).append(md5)
+        return hashes
+
+    def save_hashes(self, hashes):
+        write_hash_index(self.hash_index_path, ((md5, event_uuid) for event_uuid, md5s in hashes.items() for md5 in md5s))
+        if self.write_csv:
+            with HashIndex(self.hash_index_path) as index:
+                index.to_csv(self.hashes_path)
+
+    def save_manifest(self, manifest):
+        atomic_write(self.manifest_path, json.dumps(manifest))
+
+    def event_path(self, event_uuid):
+        return os.path.join(self.output_dir, '{}.json'.format(event_uuid))
+
+    def export_event(self, event_uuid):
+        """Fetch, strip and write an event, returns the md5 of its values"""
+        event = self.misp.get_event(event_uuid)
+        if not event.get('Event'):
+            raise PyMISPError('Unable to fetch the event {}: {}'.format(event_uuid, event.get('errors') or event.get('message')))
+        feed_event, hashes = extract_event(event, self.valid_distributions)
+        atomic_write(self.event_path(event_uuid), json.dumps(feed_event))
+        return hashes
+
+    def _export_event(self, event_uuid):
+        try:
+            return event_uuid, self.export_event(event_uuid), None
+        except Exception as e:
+            return event_uuid, None, e
+
+    def export(self, filters=None, force=False, remove_stale=True):
+        """Update the feed with the events of the index.
+        :filters: Passed to PyMISP.get_index
+        :force: Re-export all the events, even if they didn't change
+        :remove_stale: Delete the files of the events that are not in the index anymore
+        Returns {'new': [uuids], 'updated': [uuids], 'unchanged': int, 'removed': [uuids], 'failed': {uuid: error}}
+        """
+        index = self.misp.get_index(filters)
+        if index.get('errors') or not isinstance(index.get('response'), list):
+            raise PyMISPError('Invalid response received from MISP: {}'.format(index.get('errors')))
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        manifest = self.load_manifest()
+        # Without the hash cache, all the events have to be fetched again to rebuild it
+        hashes_missing = not os.path.exists(self.hash_index_path) and not os.path.exists(self.hashes_path)
+        hashes = self.load_hashes()
+        index_events = {event['uuid']: event for event in index['response']}
+        summary = {'new': [], 'updated': [], 'unchanged': 0, 'removed': [], 'failed': {}}
+
+        to_fetch = []
+        for event_uuid, event in index_events.items():
+            known = manifest.get(event_uuid)
+            if (force or hashes_missing or not known or str(known['timestamp']) != str(event['timestamp']) or
+                    not os.path.exists(self.event_path(event_uuid))):
+                to_fetch.append(event_uuid)
+            else:
+                summary['unchanged'] += 1
+
+        if to_fetch:
+            pool = ThreadPool(max(1, min(self.workers, len(to_fetch))))
+            try:
+                for event_uuid, event_hashes, error in pool.imap_unordered(self._export_event, to_fetch):
+                    if error is not None:
+                        logger.error('Could not export the event {}: {}'.format(event_uuid, error))
+                        summary['failed'][event_uuid] = error
+                        continue
+                    summary['updated' if event_uuid in manifest else 'new'].append(event_uuid)
+                    hashes[event_uuid] = event_hashes
+                    manifest[event_uuid] = manifest_entry(index_events[event_uuid])
+            finally:
+                pool.close()
+                pool.join()
+
+        for event_uuid in list(manifest.keys()):
+            if event_uuid in index_events:
+                continue
+            summary['removed'].append(event_uuid)
+            manifest.pop(event_uuid)
+            hashes.pop(event_uuid, None)
+            if remove_stale and os.path.exists(self.event_path(event_uuid)):
+                os.remove(self.event_path(event_uuid))
+        for event_uuid in list(hashes.keys()):
+            if event_uuid not in manifest:
+                hashes.pop(event_uuid)
+
+        if summary['new'] or summary['updated'] or summary['removed'] or not os.path.exists(self.manifest_path):
+            # The manifest is written last: if anything fails before, the events are exported again on the next run.
+            self.save_hashes(hashes)
+            self.save_manifest(manifest)
+        return summary
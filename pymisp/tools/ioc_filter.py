@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compact probabilistic export of IOC sets (Bloom filters), for the sensors that can't hold the full events.
+
+    filters = IOCFilters.from_events(misp.search(...), error_rate=0.001)    # one filter per attribute type
+    filters.save('iocs.bloom')
+    filters = IOCFilters.load('iocs.bloom')
+    filters.lookup('8.8.8.8')       # ['ip-dst'], the filters that (probably) contain the value
+
+A match may be a false positive (at the configured rate), a value that isn't matched is never in the set.
+The values are hashed as in hashes.csv (md5 of the UTF-8 encoded value, no normalization), so a filter can
+also be built from the hash index of a feed (IOCFilters.from_hash_index).
+
+File format, all the integers are big endian:
+    * header (16 bytes): magic 'MISPBLM\\0', format version (uint16), amount of filters (uint16), flags (uint16),
+      2 padding bytes. Flags: bit 0 set if there is one filter per attribute type (per_type). The files of the
+      format version 1 (no flags) are still read, per_type is then guessed from the names of the filters
+    * for each filter:
+        * filter header (40 bytes): length of the name (uint16), amount of hash functions k (uint16),
+          4 padding bytes, size of the bit array in bits m (uint64), capacity (uint64),
+          amount of values added (uint64), target false positive rate (float64)
+        * name of the filter (UTF-8): attribute type, or 'all'
+        * bit array (ceil(m / 8) bytes): bit b is the bit (1 << (b % 8)) of the byte b // 8
+    * the k bits of a value are (h1 + i * h2) mod m for i in [0, k), with h1 and h2 the first and last
+      8 bytes of the md5 digest of the value (uint64)
+"""
+
+import logging
+import math
+import os
+import struct
+
+from ..exceptions import PyMISPError
+from .feed_cache import atomic_write, value_digest, HashIndex
+from .ioc_matcher import iter_attributes, split_composite
+
+logger = logging.getLogger('pymisp')
+
+MAGIC = b'MISPBLM\x00'
+FORMAT_VERSION = 2
+ALL = 'all'
+FLAG_PER_TYPE = 1
+_HEADER = struct.Struct('>8sHHHxx')
+_FILTER_HEADER = struct.Struct('>HHxxxxQQQd')
+_DIGEST = struct.Struct('>QQ')
+
+
+class BloomFilter(object):
+
+    def __init__(self, capacity, error_rate=0.001):
+        """Bloom filter sized for an amount of values and a false positive rate
+        :capacity: Amount of values, the false positive rate gets higher if more are added
+        :error_rate: False positive rate when the filter holds capacity values
+        """
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise PyMISPError('Invalid Bloom filter parameters: capacity {}, error rate {}'.format(capacity, error_rate))
+        self.capacity = int(capacity)
+        self.error_rate = error_rate
+        # At least 1024 bits: on tiny arrays, the double hashing positions of different values overlap too often
+        self.size = max(1024, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(-math.log(error_rate) / math.log(2))))
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, digest):
+        h1, h2 = _DIGEST.unpack(digest)
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def add_digest(self, digest):
+        """Add a value by md5 digest, returns False if it was (probably) already in the filter"""
+        bits = self.bits
+        new = False
+        for position in self._positions(digest):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def add(self, value):
+        return self.add_digest(value_digest(value))
+
+    def contains_digest(self, digest):
+        bits = self.bits
+        for position in self._positions(digest):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __contains__(self, value):
+        return self.contains_digest(value_digest(value))
+
+    @property
+    def saturated(self):
+        """True if the filter holds more values than its capacity (the false positive rate is above the target)"""
+        return self.count > self.capacity
+
+    def estimated_error_rate(self):
+        """False positive rate of the filter with its current amount of values"""
+        return (1 - math.exp(-self.hash_count * self.count / float(self.size))) ** self.hash_count
+
+
+class IOCFilters(object):
+
+    def __init__(self, per_type=True, error_rate=0.001, capacity=10000, to_ids_only=False):
+        """Set of Bloom filters, one per attribute type (or a single one)
+        :per_type: One filter per attribute type (the part types for composite attributes), or a single filter named 'all'
+        :error_rate: False positive rate of the filters created
+        :capacity: Capacity of the filters created when adding values (see from_events to size them from the data)
+        :to_ids_only: Only add the attributes with the IDS flag
+        """
+        self.per_type = per_type
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.to_ids_only = to_ids_only
+        self.filters = {}
+
+    @classmethod
+    def from_events(cls, events=None, attributes=None, per_type=True, error_rate=0.001, to_ids_only=False, spare_capacity=0.1):
+        """Build the filters from events and attributes (any format supported by IOCMatcher), sized for their values
+        :spare_capacity: Extra capacity of the filters, for the incremental updates (0.1: 10% more values)
+        """
+        filters = cls(per_type, error_rate, to_ids_only=to_ids_only)
+        digests = {}
+        for attribute, _, _ in iter_attributes(events, attributes):
+            if not filters._indexable(attribute):
+                continue
+            for part_type, part in split_composite(attribute.type, attribute.value):
+                digests.setdefault(filters.filter_name(part_type), set()).add(value_digest(part))
+        for name, values in digests.items():
+            filters._build(name, values, spare_capacity)
+        return filters
+
+    @classmethod
+    def from_hash_index(cls, path, error_rate=0.001, spare_capacity=0.1):
+        """Build a single filter ('all') from the hash index of a feed (hashes.idx, see feed_cache)"""
+        filters = cls(per_type=False, error_rate=error_rate)
+        with HashIndex(path) as index:
+            digests = set(record[:16] for record in index.iter_records())
+        if digests:
+            filters._build(ALL, digests, spare_capacity)
+        return filters
+
+    def _build(self, name, digests, spare_capacity):
+        bloom_filter = BloomFilter(max(1, int(math.ceil(len(digests) * (1 + spare_capacity)))), self.error_rate)
+        for digest in digests:
+            bloom_filter.add_digest(digest)
+        self.filters[name] = bloom_filter
+
+    def filter_name(self, attribute_type):
+        return attribute_type if self.per_type else ALL
+
+    def _indexable(self, attribute):
+        return not getattr(attribute, 'deleted', False) and not (self.to_ids_only and not attribute.to_ids)
+
+    def add(self, value, attribute_type=None):
+        """Add a value to the filter of its type (created with the default capacity if needed)"""
+        name = self.filter_name(attribute_type) if attribute_type else ALL
+        if name not in self.filters:
+            self.filters[name] = BloomFilter(self.capacity, self.error_rate)
+        return self.filters[name].add(value)
+
+    def add_events(self, events=None, attributes=None):
+        """Add the values of events and attributes (incremental update of loaded filters).
+        Returns the names of the saturated filters, to rebuild with from_events."""
+        for attribute, _, _ in iter_attributes(events, attributes):
+            if not self._indexable(attribute):
+                continue
+            for part_type, part in split_composite(attribute.type, attribute.value):
+                self.add(part, part_type)
+        saturated = self.saturated()
+        if saturated:
+            logger.warning('Saturated IOC filters, the false positive rate is above the target: {}'.format(', '.join(saturated)))
+        return saturated
+
+    def saturated(self):
+        return sorted(name for name, bloom_filter in self.filters.items() if bloom_filter.saturated)
+
+    def lookup(self, value):
+        """Names of the filters that (probably) contain the value"""
+        digest = value_digest(value)
+        return sorted(name for name, bloom_filter in self.filters.items() if bloom_filter.contains_digest(digest))
+
+    def __contains__(self, value):
+        digest = value_digest(value)
+        return any(bloom_filter.contains_digest(digest) for bloom_filter in self.filters.values())
+
+    def __len__(self):
+        return sum(len(bloom_filter) for bloom_filter in self.filters.values())
+
+    def to_bytes(self):
+        flags = FLAG_PER_TYPE if self.per_type else 0
+        data = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(self.filters), flags)]
+        for name in sorted(self.filters):
+            bloom_filter = self.filters[name]
+            encoded_name = name.encode('utf-8')
+            data.append(_FILTER_HEADER.pack(len(encoded_name), bloom_filter.hash_count, bloom_filter.size,
+                                            bloom_filter.capacity, bloom_filter.count, bloom_filter.error_rate))
+            data.append(encoded_name)
+            data.append(bytes(bloom_filter.bits))
+        return b''.join(data)
+
+    def save(self, path):
+        """Write the filters (atomically)"""
+        atomic_write(path, self.to_bytes(), 'wb')
+
+    @classmethod
+    def from_bytes(cls, data, to_ids_only=False):
+        if len(data) < _HEADER.size:
+            raise PyMISPError('Invalid IOC filter file.')
+        magic, version, filters_count, flags = _HEADER.unpack(data[:_HEADER.size])
+        if magic != MAGIC or version not in (1, FORMAT_VERSION):
+            raise PyMISPError('Invalid IOC filter file (unknown format).')
+        offset = _HEADER.size
+        filters = {}
+        for _ in range(filters_count):
+            if len(data) < offset + _FILTER_HEADER.size:
+                raise PyMISPError('Invalid IOC filter file (truncated).')
+            name_length, hash_count, size, capacity, count, error_rate = _FILTER_HEADER.unpack(data[offset:offset + _FILTER_HEADER.size])
+            offset += _FILTER_HEADER.size
+            name = data[offset:offset + name_length].decode('utf-8')
+            offset += name_length
+            bits = bytearray(data[offset:offset + (size + 7) // 8])
+            offset += (size + 7) // 8
+            if len(bits) != (size + 7) // 8:
+                raise PyMISPError('Invalid IOC filter file (truncated).')
+            bloom_filter = BloomFilter.__new__(BloomFilter)
+            bloom_filter.capacity, bloom_filter.error_rate, bloom_filter.size = capacity, error_rate, size
+            bloom_filter.hash_count, bloom_filter.count, bloom_filter.bits = hash_count, count, bits
+            filters[name] = bloom_filter
+        if offset != len(data):
+            raise PyMISPError('Invalid IOC filter file (unexpected data after the filters).')
+        error_rate = max([f.error_rate for f in filters.values()] or [0.001])
+        if version == 1:
+            # No flags in the first version of the format
+            per_type = ALL not in filters
+        else:
+            per_type = bool(flags & FLAG_PER_TYPE)
+        to_return = cls(per_type=per_type, error_rate=error_rate, to_ids_only=to_ids_only)
+        to_return.filters = filters
+        return to_return
+
+    @classmethod
+    def load(cls, path, to_ids_only=False):
+        """Read filters written by save
+        :to_ids_only: Only add the attributes with the IDS flag on incremental updates (not stored in the file)"""
+        if not os.path.exists(path):
+            raise PyMISPError('No IOC filter file at {}'.format(path))
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read(), to_ids_only)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Offline matching of observed values (log fields, ...) against the attributes of MISP events.
+
+    matcher = IOCMatcher.from_directory('/path/to/feed')     # or IOCMatcher(events=misp.search(...))
+    hits = matcher.match(values)     # {value: [attribute keys]}, matching values only
+    matcher.attributes[key]          # {'uuid', 'type', 'value', 'event_id', 'event_uuid'}
+
+The key of an attribute is its uuid, the attributes without uuid get a generated key (local:<n>) and None as uuid.
+
+The attributes are indexed depending on their type:
+    * ip-src, ip-dst (and the composites with a port or a domain): prefix table (CIDRIndex), the networks match
+      all their addresses
+    * domain, hostname: hostname suffix index, the entries match their subdomains
+    * url, link: normalized URL (see normalize_url), the hostname of an observed URL is also matched
+      against the domains and hostnames
+    * hashes: lower case hexadecimal, exact value for the other formats (impfuzzy, x509 fingerprint with colons, ...)
+    * everything else: exact value (each part of the composite attributes, except the ports of ip|port and hostname|port)
+"""
+
+import glob
+import json
+import os
+from collections import defaultdict
+
+from ..mispevent import MISPEvent, MISPAttribute
+from ..mispview import EventView, AttributeView, view_events
+from .matching import CIDRIndex, HostnameSuffixIndex
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+IP_TYPES = frozenset(['ip-src', 'ip-dst'])
+HOSTNAME_TYPES = frozenset(['domain', 'hostname'])
+URL_TYPES = frozenset(['url', 'link'])
+HASH_TYPES = frozenset(['md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512', 'sha512/224', 'sha512/256',
+                        'imphash', 'authentihash', 'impfuzzy', 'pehash', 'x509-fingerprint-md5',
+                        'x509-fingerprint-sha1', 'x509-fingerprint-sha256', 'ja3-fingerprint-md5'])
+_HASH_LENGTHS = frozenset([32, 40, 56, 64, 96, 128])
+_HEX = frozenset('0123456789abcdefABCDEF')
+_DEFAULT_PORTS = {'http': '80', 'https': '443', 'ftp': '21'}
+
+
+def normalize_url(url):
+    """URL without scheme, default port, fragment and trailing slash, with the hostname in lower case
+    (HTTP://www.Example.com:80/a/#top -> www.example.com/a)"""
+    url = url.strip()
+    scheme, separator, rest = url.partition('://')
+    if not separator:
+        scheme, rest = 'http', url
+    rest = rest.split('#', 1)[0]
+    if '@' in rest or '[' in rest:
+        # Credentials or IPv6 address: let urlsplit deal with it
+        return _normalize_url_urlsplit(scheme + '://' + rest)
+    end = len(rest)
+    for delimiter in '/?':
+        index = rest.find(delimiter)
+        if index != -1 and index < end:
+            end = index
+    hostname, path = rest[:end], rest[end:]
+    path, _, query = path.partition('?')
+    hostname, _, port = hostname.partition(':')
+    if port and not port.isdigit():
+        return _normalize_url_urlsplit(scheme + '://' + rest)
+    return _join_url(scheme, hostname.lower().rstrip('.'), port, path, query)
+
+
+def _normalize_url_urlsplit(url):
+    try:
+        parts = urlsplit(url)
+        hostname = (parts.hostname or '').rstrip('.')
+        port = parts.port
+    except ValueError:
+        return url.split('://', 1)[1]
+    return _join_url(parts.scheme, hostname, str(port) if port else '', parts.path, parts.query)
+
+
+def _join_url(scheme, hostname, port, path, query):
+    if port and port != _DEFAULT_PORTS.get(scheme.lower()):
+        hostname = '{}:{}'.format(hostname, port)
+    to_return = hostname + path.rstrip('/')
+    if query:
+        to_return += '?' + query
+    return to_return
+
+
+def _is_hash(value):
+    return len(value) in _HASH_LENGTHS and not set(value) - _HEX
+
+
+def split_composite(attribute_type, value):
+    """[(type, value)] of an attribute, one entry per part for the composite attributes (filename|md5, ...).
+    The ports of ip-src|port, ip-dst|port and hostname|port are skipped: a port alone would match all of them."""
+    if '|' in attribute_type:
+        return [(part_type, part) for part_type, part in zip(attribute_type.split('|'), value.split('|')) if part_type != 'port']
+    return [(attribute_type, value)]
+
+
+def _event_attributes(event):
+    """Yields (attribute, event id, event uuid) for the attributes of an event and of its objects"""
+    if isinstance(event, EventView):
+        event = event.to_dict()
+    if isinstance(event, MISPEvent):
+        event_id, event_uuid = getattr(event, 'id', None), getattr(event, 'uuid', None)
+        for attribute in event.attributes:
+            yield attribute, event_id, event_uuid
+        for obj in event.objects:
+            for attribute in obj.attributes:
+                yield attribute, event_id, event_uuid
+    else:
+        event = EventView(event)
+        event_id, event_uuid = event.get('id'), event.get('uuid')
+        for attribute in event.all_attributes():
+            yield attribute, event_id, event_uuid
+
+
+def iter_attributes(events=None, attributes=None):
+    """Yields (attribute, event id, event uuid) of events and attributes, in any of the formats supported by IOCMatcher.
+    The attributes are MISPAttributes or AttributeViews."""
+    if events is not None:
+        if isinstance(events, dict):
+            events = view_events(events)
+        for event in events:
+            for entry in _event_attributes(event):
+                yield entry
+    if attributes is not None:
+        if isinstance(attributes, dict):
+            attributes = attributes.get('response', attributes).get('Attribute', [])
+        for attribute in attributes:
+            if not isinstance(attribute, (MISPAttribute, AttributeView)):
+                attribute = AttributeView(attribute)
+            yield attribute, None, None
+
+
+class IOCMatcher(object):
+
+    def __init__(self, events=None, attributes=None, to_ids_only=False):
+        """Index of the attributes of MISP events, to match observed values
+        :events: MISPEvents, events as dictionaries, or a search result ({'response': [...]})
+        :attributes: MISPAttributes or attributes as dictionaries (search on the attributes controller)
+        :to_ids_only: Only index the attributes with the IDS flag
+        """
+        self.to_ids_only = to_ids_only
+        self.attributes = {}
+        self._local_keys = 0
+        self._exact = defaultdict(set)
+        self._hashes = defaultdict(set)
+        self._urls = defaultdict(set)
+        self._cidr = CIDRIndex()
+        self._hostnames = HostnameSuffixIndex()
+        for attribute, event_id, event_uuid in iter_attributes(events, attributes):
+            self.add_attribute(attribute, event_id, event_uuid)
+
+    @classmethod
+    def from_directory(cls, path, to_ids_only=False):
+        """Index the events stored as JSON files in a directory (MISP feed, see feed_exporter)"""
+        matcher = cls(to_ids_only=to_ids_only)
+        for filename in sorted(glob.glob(os.path.join(path, '*.json'))):
+            if os.path.basename(filename) == 'manifest.json':
+                continue
+            with open(filename, 'r') as f:
+                matcher.add_event(json.load(f))
+        return matcher
+
+    def __len__(self):
+        return len(self.attributes)
+
+    def add_event(self, event):
+        """Index all the attributes (including the ones in objects) of an event (MISPEvent, dictionary or EventView)"""
+        for attribute, event_id, event_uuid in _event_attributes(event):
+            self.add_attribute(attribute, event_id, event_uuid)
+
+    def add_attribute(self, attribute, event_id=None, event_uuid=None):
+        """Index an attribute (MISPAttribute, dictionary or AttributeView).
+        Returns False if it is skipped (deleted, or without IDS flag if to_ids_only)."""
+        if not isinstance(attribute, (MISPAttribute, AttributeView)):
+            attribute = AttributeView(attribute)
+        if getattr(attribute, 'deleted', False) or (self.to_ids_only and not attribute.to_ids):
+            return False
+        uuid = getattr(attribute, 'uuid', None)
+        if uuid:
+            key = uuid
+        else:
+            # Without a generated key, the attributes without uuid would overwrite each other
+            self._local_keys += 1
+            key = 'local:{}'.format(self._local_keys)
+        attribute_type = attribute.type
+        value = attribute.value
+        if event_id is None:
+            event_id = getattr(attribute, 'event_id', None)
+        if event_uuid is None and isinstance(attribute, AttributeView) and isinstance(attribute.get('Event'), dict):
+            event_uuid = attribute['Event'].get('uuid')
+        self.attributes[key] = {'uuid': uuid, 'type': attribute_type, 'value': value,
+                                'event_id': str(event_id) if event_id is not None else None, 'event_uuid': event_uuid}
+        for part_type, part in split_composite(attribute_type, value):
+            self._add_value(part_type, part, key)
+        return True
+
+    def _add_value(self, attribute_type, value, key):
+        if attribute_type in IP_TYPES:
+            if not self._cidr.add(value, key):
+                self._exact[value].add(key)
+        elif attribute_type in HOSTNAME_TYPES:
+            self._hostnames.add(value, key)
+        elif attribute_type in URL_TYPES:
+            self._urls[normalize_url(value)].add(key)
+        elif attribute_type in HASH_TYPES and _is_hash(value.strip()):
+            self._hashes[value.strip().lower()].add(key)
+        else:
+            self._exact[value].add(key)
+
+    def lookup(self, value):
+        """Set of the keys of the attributes matching a value"""
+        found = set()
+        exact = self._exact.get(value)
+        if exact:
+            found |= exact
+        if _is_hash(value):
+            hashes = self._hashes.get(value.lower())
+            if hashes:
+                found |= hashes
+            return found
+        if '/' not in value and (value[:1].isdigit() or ':' in value):
+            found |= self._cidr.lookup(value)
+            if value.replace('.', '').isdigit():
+                # IPv4 address
+                return found
+        if '/' in value:
+            url = normalize_url(value)
+            urls = self._urls.get(url)
+            if urls:
+                found |= urls
+            hostname = url.split('/', 1)[0].split(':', 1)[0]
+            if hostname:
+                found |= self._hostnames.lookup(hostname)
+        elif '.' in value:
+            found |= self._hostnames.lookup(value)
+            if self._urls:
+                urls = self._urls.get(normalize_url(value))
+                if urls:
+                    found |= urls
+        return found
+
+    def match(self, values):
+        """Match a batch of values, returns {value: sorted list of attribute keys}, with the matching values only.
+        The duplicate values are only looked up once."""
+        to_return = {}
+        seen = set()
+        for value in values:
+            if value in seen:
+                continue
+            seen.add(value)
+            found = self.lookup(value)
+            if found:
+                to_return[value] = sorted(found)
+        return to_return
+
+    def match_events(self, values):
+        """Match a batch of values, returns {value: sorted list of event uuids (or ids, if the uuid is unknown)}"""
+        to_return = {}
+        for value, keys in self.match(values).items():
+            events = set()
+            for key in keys:
+                attribute = self.attributes[key]
+                events.add(attribute['event_uuid'] or attribute['event_id'])
+            to_return[value] = sorted(e for e in events if e is not None)
+        return to_return
@@ -1,26 +1,243 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import json
+import logging
+import os
+import re
+import tempfile
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+
+from .. import MISPEvent
+from ..exceptions import PyMISPError
+from .matching import CIDRIndex, HostnameSuffixIndex, AhoCorasick
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
 try:
     from pymispwarninglists import WarningLists
     has_pymispwarninglists = True
 except ImportError:
     has_pymispwarninglists = False
 
+logger = logging.getLogger('pymisp')
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def _fetch_warninglist(pymisp_instance, warninglist_id):
+    response = pymisp_instance.get_warninglist(warninglist_id)
+    if response.get('errors') or not response.get('Warninglist'):
+        raise PyMISPError('Unable to fetch the warninglist {}: {}'.format(warninglist_id, response.get('errors')))
+    wl = response['Warninglist']
+    wl['list'] = [entry['value'] if isinstance(entry, dict) else entry for entry in wl.pop('WarninglistEntry', [])]
+    if wl.get('WarninglistType'):
+        wl['matching_attributes'] = [t['type'] for t in wl.pop('WarninglistType')]
+    return wl
+
+
+def load_snapshot(snapshot_path):
+    """Load a snapshot of warninglists saved by from_instance.
+    Returns {warninglist id: {'version': version, 'warninglist': warninglist}}, empty if the snapshot
+    doesn't exist or was written by an other version of the format."""
+    if not os.path.exists(snapshot_path):
+        return {}
+    try:
+        with open(snapshot_path, 'r') as f:
+            snapshot = json.load(f)
+    except ValueError:
+        logger.warning('Invalid warninglists snapshot ({}), ignoring it.'.format(snapshot_path))
+        return {}
+    if snapshot.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        return {}
+    return snapshot['warninglists']
+
+
+def save_snapshot(snapshot_path, warninglists):
+    """Atomically write a snapshot of warninglists
+    :warninglists: {warninglist id: {'version': version, 'warninglist': warninglist}}"""
+    snapshot_dir = os.path.dirname(os.path.abspath(snapshot_path))
+    fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir, prefix='.warninglists')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'format_version': SNAPSHOT_FORMAT_VERSION, 'warninglists': warninglists}, f)
+        if hasattr(os, 'replace'):
+            os.replace(tmp_path, snapshot_path)
+        else:
+            os.rename(tmp_path, snapshot_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
 
-def from_instance(pymisp_instance, slow_search=False):
+def from_instance(pymisp_instance, slow_search=False, snapshot_path=None, workers=10):
     """Load the warnindlist from an existing MISP instance
-    :pymisp_instance: Already instantialized PyMISP instance."""
+    :pymisp_instance: Already instantialized PyMISP instance.
+    :slow_search: Passed to pymispwarninglists.WarningLists
+    :snapshot_path: Local file keeping the warninglists between runs. If set, only the lists
+                    whose version changed on the instance are fetched, and the file is updated.
+    :workers: Amount of lists fetched concurrently."""
 
     warninglists_index = pymisp_instance.get_warninglists()['Warninglists']
-    all_warningslists = []
+    snapshot = load_snapshot(snapshot_path) if snapshot_path else {}
+
+    warninglists = {}
+    to_fetch = []
     for warninglist in warninglists_index:
-        wl = pymisp_instance.get_warninglist(warninglist['Warninglist']['id'])['Warninglist']
-        wl['list'] = wl.pop('WarninglistEntry')
-        all_warningslists.append(wl)
+        wl_id = str(warninglist['Warninglist']['id'])
+        version = str(warninglist['Warninglist']['version'])
+        if snapshot.get(wl_id) and snapshot[wl_id]['version'] == version:
+            warninglists[wl_id] = snapshot[wl_id]
+        else:
+            to_fetch.append((wl_id, version))
+
+    if to_fetch:
+        pool = ThreadPool(max(1, min(workers, len(to_fetch))))
+        try:
+            fetched = pool.map(lambda wl_id: _fetch_warninglist(pymisp_instance, wl_id), [wl_id for wl_id, _ in to_fetch])
+        finally:
+            pool.close()
+            pool.join()
+        for (wl_id, version), wl in zip(to_fetch, fetched):
+            warninglists[wl_id] = {'version': version, 'warninglist': wl}
 
-    return WarningLists(slow_search, all_warningslists)
+    if snapshot_path and (to_fetch or set(snapshot) != set(warninglists)):
+        save_snapshot(snapshot_path, warninglists)
+
+    return WarningLists(slow_search, [warninglists[str(wl['Warninglist']['id'])]['warninglist'] for wl in warninglists_index])
 
 
 def from_package(slow_search=False):
     return WarningLists(slow_search)
+
+
+class WarningListsMatcher(object):
+
+    def __init__(self, warninglists):
+        """Compiled version of a set of warninglists, to check a lot of values at once.
+        Every list is indexed depending on its type:
+            * string: hash table (exact match)
+            * cidr: prefix table, the entries that aren't networks are matched exactly
+            * hostname: hash table of hostnames, matches the entry and its subdomains
+            * substring: Aho-Corasick automaton
+            * regex: compiled regular expressions
+        :warninglists: WarningLists object (see from_instance and from_package), or a list of
+                       warninglists as dictionaries.
+        """
+        if hasattr(warninglists, 'values'):
+            warninglists = [self._warninglist_to_dict(wl) for wl in warninglists.values()]
+        self._exact = defaultdict(set)
+        self._cidr = CIDRIndex()
+        self._hostnames = HostnameSuffixIndex()
+        self._substrings = AhoCorasick()
+        self._regexes = []
+        self._matching_attributes = {}
+        for warninglist in warninglists:
+            self.add_warninglist(warninglist)
+        self._substrings.build()
+
+    def _warninglist_to_dict(self, warninglist):
+        if isinstance(warninglist, dict):
+            return warninglist
+        return {'name': warninglist.name, 'type': warninglist.type, 'list': warninglist.list,
+                'matching_attributes': getattr(warninglist, 'matching_attributes', None)}
+
+    def add_warninglist(self, warninglist):
+        """Index a single warninglist (as dictionary)"""
+        name = warninglist['name']
+        wl_type = warninglist['type']
+        if warninglist.get('matching_attributes'):
+            self._matching_attributes[name] = set(warninglist['matching_attributes'])
+        else:
+            self._matching_attributes[name] = None
+        for entry in warninglist['list']:
+            if isinstance(entry, dict):
+                # Fetched from a MISP instance
+                entry = entry['value']
+            if wl_type == 'substring':
+                self._substrings.add(entry, name)
+            elif wl_type == 'hostname':
+                self._hostnames.add(entry, name)
+            elif wl_type == 'cidr':
+                if not self._cidr.add(entry, name):
+                    self._exact[entry].add(name)
+            elif wl_type == 'regex':
+                try:
+                    self._regexes.append((re.compile(entry), name))
+                except re.error:
+                    continue
+            else:
+                self._exact[entry].add(name)
+
+    def _match_value(self, value):
+        found = set()
+        if value in self._exact:
+            found |= self._exact[value]
+        found |= self._substrings.lookup(value)
+        found |= self._cidr.lookup(value)
+        if '//' in value:
+            hostname = urlparse(value).hostname
+            if hostname:
+                found |= self._hostnames.lookup(hostname)
+        else:
+            found |= self._hostnames.lookup(value)
+        for regex, name in self._regexes:
+            if name not in found and regex.search(value):
+                found.add(name)
+        return found
+
+    def match(self, value, attribute_type=None):
+        """Returns the sorted list of the names of the warninglists matching the value.
+        :value: Value to check.
+        :attribute_type: If set, only the warninglists applying to this MISP attribute type are considered.
+                         The values of composite types (domain|ip) are split and each part is checked,
+                         the other values are checked as they are, even if they contain a '|'.
+        """
+        found = set()
+        if attribute_type and '|' in attribute_type:
+            for part in value.split('|'):
+                found |= self._match_value(part)
+        else:
+            found = self._match_value(value)
+        if attribute_type and found:
+            found = set(name for name in found
+                        if self._matching_attributes[name] is None or attribute_type in self._matching_attributes[name])
+        return sorted(found)
+
+    def match_values(self, values, attribute_type=None):
+        """Check an iterable of values, returns {value: [warninglist names]}, with the matching values only"""
+        to_return = {}
+        for value in values:
+            if value in to_return:
+                continue
+            hits = self.match(value, attribute_type)
+            if hits:
+                to_return[value] = hits
+        return to_return
+
+    def match_event(self, event):
+        """Check all the attributes (including the ones in objects) of an event.
+        :event: MISPEvent or dictionary (as returned by the MISP API)
+        Returns {attribute index: [warninglist names]}, with the matching attributes only. The index is the
+        position of the attribute in the attributes of the event, followed by the attributes of its objects
+        (the attributes may not have a uuid yet).
+        """
+        to_return = {}
+        for i, attribute in enumerate(self._iter_attributes(event)):
+            hits = self.match(attribute['value'], attribute['type'])
+            if hits:
+                to_return[i] = hits
+        return to_return
+
+    def _iter_attributes(self, event):
+        if isinstance(event, MISPEvent):
+            attributes = event.attributes + [a for o in event.objects for a in o.attributes]
+        else:
+            event = event.get('Event', event)
+            attributes = event.get('Attribute', []) + [a for o in event.get('Object', []) for a in o.get('Attribute', [])]
+        for attribute in attributes:
+            yield attribute
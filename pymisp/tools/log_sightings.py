@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Sightings from log streams: the indicators found in the lines are matched against a local IOC set
+(see ioc_matcher) and the matches are sent as sightings through a SightingBuffer (batched, coalesced).
+
+    matcher = IOCMatcher.from_directory('/path/to/feed', to_ids_only=True)
+    with SightingBuffer(misp) as sightings:
+        pipeline = LogSightingPipeline(matcher, sightings, source='proxy', workers=4)
+        pipeline.process_lines(sys.stdin)                           # or pipeline.process_files(paths)
+        pipeline.process_lines(follow_file('/var/log/proxy.log'))    # tail -f
+    print(pipeline.stats)    # lines, values (candidates), matches (matching candidates), sightings, lines_per_sec, ...
+
+The candidate indicators are extracted with regular expressions (see extract_indicators): URLs, email addresses,
+IP addresses, hashes and hostnames (which also catches file names with an extension).
+With workers, the lines are processed by chunks in a pool of processes.
+"""
+
+import io
+import logging
+import os
+import re
+import time
+from collections import deque
+from multiprocessing import Pool
+
+from ..mispevent import MISPSighting
+
+logger = logging.getLogger('pymisp')
+
+_INDICATOR = r'''
+    (?P<url>\b(?:https?|ftp)://[^\s"'<>]+)
+    | (?P<email>\b[\w.+-]+@(?P<email_domain>(?:[\w-]+\.)+[a-zA-Z]{2,}))
+    | (?P<ipv6>(?<![\w:.])(?:[0-9a-fA-F]{0,4}:){2,7}[0-9a-fA-F]{0,4}(?![\w:.]))
+    | (?P<ipv4>\b(?:\d{1,3}\.){3}\d{1,3}\b)
+    | (?P<hash>\b[0-9a-fA-F]{32,128}\b)
+    | (?P<hostname>\b(?:[\w-]+\.)+[a-zA-Z][\w-]*\b)
+'''
+_INDICATORS = re.compile(_INDICATOR, re.VERBOSE)
+# Whole token, the common case
+_INDICATOR_TOKEN = re.compile(r'(?:' + _INDICATOR + r')\Z', re.VERBOSE)
+_TOKENS = re.compile(r'''[^\s"'<>]+''')
+
+
+def _add_indicator(found, value, match):
+    if match.lastgroup == 'url':
+        value = value.rstrip('.,;)]}')
+    elif match.lastgroup == 'ipv6' and '::' not in value and value.count(':') != 7:
+        # Time (12:00:00), MAC address, ...
+        return
+    found.add(value)
+    if match.group('email_domain'):
+        found.add(match.group('email_domain'))
+
+
+def extract_indicators(line):
+    """Candidate indicators of a line (set of strings)"""
+    found = set()
+    for token in _TOKENS.findall(line):
+        if '.' not in token and ':' not in token and len(token) < 32:
+            continue
+        token = token.strip('()[]{},;').rstrip('.:')
+        match = _INDICATOR_TOKEN.match(token)
+        if match is not None:
+            _add_indicator(found, token, match)
+            continue
+        # Indicators in a longer token (key=value, address:port, ...)
+        for match in _INDICATORS.finditer(token):
+            _add_indicator(found, match.group(0), match)
+    return found
+
+
+def follow_file(path, poll_interval=1, from_start=False, stop=None):
+    """Yields the lines appended to a file (tail -f), reopened if it is rotated or truncated.
+    Yields an empty string when there is no new line (the pipeline uses it to process a partial chunk).
+    :from_start: Read the existing content first
+    :stop: threading.Event, ends the iteration when set
+    """
+    f = io.open(path, 'r', encoding='utf-8', errors='replace')
+    try:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        partial = ''
+        while stop is None or not stop.is_set():
+            line = f.readline()
+            if line:
+                if not line.endswith('\n'):
+                    # Line still being written
+                    partial += line
+                    continue
+                yield partial + line
+                partial = ''
+                continue
+            try:
+                rotated = os.stat(path).st_ino != os.fstat(f.fileno()).st_ino or os.path.getsize(path) < f.tell()
+            except OSError:
+                # Removed, waiting for the new file
+                rotated = False
+            if rotated:
+                f.close()
+                f = io.open(path, 'r', encoding='utf-8', errors='replace')
+                partial = ''
+                continue
+            yield ''
+            time.sleep(poll_interval)
+    finally:
+        f.close()
+
+
+_worker_state = {}
+
+
+def _init_worker(matcher, extract):
+    _worker_state['matcher'] = matcher
+    _worker_state['extract'] = extract
+
+
+def _match_lines(lines, matcher=None, extract=None):
+    """Returns (amount of lines, amount of candidate values, amount of matching values, [(value, [attribute uuids])]).
+    The values found in several lines are only returned once."""
+    matcher = matcher or _worker_state['matcher']
+    extract = extract or _worker_state['extract']
+    values = []
+    for line in lines:
+        values.extend(extract(line))
+    matches = matcher.match(values)
+    return len(lines), len(values), sum(1 for value in values if value in matches), list(matches.items())
+
+
+class LogSightingPipeline(object):
+
+    def __init__(self, matcher, sightings=None, source=None, sighting_type=0, by_uuid=False, workers=0, chunk_size=1000,
+                 extract=extract_indicators, report_interval=60):
+        """
+        :matcher: IOCMatcher with the local IOC set
+        :sightings: SightingBuffer (or anything with an add_sighting method), None to only count the matches
+        :source: Source of the sightings
+        :sighting_type: Type of the sightings (0: sighting, 1: false positive)
+        :by_uuid: Sightings by attribute UUID (one request per attribute) instead of by value (batched, and applied
+                  by MISP to all the attributes with the value). The attributes without uuid are sighted by value.
+        :workers: Amount of processes matching the lines (0: in the current process)
+        :chunk_size: Amount of lines processed at once
+        :extract: Function returning the candidate indicators of a line (must be picklable with workers)
+        :report_interval: Seconds between the log messages with the throughput (0 to disable)
+        """
+        self.matcher = matcher
+        self.sightings = sightings
+        self.source = source
+        self.sighting_type = sighting_type
+        self.by_uuid = by_uuid
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.extract = extract
+        self.report_interval = report_interval
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'lines': 0, 'values': 0, 'matches': 0, 'sightings': 0, 'seconds': 0.0,
+                      'lines_per_sec': 0.0, 'matches_per_sec': 0.0}
+
+    def _sighting_value(self, value, attribute):
+        """Value to sight: the value of the attribute (network containing the IP address, parent domain, ...),
+        for composite attributes the part equal to the observed value (the first part otherwise)"""
+        if '|' not in attribute['type']:
+            return attribute['value']
+        parts = attribute['value'].split('|')
+        for part in parts:
+            if part.lower() == value.lower():
+                return part
+        return parts[0]
+
+    def _emit(self, matches):
+        if self.sightings is None:
+            return
+        timestamp = int(time.time())
+        for value, keys in matches:
+            attributes = [self.matcher.attributes[key] for key in keys]
+            if self.by_uuid:
+                # The attributes without uuid can only be sighted by value
+                targets = [{'uuid': a['uuid']} for a in attributes if a['uuid']]
+                values = set(self._sighting_value(value, a) for a in attributes if not a['uuid'])
+            else:
+                targets = []
+                values = set(self._sighting_value(value, a) for a in attributes)
+            targets += [{'value': v} for v in sorted(values)]
+            for target in targets:
+                sighting = MISPSighting()
+                sighting.from_dict(source=self.source, type=self.sighting_type, timestamp=timestamp, **target)
+                self.sightings.add_sighting(sighting)
+                self.stats['sightings'] += 1
+
+    def _chunks(self, lines):
+        """Chunks of lines, an empty line (no new line from follow_file) ends the current chunk (possibly empty)"""
+        chunk = []
+        for line in lines:
+            if line:
+                chunk.append(line)
+            if len(chunk) >= self.chunk_size or not line:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _results(self, lines):
+        if self.workers <= 0:
+            for chunk in self._chunks(lines):
+                if chunk:
+                    yield _match_lines(chunk, self.matcher, self.extract)
+            return
+        pool = Pool(self.workers, _init_worker, (self.matcher, self.extract))
+        try:
+            # Bounded amount of chunks in flight, the input can be an endless stream
+            in_flight = deque()
+            for chunk in self._chunks(lines):
+                if chunk:
+                    in_flight.append(pool.apply_async(_match_lines, (chunk, )))
+                while in_flight and (len(in_flight) > 2 * self.workers or in_flight[0].ready()):
+                    yield in_flight.popleft().get()
+            while in_flight:
+                yield in_flight.popleft().get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def process_lines(self, lines):
+        """Process an iterable of lines (file, sys.stdin, follow_file, ...). Returns the stats (cumulative)."""
+        start = time.time()
+        elapsed = self.stats['seconds']
+        last_report = start
+        for line_count, value_count, match_count, matches in self._results(lines):
+            self.stats['lines'] += line_count
+            self.stats['values'] += value_count
+            self.stats['matches'] += match_count
+            self._emit(matches)
+            now = time.time()
+            self._update_rates(elapsed + now - start)
+            if self.report_interval and now - last_report >= self.report_interval:
+                last_report = now
+                logger.info('{lines} lines ({lines_per_sec:.0f}/s), {matches} matches ({matches_per_sec:.1f}/s)'.format(**self.stats))
+        self._update_rates(elapsed + time.time() - start)
+        return self.stats
+
+    def process_files(self, paths):
+        """Process log files, one after the other. Returns the stats."""
+        for path in paths:
+            with io.open(path, 'r', encoding='utf-8', errors='replace') as f:
+                self.process_lines(f)
+        return self.stats
+
+    def _update_rates(self, seconds):
+        self.stats['seconds'] = seconds
+        if seconds > 0:
+            self.stats['lines_per_sec'] = self.stats['lines'] / seconds
+            self.stats['matches_per_sec'] = self.stats['matches'] / seconds
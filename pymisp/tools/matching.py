@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Index structures used to match large amounts of values against lists of indicators.
+
+All the indexes map a matching entry to a set of keys (a warninglist name, an attribute UUID, ...),
+and return the union of the keys of all the entries matching a value.
+"""
+
+from collections import defaultdict
+
+import six
+
+try:
+    import ipaddress
+    has_ipaddress = True
+except ImportError:
+    has_ipaddress = False
+
+
+def _ipv4_int(value):
+    """Integer value of a dotted-quad IPv4 address (faster than ipaddress), None if it isn't one"""
+    parts = value.split('.')
+    if len(parts) != 4:
+        return None
+    ip_int = 0
+    for part in parts:
+        if not part.isdigit() or len(part) > 3 or (len(part) > 1 and part[0] == '0'):
+            return None
+        try:
+            octet = int(part)
+        except ValueError:
+            # Unicode digits
+            return None
+        if octet > 255:
+            return None
+        ip_int = ip_int << 8 | octet
+    return ip_int
+
+
+class CIDRIndex(object):
+
+    def __init__(self):
+        """Prefix table of IPv4 and IPv6 networks.
+        The networks are stored by prefix length, a lookup costs at most one hash lookup per
+        prefix length in use (33 for IPv4, 129 for IPv6), regardless of the amount of networks.
+        """
+        if not has_ipaddress:
+            raise Exception('ipaddress is required, please install: pip install ipaddress')
+        # {version: {prefixlen: {network >> host bits: set(keys)}}}
+        self._networks = {4: {}, 6: {}}
+        self._prefixes = {4: [], 6: []}
+        self._max_prefixlen = {4: 32, 6: 128}
+
+    def __len__(self):
+        return sum(len(n) for prefixes in self._networks.values() for n in prefixes.values())
+
+    def add(self, network, key):
+        """Add a network (or a single IP address) to the index.
+        Returns False if the value is not a valid network."""
+        try:
+            network = ipaddress.ip_network(six.text_type(network).strip(), strict=False)
+        except ValueError:
+            return False
+        host_bits = network.max_prefixlen - network.prefixlen
+        prefixes = self._networks[network.version]
+        if network.prefixlen not in prefixes:
+            prefixes[network.prefixlen] = defaultdict(set)
+            self._prefixes[network.version] = sorted(prefixes)
+        prefixes[network.prefixlen][int(network.network_address) >> host_bits].add(key)
+        return True
+
+    def lookup(self, value):
+        """Return the keys of all the networks containing the IP address (empty set if it isn't an IP)"""
+        ip_int = _ipv4_int(value)
+        if ip_int is not None:
+            version = 4
+        else:
+            try:
+                ip = ipaddress.ip_address(six.text_type(value).strip())
+            except ValueError:
+                return set()
+            ip_int, version = int(ip), ip.version
+        max_prefixlen = self._max_prefixlen[version]
+        prefixes = self._networks[version]
+        found = set()
+        for prefixlen in self._prefixes[version]:
+            keys = prefixes[prefixlen].get(ip_int >> (max_prefixlen - prefixlen))
+            if keys:
+                found |= keys
+        return found
+
+
+class HostnameSuffixIndex(object):
+
+    def __init__(self):
+        """Index of hostnames, matching the entries themselves and all their subdomains.
+        A lookup tests every label suffix of the hostname (www.example.com, example.com, com),
+        the cost only depends on the amount of labels of the hostname, not on the size of the index.
+        """
+        self._hostnames = defaultdict(set)
+
+    def __len__(self):
+        return len(self._hostnames)
+
+    def _normalize(self, hostname):
+        return hostname.strip().strip('.').lower()
+
+    def add(self, hostname, key):
+        self._hostnames[self._normalize(hostname)].add(key)
+
+    def lookup(self, hostname):
+        """Return the keys of all the entries the hostname is equal to, or a subdomain of"""
+        found = set()
+        hostname = self._normalize(hostname)
+        hostnames = self._hostnames
+        while hostname:
+            if hostname in hostnames:
+                found |= hostnames[hostname]
+            hostname = hostname.partition('.')[2]
+        return found
+
+
+class AhoCorasick(object):
+
+    def __init__(self):
+        """Aho-Corasick automaton, finds all the patterns contained in a string in one pass.
+        The failure links are computed by build(), called automatically on the first lookup after an addition.
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+        self._built = False
+
+    def __len__(self):
+        return sum(1 for o in self._output if o)
+
+    def add(self, pattern, key):
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = next_state
+        self._output[state].add(key)
+        self._built = False
+
+    def build(self):
+        """Compute the failure links (breadth first), and merge the outputs along them."""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+        self._built = True
+
+    def lookup(self, text):
+        """Return the keys of all the patterns contained in the text"""
+        if not self._built:
+            self.build()
+        found = set()
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
@@ -1,16 +1,108 @@
 # -*- coding: utf-8 -*-
 
+import csv
 import glob
+import io
 import os
+from collections import defaultdict
+from multiprocessing import Pool
+
+import six
+
 from .. import MISPEvent
 
 try:
-    from py2neo import authenticate, Graph, Node, Relationship
+    from py2neo import authenticate, Graph
     has_py2neo = True
 except ImportError:
     has_py2neo = False
 
 
+def event_to_rows(event):
+    """Returns the rows to import for a MISPEvent: ({'uuid', 'info'}, [{'uuid', 'type', 'category', 'value'}])"""
+    event_row = {'uuid': event.uuid, 'info': event.info}
+    attribute_rows = [{'event_uuid': event.uuid, 'uuid': a.uuid, 'type': a.type, 'category': a.category, 'value': a.value}
+                      for a in event.attributes]
+    return event_row, attribute_rows
+
+
+def _decode_event_file(path):
+    # Runs in the worker processes, returns plain dicts, much cheaper to send back than MISPEvents
+    event = MISPEvent()
+    event.load_file(path)
+    return event_to_rows(event)
+
+
+def iter_event_rows(paths, workers=None):
+    """Decode MISP event files (JSON) on a process pool, yields the rows returned by event_to_rows.
+    :paths: Paths of the event files
+    :workers: Amount of processes, defaults to the amount of CPUs. 1 decodes in the current process.
+    """
+    if workers == 1:
+        for path in paths:
+            yield _decode_event_file(path)
+        return
+    pool = Pool(workers)
+    try:
+        for rows in pool.imap_unordered(_decode_event_file, paths, chunksize=16):
+            yield rows
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _open_csv(path):
+    if six.PY2:
+        return open(path, 'wb')
+    return io.open(path, 'w', newline='', encoding='utf-8')
+
+
+def _encode_row(row):
+    if six.PY2:
+        return [v.encode('utf-8') if isinstance(v, six.text_type) else v for v in row]
+    return row
+
+
+def export_csv(directory, output_dir, workers=None):
+    """Convert a directory of MISP events (JSON) to CSV files for the offline import of neo4j:
+        neo4j-admin import --nodes events.csv --nodes attributes.csv --nodes values.csv \\
+                           --relationships is_member.csv --relationships has.csv --relationships is.csv
+    Builds the same graph as Neo4j.load_events_directory. Doesn't require py2neo.
+    :directory: Directory containing the events (*.json)
+    :output_dir: Directory where the CSV files are written
+    :workers: Amount of processes decoding the events
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    files = {name: _open_csv(os.path.join(output_dir, '{}.csv'.format(name)))
+             for name in ('events', 'attributes', 'values', 'is_member', 'has', 'is')}
+    try:
+        writers = {name: csv.writer(f) for name, f in files.items()}
+        writers['events'].writerow(['uuid:ID(Event)', 'name', ':LABEL'])
+        writers['attributes'].writerow(['uuid:ID(Attribute)', 'category', 'name', ':LABEL'])
+        writers['values'].writerow(['name:ID(Value)', ':LABEL'])
+        writers['is_member'].writerow([':START_ID(Event)', ':END_ID(Attribute)', ':TYPE'])
+        writers['has'].writerow([':START_ID(Event)', ':END_ID(Value)', ':TYPE'])
+        writers['is'].writerow([':START_ID(Attribute)', ':END_ID(Value)', ':TYPE'])
+        seen_values = set()
+        for event_row, attribute_rows in iter_event_rows(glob.glob(os.path.join(directory, '*.json')), workers):
+            writers['events'].writerow(_encode_row([event_row['uuid'], event_row['info'], 'Event']))
+            event_values = set()
+            for a in attribute_rows:
+                writers['attributes'].writerow(_encode_row([a['uuid'], a['category'], a['value'], 'Attribute;{}'.format(a['type'])]))
+                writers['is_member'].writerow(_encode_row([event_row['uuid'], a['uuid'], 'is member']))
+                writers['is'].writerow(_encode_row([a['uuid'], a['value'], 'is']))
+                if a['value'] not in seen_values:
+                    seen_values.add(a['value'])
+                    writers['values'].writerow(_encode_row([a['value'], 'Value']))
+                if a['value'] not in event_values:
+                    event_values.add(a['value'])
+                    writers['has'].writerow(_encode_row([event_row['uuid'], a['value'], 'has']))
+    finally:
+        for f in files.values():
+            f.close()
+
+
 class Neo4j():
 
     def __init__(self, host='localhost:7474', username='neo4j', password='neo4j'):
@@ -19,39 +111,60 @@ class Neo4j():
         authenticate(host, username, password)
         self.graph = Graph("http://{}/db/data/".format(host))
 
-    def load_events_directory(self, directory):
-        self.events = []
-        for path in glob.glob(os.path.join(directory, '*.json')):
-            e = MISPEvent()
-            e.load(path)
-            self.import_event(e)
+    def create_indexes(self):
+        """Index the properties used to merge the nodes, required for fast imports on big graphs"""
+        for label, key in (('Event', 'uuid'), ('Attribute', 'uuid'), ('Value', 'name')):
+            self.graph.run('CREATE INDEX ON :{}({})'.format(label, key))
+
+    def load_events_directory(self, directory, workers=None, batch_size=1000):
+        """Import all the events (*.json) of a directory
+        :workers: Amount of processes decoding the events, defaults to the amount of CPUs
+        :batch_size: Amount of attributes pushed to neo4j in one transaction
+        """
+        self.create_indexes()
+        self.import_rows(iter_event_rows(glob.glob(os.path.join(directory, '*.json')), workers), batch_size)
 
     def del_all(self):
         self.graph.delete_all()
 
     def import_event(self, event):
+        self.import_events([event])
+
+    def import_events(self, events, batch_size=1000):
+        """Import MISPEvents, batch_size attributes at a time"""
+        self.import_rows((event_to_rows(event) for event in events), batch_size)
+
+    def import_rows(self, rows, batch_size=1000):
+        """Import events as returned by event_to_rows
+        :rows: Iterable of (event row, attribute rows)
+        :batch_size: Amount of attributes pushed to neo4j in one transaction
+        """
+        events = []
+        attributes = []
+        for event_row, attribute_rows in rows:
+            events.append(event_row)
+            attributes += attribute_rows
+            if len(attributes) >= batch_size or len(events) >= batch_size:
+                self._push(events, attributes)
+                events = []
+                attributes = []
+        if events:
+            self._push(events, attributes)
+
+    def _push(self, events, attributes):
         tx = self.graph.begin()
-        event_node = Node('Event', uuid=event.uuid, name=event.info)
-        # event_node['distribution'] = event.distribution
-        # event_node['threat_level_id'] = event.threat_level_id
-        # event_node['analysis'] = event.analysis
-        # event_node['published'] = event.published
-        # event_node['date'] = event.date.isoformat()
-        tx.create(event_node)
-        for a in event.attributes:
-            attr_node = Node('Attribute', a.type, uuid=a.uuid)
-            attr_node['category'] = a.category
-            attr_node['name'] = a.value
-            # attr_node['to_ids'] = a.to_ids
-            # attr_node['comment'] = a.comment
-            # attr_node['distribution'] = a.distribution
-            tx.create(attr_node)
-            member_rel = Relationship(event_node, "is member", attr_node)
-            tx.create(member_rel)
-            val = Node('Value', name=a.value)
-            ev = Relationship(event_node, "has", val)
-            av = Relationship(attr_node, "is", val)
-            s = val | ev | av
-            tx.merge(s)
-            # tx.graph.push(s)
+        tx.run('UNWIND $rows AS row MERGE (e:Event {uuid: row.uuid}) SET e.name = row.info', rows=events)
+        # The labels can't be parameters, one query per attribute type
+        by_type = defaultdict(list)
+        for a in attributes:
+            by_type[a['type']].append(a)
+        for attribute_type, rows in by_type.items():
+            tx.run('''UNWIND $rows AS row
+                   MATCH (e:Event {{uuid: row.event_uuid}})
+                   MERGE (a:Attribute:`{}` {{uuid: row.uuid}})
+                   SET a.category = row.category, a.name = row.value
+                   MERGE (e)-[:`is member`]->(a)
+                   MERGE (v:Value {{name: row.value}})
+                   MERGE (e)-[:has]->(v)
+                   MERGE (a)-[:is]->(v)'''.format(attribute_type.replace('`', '``')), rows=rows)
         tx.commit()
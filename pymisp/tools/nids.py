@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Export the NIDS rules (Suricata or Snort) of a set of events to a single, deduplicated, rules file."""
+
+import logging
+import re
+from multiprocessing.pool import ThreadPool
+
+from ..exceptions import PyMISPError
+from .feed_cache import atomic_open
+
+logger = logging.getLogger('pymisp')
+
+HEADER = """#
+# MISP export of IDS rules - optimized for {engine}
+#
+# These NIDS rules contain some variables that need to exist in your configuration.
+# Make sure you have set:
+#
+# $HOME_NET     - Your internal network range
+# $EXTERNAL_NET - The network considered as outside
+# $SMTP_SERVERS - All your internal SMTP servers
+# $HTTP_PORTS   - The ports used to contain HTTP traffic (not required with suricata export)
+#
+"""
+
+SID_RE = re.compile(r'[(;\s]sid\s*:\s*(\d+)\s*;')
+
+
+def parse_rules(text):
+    """Yields the rules of a rules file (skips the comments and empty lines)"""
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def rule_sid(rule):
+    """Returns the sid of a rule, None if it doesn't have one"""
+    match = SID_RE.search(rule)
+    return int(match.group(1)) if match else None
+
+
+class NIDSExporter(object):
+
+    def __init__(self, pymisp_instance, engine='suricata', workers=8):
+        """Fetch the rules of events with a bounded pool of workers, through the session of the PyMISP instance
+        (keep-alive, proxies, certificates and metrics of the instance).
+        :pymisp_instance: Already instantialized PyMISP instance.
+        :engine: suricata or snort
+        :workers: Amount of events fetched concurrently
+        """
+        if engine not in ('suricata', 'snort'):
+            raise PyMISPError('Unsupported engine: {}'.format(engine))
+        self.misp = pymisp_instance
+        self.engine = engine
+        self.workers = workers
+
+    def search_events(self, exclude=None, **kwargs):
+        """IDs of the events matching a search (PyMISP.search parameters) with at least one attribute flagged to_ids
+        :exclude: IDs of events to skip"""
+        exclude = set(str(e) for e in exclude or [])
+        result = self.misp.search(**kwargs)
+        if result.get('errors'):
+            raise PyMISPError('Search failed: {}'.format(result['errors']))
+        to_return = []
+        for event in result.get('response', []):
+            event = event['Event']
+            if str(event['id']) in exclude:
+                continue
+            attributes = event.get('Attribute', []) + [a for o in event.get('Object', []) for a in o.get('Attribute', [])]
+            if any(a.get('to_ids') for a in attributes):
+                to_return.append(event['id'])
+        return to_return
+
+    def download_event_rules(self, event_id):
+        """Rules file of an event, as text"""
+        response = self.misp.download_nids_rules(event_id, self.engine)
+        if response.status_code >= 400:
+            raise PyMISPError('Unable to download the rules of the event {}: {}'.format(event_id, response.status_code))
+        return response.text
+
+    def iter_rules(self, event_ids, stats=None):
+        """Yields the rules of all the events, deduplicated by sid and by rule body.
+        The rules are yielded as soon as the events are downloaded, in no specific order.
+        :stats: dictionary updated with the amount of events, rules and duplicates"""
+        if stats is None:
+            stats = {}
+        stats.update({'events': 0, 'rules': 0, 'duplicates': 0})
+        seen_sids = set()
+        seen_rules = set()
+        event_ids = list(event_ids)
+        if not event_ids:
+            return
+        pool = ThreadPool(max(1, min(self.workers, len(event_ids))))
+        try:
+            for text in pool.imap_unordered(self.download_event_rules, event_ids):
+                stats['events'] += 1
+                for rule in parse_rules(text):
+                    body = ' '.join(rule.split())
+                    sid = rule_sid(body)
+                    if body in seen_rules or (sid is not None and sid in seen_sids):
+                        stats['duplicates'] += 1
+                        continue
+                    seen_rules.add(body)
+                    if sid is not None:
+                        seen_sids.add(sid)
+                    stats['rules'] += 1
+                    yield rule
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def export(self, path, event_ids=None, exclude=None, **kwargs):
+        """Write the merged rules file of a set of events. The file is replaced atomically once complete.
+        :path: Output file
+        :event_ids: IDs of the events to export. If None, the events matching the search parameters (kwargs, see
+                    PyMISP.search) with at least one attribute flagged to_ids.
+        :exclude: IDs of events to skip
+        Returns {'events': int, 'rules': int, 'duplicates': int}
+        """
+        if event_ids is None:
+            event_ids = self.search_events(exclude=exclude, **kwargs)
+        elif exclude:
+            exclude = set(str(e) for e in exclude)
+            event_ids = [e for e in event_ids if str(e) not in exclude]
+        stats = {}
+        with atomic_open(path, 'wb') as f:
+            f.write(HEADER.format(engine=self.engine).encode('utf-8'))
+            for rule in self.iter_rules(event_ids, stats):
+                f.write(rule.encode('utf-8') + b'\n')
+        return stats
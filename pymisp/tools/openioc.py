@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import os
+from io import BytesIO
+
+import six
 
 from .. import MISPEvent
 try:
@@ -10,6 +13,11 @@ try:
 except ImportError:
     has_bs4 = False
 
+try:
+    from xml.etree.cElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
 iocMispMapping = {
     'CookieHistoryItem/HostName': {'type': 'hostname', 'comment': 'CookieHistory.'},
 
@@ -138,12 +146,17 @@ iocMispCompositeMapping = {
     'FileItem/FileName|FileItem/Sha1sum': {'type': 'filename|sha1'},
     'FileItem/FileName|FileItem/Sha256sum': {'type': 'filename|sha256'},
     'Network/DNS|PortItem/remoteIP': {'type': 'domain|ip'},
-    'PortItem/remoteIP|PortItem/remotePort': {'comment': 'ip-dst|port'},
+    'PortItem/remoteIP|PortItem/remotePort': {'type': 'ip-dst|port'},
     'RegistryItem/Path|RegistryItem/Value': {'type': 'regkey|value'},
     'RegistryItem/KeyPath|RegistryItem/Value': {'type': 'regkey|value'},
     'RegistryItem/Path|RegistryItem/Text': {'type': 'regkey|value'}
 }
 
+# Case-folded versions of the mappings, built once.
+# The keys of the composite mapping are the pairs of context searches.
+_iocMispMappingIndex = {k.lower(): v for k, v in iocMispMapping.items()}
+_iocMispCompositeMappingIndex = {tuple(k.lower().split('|')): v for k, v in iocMispCompositeMapping.items()}
+
 
 def extract_field(report, field_name):
     if report:
@@ -153,9 +166,12 @@ def extract_field(report, field_name):
     return ''
 
 
-def load_openioc_file(openioc_path):
+def load_openioc_file(openioc_path, streaming=False):
     if not os.path.exists(openioc_path):
         raise Exception("Path doesn't exists.")
+    if streaming:
+        with open(openioc_path, 'rb') as f:
+            return load_openioc_stream(f)
     with open(openioc_path, 'r') as f:
         return load_openioc(f)
 
@@ -191,12 +207,28 @@ def load_openioc(openioc):
 
 def get_mapping(openioc_type, mappingDict=iocMispMapping):
     t = openioc_type.lower()
+    if mappingDict is iocMispMapping:
+        return _iocMispMappingIndex.get(t, False)
+    if mappingDict is iocMispCompositeMapping:
+        return _iocMispCompositeMappingIndex.get(tuple(t.split('|')), False)
     for k, v in mappingDict.items():
         if k.lower() == t:
             return v
     return False
 
 
+def get_composite_mapping(search1, search2):
+    """Returns (mapping, swapped) for a pair of context searches, in any order.
+    swapped is True if the mapping is defined for search2|search1. mapping is False if there is none."""
+    mapping = _iocMispCompositeMappingIndex.get((search1.lower(), search2.lower()))
+    if mapping:
+        return mapping, False
+    mapping = _iocMispCompositeMappingIndex.get((search2.lower(), search1.lower()))
+    if mapping:
+        return mapping, True
+    return False, False
+
+
 def set_values(value1, value2=None):
     attribute_values = {}
 
@@ -250,21 +282,16 @@ def set_all_attributes(openioc, misp_event):
         childs = composite.find_all('indicatoritem')
 
         if len(childs) == 2:
-            childList = [child.find('context')['search'] for child in childs]
-
-            def check_and_add(value1, value2):
-                if (value1 and value2) in childList:
-                    if childs[0].find('context')['search'] == value1:
-                        attribute_values = set_values(childs[0], childs[1])
-                    else:
-                        attribute_values = set_values(childs[1], childs[0])
-
+            mapping, swapped = get_composite_mapping(childs[0].find('context')['search'], childs[1].find('context')['search'])
+            if mapping:
+                if swapped:
+                    attribute_values = set_values(childs[1], childs[0])
+                else:
+                    attribute_values = set_values(childs[0], childs[1])
+                if attribute_values is not None:
                     misp_event.add_attribute(**attribute_values)
-                    processed.add(childs[0]['id'])
-                    processed.add(childs[1]['id'])
-
-            for k in iocMispCompositeMapping:
-                check_and_add(k.split('|')[0], k.split('|')[1])
+                processed.add(childs[0]['id'])
+                processed.add(childs[1]['id'])
 
     for item in openioc.find_all("indicatoritem"):
         # check if id in processed list
@@ -278,3 +305,135 @@ def set_all_attributes(openioc, misp_event):
         misp_event.add_attribute(**attribute_values)
 
     return misp_event
+
+
+# ######## Streaming parser ########
+
+
+def _tag_name(element):
+    # Strip the namespace, the tags are case insensitive in the BeautifulSoup parser
+    return element.tag.rsplit('}', 1)[-1].lower()
+
+
+def _make_attribute_values(items, mapping=None):
+    """Same as set_values, on the (search, content, comment) tuples collected by the streaming parser"""
+    value = '|'.join(content for _, content, _ in items)
+    if not all(content for _, content, _ in items):
+        return None
+    attribute_values = {'value': value}
+    if mapping is None:
+        mapping = _iocMispMappingIndex.get(items[0][0].lower())
+    if mapping:
+        attribute_values.update(mapping)
+    else:
+        # Unknown mapping, assign to default
+        attribute_values['category'] = 'External analysis'
+        attribute_values['type'] = 'other'
+    if attribute_values['type'] in ['ip-src', 'ip-dst'] and attribute_values['value'].count(':') == 1:
+        attribute_values['type'] = attribute_values['type'] + '|port'
+        attribute_values['value'] = attribute_values['value'].replace(':', '|')
+    attribute_values['comment'] = ''.join(comment for _, _, comment in items)
+    return attribute_values
+
+
+def iter_openioc(openioc):
+    """Parse an OpenIOC document incrementally, with bounded memory.
+    :openioc: opened file (preferably in binary mode), or the document as a string
+    Yields ('metadata', {field: value}) once, before the first indicator, then ('attribute', attribute_values)
+    for every indicator item (or pair of indicator items in an AND indicator matching a composite mapping).
+    """
+    if not hasattr(openioc, 'read'):
+        if isinstance(openioc, six.text_type):
+            openioc = openioc.encode('utf-8')
+        openioc = BytesIO(openioc)
+
+    metadata_fields = ('short_description', 'description', 'authored_by', 'authored_date')
+    metadata = {}
+    metadata_sent = False
+    elements = []  # Stack of the open elements
+    indicators = []  # Stack of the open indicators: [operator, items, has_sub_indicator]
+    for event, element in iterparse(openioc, events=('start', 'end')):
+        tag = _tag_name(element)
+        if event == 'start':
+            elements.append(element)
+            if tag == 'indicator':
+                if not metadata_sent:
+                    metadata_sent = True
+                    yield 'metadata', metadata
+                if indicators:
+                    indicators[-1][2] = True
+                indicators.append([(element.get('operator') or '').upper(), [], False])
+            continue
+
+        elements.pop()
+        if tag in metadata_fields and tag not in metadata and not indicators:
+            metadata[tag] = (element.text or '').strip()
+        elif tag == 'indicatoritem':
+            search, content, comment = '', '', ''
+            for child in element:
+                child_tag = _tag_name(child)
+                if child_tag == 'context':
+                    search = child.get('search') or ''
+                elif child_tag == 'content':
+                    content = child.text or ''
+                elif child_tag == 'comment':
+                    comment = child.text or ''
+            item = (search, content, comment)
+            if indicators and indicators[-1][0] == 'AND':
+                # Might be a part of a composite attribute, decided at the end of the indicator
+                indicators[-1][1].append(item)
+            else:
+                attribute_values = _make_attribute_values([item])
+                if attribute_values:
+                    yield 'attribute', attribute_values
+        elif tag == 'indicator' and indicators:
+            operator, items, has_sub_indicator = indicators.pop()
+            attribute_values = None
+            if len(items) == 2 and not has_sub_indicator:
+                mapping, swapped = get_composite_mapping(items[0][0], items[1][0])
+                if mapping:
+                    if swapped:
+                        items.reverse()
+                    attribute_values = _make_attribute_values(items, mapping)
+                    items = []
+                    if attribute_values:
+                        yield 'attribute', attribute_values
+            for item in items:
+                attribute_values = _make_attribute_values([item])
+                if attribute_values:
+                    yield 'attribute', attribute_values
+        else:
+            continue
+        # Free the processed elements
+        element.clear()
+        if elements:
+            elements[-1].remove(element)
+
+    if not metadata_sent:
+        yield 'metadata', metadata
+
+
+def load_openioc_stream(openioc):
+    """Load an OpenIOC document with the streaming parser (see iter_openioc), returns a MISPEvent.
+    Unlike load_openioc, doesn't require BeautifulSoup, and runs in linear time with bounded memory."""
+    misp_event = MISPEvent()
+    for kind, values in iter_openioc(openioc):
+        if kind == 'metadata':
+            info = values.get('short_description')
+            if info:
+                misp_event.info = info
+            if values.get('authored_date'):
+                misp_event.set_date(values['authored_date'])
+            description = values.get('description')
+            if description:
+                if not info:
+                    misp_event.info = description
+                else:
+                    misp_event.add_attribute('comment', description)
+            if not getattr(misp_event, 'info', None):
+                misp_event.info = 'OpenIOC import'
+            if values.get('authored_by'):
+                misp_event.add_attribute('comment', values['authored_by'])
+        else:
+            misp_event.add_attribute(**values)
+    return misp_event
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Buffered, coalescing submission of sightings.
+
+    with SightingBuffer(misp, window=60) as sightings:
+        for value in observed_values:
+            sightings.add(value=value, source='sensor-1')
+
+The sightings of the same (value or attribute UUID, type, source) within a window are coalesced into a single one,
+with the latest timestamp and the amount of occurrences (count). The count is only kept locally: coalescing drops
+the multiplicity, MISP records a single sighting for the N occurrences.
+At the end of each window, a background thread sends the sightings by value in batches (one request per type, source
+and timestamp_tolerance seconds, with up to batch_size values and the latest timestamp of the batch: a sighting is
+dated at most timestamp_tolerance seconds later), the sightings by attribute UUID one by one.
+When max_pending sightings are waiting, the window is flushed early and add() blocks until there is room again
+(without background thread, add() flushes the buffer itself).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from ..exceptions import PyMISPError
+from ..mispevent import MISPSighting
+
+logger = logging.getLogger('pymisp')
+
+
+class SightingBuffer(object):
+
+    def __init__(self, pymisp_instance, window=60, batch_size=500, max_pending=100000, start=True, timestamp_tolerance=10):
+        """
+        :pymisp_instance: Already instantialized PyMISP instance.
+        :window: Seconds during which the identical sightings are coalesced, before being sent
+        :batch_size: Maximum amount of values sent in one request
+        :timestamp_tolerance: Width in seconds of the timestamp ranges batched together (0: same timestamp only)
+        :max_pending: Maximum amount of distinct sightings waiting to be sent (backpressure, see add)
+        :start: Start the background thread (call flush() to send the sightings otherwise)
+        """
+        self.misp = pymisp_instance
+        self.window = window
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.timestamp_tolerance = timestamp_tolerance
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+        self.stats = {'added': 0, 'coalesced': 0, 'sent': 0, 'requests': 0, 'rejected': 0, 'retried': 0}
+        if start:
+            self.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='pymisp-sightings')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, flush=True):
+        """Stop the background thread, and send the pending sightings"""
+        if self._thread is not None:
+            with self._condition:
+                self._stopping = True
+                self._condition.notify_all()
+            self._thread.join()
+            self._thread = None
+        if flush:
+            self.flush()
+
+    def add(self, value=None, uuid=None, source=None, type=0, timestamp=None, block=True, timeout=None):
+        """Add a sighting (by value or attribute UUID). Returns False if the buffer is full and block is False,
+        or after timeout seconds. Without background thread, a full buffer is flushed by add(), which returns False
+        if it is still full (failed requests).
+        :type: Type of the sighting (0: sighting, 1: false positive, 2: expiration)
+        :timestamp: Timestamp of the sighting (default: now)
+        """
+        if (value is None) == (uuid is None):
+            raise PyMISPError('A sighting needs either a value or an attribute UUID.')
+        key = ('uuid', uuid) if uuid is not None else ('value', value)
+        key += (int(type or 0), source or '')
+        timestamp = int(timestamp or time.time())
+        deadline = None if timeout is None else time.time() + timeout
+        flushed = False
+        while True:
+            with self._condition:
+                entry = self._pending.get(key)
+                if entry is not None or len(self._pending) < self.max_pending:
+                    self.stats['added'] += 1
+                    if entry is None:
+                        self._pending[key] = [timestamp, 1]
+                    else:
+                        self.stats['coalesced'] += 1
+                        entry[0] = max(entry[0], timestamp)
+                        entry[1] += 1
+                    return True
+                if not block or flushed or (deadline is not None and time.time() >= deadline):
+                    return False
+                if self._thread is not None:
+                    # Wakes up the background thread, which flushes early
+                    self._condition.notify_all()
+                    self._condition.wait(None if deadline is None else max(0, deadline - time.time()))
+                    continue
+            # No background thread: nothing else would make room (flush takes the condition)
+            self.flush()
+            flushed = True
+
+    def add_sighting(self, sighting, block=True, timeout=None):
+        """Add a sighting (MISPSighting or dictionary, see add)"""
+        if isinstance(sighting, MISPSighting):
+            sighting = sighting.to_dict()
+        return self.add(value=sighting.get('value'), uuid=sighting.get('uuid'), source=sighting.get('source'),
+                        type=sighting.get('type'), timestamp=sighting.get('timestamp'), block=block, timeout=timeout)
+
+    def pending(self):
+        """Copy of the pending sightings: [{'value' or 'uuid', 'type', 'source', 'timestamp', 'count'}]"""
+        with self._condition:
+            return [self._to_dict(key, entry) for key, entry in self._pending.items()]
+
+    @staticmethod
+    def _to_dict(key, entry):
+        kind, identifier, sighting_type, source = key
+        return {kind: identifier, 'type': sighting_type, 'source': source, 'timestamp': entry[0], 'count': entry[1]}
+
+    def _run(self):
+        next_flush = time.time() + self.window
+        while True:
+            with self._condition:
+                while not self._stopping and len(self._pending) < self.max_pending and time.time() < next_flush:
+                    self._condition.wait(max(0, next_flush - time.time()))
+                if self._stopping:
+                    return
+            next_flush = time.time() + self.window
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Unable to send the sightings.')
+
+    def _batches(self, pending):
+        """Requests to send: sightings by value grouped by type, source and range of timestamp_tolerance seconds
+        (with the latest timestamp of the batch, MISP takes a single one per request), by UUID one by one"""
+        groups = OrderedDict()
+        for key, entry in pending.items():
+            kind, identifier, sighting_type, source = key
+            if kind == 'uuid':
+                yield [key], {'uuid': identifier, 'type': sighting_type, 'source': source, 'timestamp': entry[0]}
+            else:
+                bucket = entry[0] // self.timestamp_tolerance if self.timestamp_tolerance > 0 else entry[0]
+                groups.setdefault((sighting_type, source, bucket), []).append(key)
+        for (sighting_type, source, _), keys in groups.items():
+            for i in range(0, len(keys), self.batch_size):
+                batch = keys[i:i + self.batch_size]
+                yield batch, {'values': [key[1] for key in batch], 'type': sighting_type, 'source': source,
+                              'timestamp': max(pending[key][0] for key in batch)}
+
+    def flush(self):
+        """Send the pending sightings now. Returns the amount of requests sent.
+        The sightings of the requests that failed (connection error, ...) are put back in the buffer,
+        the ones rejected by MISP (no matching attribute, ...) are dropped."""
+        with self._flush_lock:
+            with self._condition:
+                pending, self._pending = self._pending, OrderedDict()
+                self._condition.notify_all()
+            requests = 0
+            for keys, sighting in self._batches(pending):
+                requests += 1
+                try:
+                    response = self.misp.set_sightings(sighting)
+                except Exception as e:
+                    logger.warning('Unable to send {} sighting(s), retrying at the next flush: {}'.format(len(keys), e))
+                    self._requeue(keys, pending)
+                    continue
+                self.stats['requests'] += 1
+                if response.get('errors'):
+                    logger.info('{} sighting(s) rejected by MISP: {}'.format(len(keys), response['errors']))
+                    self.stats['rejected'] += len(keys)
+                else:
+                    self.stats['sent'] += len(keys)
+            return requests
+
+    def _requeue(self, keys, pending):
+        with self._condition:
+            for key in keys:
+                self.stats['retried'] += 1
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = pending[key]
+                else:
+                    entry[0] = max(entry[0], pending[key][0])
+                    entry[1] += pending[key][1]
@@ -28,7 +28,8 @@ setup(
     ],
     test_suite="tests.test_offline",
     install_requires=['six', 'requests', 'python-dateutil', 'jsonschema', 'setuptools>=36.4'],
-    extras_require={'fileobjects': ['lief>=0.8', 'python-magic'],
+    extras_require={'analytics': ['numpy', 'pandas', 'pyarrow'],
+                    'fileobjects': ['lief>=0.8', 'python-magic'],
                     'neo': ['py2neo'],
                     'openioc': ['beautifulsoup4'],
                     'virustotal': ['validators'],
@@ -0,0 +1,562 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Local stand-in for a MISP instance, for the tests and the benchmarks.
+
+It is a real HTTP server (on 127.0.0.1, random port by default) implementing the endpoints used by PyMISP
+with an in-memory state, so the client is exercised down to the socket layer without a live MISP:
+
+    with MISPStubServer(latency=0.005) as server:
+        misp = PyMISP(server.url, server.key)
+        event = misp.add_event(...)
+
+Implemented endpoints: version (servers/getVersion, servers/getPyMISPVersion), attributes/describeTypes,
+events (index, get, add, edit, delete, publish, restSearch), attributes (add, edit, delete, restSearch),
+objects (add, edit, delete), sightings (add, listSightings), tags (list, add, attachTagToObject,
+removeTagFromObject) and feeds (list, view, add, edit, delete, fetchFromFeed, cacheFeeds, compareFeeds).
+
+Knobs, settable on the instance at any time:
+    * latency (seconds) and jitter (seconds, uniform) added to every request
+    * error_rate: probability of answering with error_status instead of processing a request
+    * fail_next(count, status): deterministic error injection for the next requests
+    * padding: amount of whitespace appended to each JSON response, to simulate large responses
+"""
+
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date
+
+import six
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlparse
+
+import pymisp
+
+MISP_VERSION = '2.4.88'
+
+_DESCRIBE_TYPES_PATH = os.path.join(os.path.dirname(os.path.abspath(pymisp.__file__)), 'data', 'describeTypes.json')
+
+
+class StubError(Exception):
+
+    def __init__(self, status, message):
+        super(StubError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _body_entry(body, key):
+    """Most endpoints accept the object with or without its wrapper ({'Event': {...}} or {...})"""
+    if isinstance(body, dict):
+        body = body.get('request', body)
+        return body.get(key, body)
+    return body
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(value, dict):
+        return list(value.get('OR', [])) + ['!' + v for v in value.get('NOT', [])]
+    return [v for v in str(value).split('&&') if v]
+
+
+def _match(candidates, wanted):
+    """MISP search semantic: any positive value must match (if there is one), no negative value can match"""
+    positives = [w for w in wanted if not str(w).startswith('!')]
+    negatives = [str(w)[1:] for w in wanted if str(w).startswith('!')]
+    candidates = [str(c).lower() for c in candidates]
+
+    def found(w):
+        w = str(w).lower()
+        if '%' in w:
+            pattern = re.compile('^' + '.*'.join(re.escape(p) for p in w.split('%')) + '$')
+            return any(pattern.match(c) for c in candidates)
+        return w in candidates
+
+    if positives and not any(found(w) for w in positives):
+        return False
+    return not any(found(w) for w in negatives)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        status, data = stub.handle(self.command, self.path, self.headers.get('Authorization'), raw)
+        if stub.padding:
+            data += b' ' * stub.padding
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_DELETE = do_PUT = _handle
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MISPStubServer(object):
+
+    def __init__(self, host='127.0.0.1', port=0, key='stub' * 10, latency=0, jitter=0, error_rate=0, error_status=500,
+                 padding=0, seed=None):
+        """In-memory MISP instance, call start() (or use it as a context manager) to serve it.
+        :port: 0 picks a free port, see url
+        :key: API key expected in the Authorization header
+        """
+        self.host = host
+        self.port = port
+        self.key = key
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.padding = padding
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._fail_next = []
+        self._server = None
+        self._thread = None
+        with open(_DESCRIBE_TYPES_PATH, 'r') as f:
+            self.describe_types = json.load(f)
+        self.reset()
+        self._routes = [
+            ('GET', r'servers/getVersion(\.json)?', self._version),
+            ('GET', r'servers/getPyMISPVersion(\.json)?', self._pymisp_version),
+            ('GET', r'attributes/describeTypes(\.json)?', lambda m, b: self.describe_types),
+            ('GET', r'events/queryACL(\.json)?', lambda m, b: []),
+            ('*', r'events/index', self._events_index),
+            ('POST', r'(?P<controller>events|attributes)/restSearch(/download)?', self._rest_search),
+            ('POST', r'events/(publish|alert)/(?P<id>[^/.]+)', self._publish_event),
+            ('POST', r'events/?', self._add_event),
+            ('GET', r'events/(view/)?(?P<id>[^/.]+)', self._get_event),
+            ('POST', r'events/(edit/)?(?P<id>[^/.]+)', self._edit_event),
+            ('*', r'events/delete/(?P<id>[^/.]+)', self._delete_event),
+            ('DELETE', r'events/(?P<id>[^/.]+)', self._delete_event),
+            ('POST', r'attributes/add/(?P<id>[^/.]+)', self._add_attributes),
+            ('*', r'attributes/delete/(?P<id>[^/.]+)(/1)?', self._delete_attribute),
+            ('POST', r'attributes/(edit/)?(?P<id>[^/.]+)', self._edit_attribute),
+            ('POST', r'objects/add/(?P<id>[^/.]+)(/[^/]+)?', self._add_object),
+            ('POST', r'objects/edit/(?P<id>[^/.]+)', self._edit_object),
+            ('*', r'objects/delete/(?P<id>[^/.]+)', self._delete_object),
+            ('POST', r'sightings/add(/(?P<id>[^/.]+))?/?', self._add_sighting),
+            ('POST', r'sightings/listSightings/(?P<id>[^/.]+)/(?P<scope>[^/]+)(/.*)?', self._list_sightings),
+            ('GET', r'tags', self._list_tags),
+            ('POST', r'tags/add', self._add_tag),
+            ('POST', r'tags/attachTagToObject', self._attach_tag),
+            ('POST', r'tags/removeTagFromObject', self._remove_tag),
+            ('GET', r'feeds', self._list_feeds),
+            ('GET', r'feeds/view/(?P<id>[^/.]+)', self._get_feed),
+            ('POST', r'feeds/add', self._add_feed),
+            ('POST', r'feeds/edit/(?P<id>[^/.]+)', self._edit_feed),
+            ('*', r'feeds/delete/(?P<id>[^/.]+)', self._delete_feed),
+            ('*', r'feeds/fetchFromFeed/(?P<id>[^/.]+)', lambda m, b: {'result': 'Pull queued for background execution.'}),
+            ('*', r'feeds/cacheFeeds/(?P<scope>[^/]+)', lambda m, b: {'result': 'Feed caching job initiated.'}),
+            ('*', r'feeds/compareFeeds', lambda m, b: []),
+        ]
+        self._routes = [(method, re.compile('^/?' + pattern + r'(\.json)?$'), func) for method, pattern, func in self._routes]
+
+    # ### Server ###
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(self.host, self.port)
+
+    def start(self):
+        self._server = _ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # ### State ###
+
+    def reset(self):
+        """Drop all the data and the statistics"""
+        with self._lock:
+            self.events = {}
+            self.attributes = {}
+            self.objects = {}
+            self.tags = {}
+            self.feeds = {}
+            self.sightings = []
+            self.requests = []
+            self._ids = {}
+
+    def fail_next(self, count=1, status=500):
+        """The next `count` requests fail with the given HTTP status"""
+        with self._lock:
+            self._fail_next += [status] * count
+
+    def _next_id(self, kind):
+        self._ids[kind] = self._ids.get(kind, 0) + 1
+        return str(self._ids[kind])
+
+    def load_events(self, events):
+        """Add events (dictionaries, with or without the 'Event' wrapper, or MISPEvent) to the state.
+        Returns the stored events."""
+        to_return = []
+        with self._lock:
+            for event in events:
+                if isinstance(event, pymisp.MISPEvent):
+                    event = json.loads(event.to_json())
+                to_return.append(self._store_event(copy.deepcopy(_body_entry(event, 'Event'))))
+        return to_return
+
+    def _store_event(self, event, event_id=None):
+        event['id'] = event_id or self._next_id('event')
+        event.setdefault('uuid', str(uuid.uuid4()))
+        event.setdefault('info', '')
+        event.setdefault('date', date.today().isoformat())
+        event.setdefault('published', False)
+        event['timestamp'] = str(int(time.time()))
+        event.setdefault('Orgc', {'id': '1', 'name': 'ORGNAME', 'uuid': '5762d6e2-4c1c-4e15-8a4e-1a6ec0a83866'})
+        event.setdefault('Org', event['Orgc'])
+        for tag in event.setdefault('Tag', []):
+            self._store_tag(tag)
+        for attribute in event.setdefault('Attribute', []):
+            self._store_attribute(attribute, event)
+        for obj in event.setdefault('Object', []):
+            self._store_object(obj, event)
+        self.events[event['id']] = event
+        return event
+
+    def _store_attribute(self, attribute, event, obj=None):
+        attribute['id'] = self._next_id('attribute')
+        attribute['event_id'] = event['id']
+        attribute['object_id'] = obj['id'] if obj else '0'
+        attribute.setdefault('uuid', str(uuid.uuid4()))
+        attribute['timestamp'] = str(int(time.time()))
+        if 'category' not in attribute and attribute.get('type') in self.describe_types['result']['sane_defaults']:
+            attribute['category'] = self.describe_types['result']['sane_defaults'][attribute['type']]['default_category']
+        for tag in attribute.setdefault('Tag', []):
+            self._store_tag(tag)
+        self.attributes[attribute['id']] = (attribute, event)
+        return attribute
+
+    def _store_object(self, obj, event):
+        obj['id'] = self._next_id('object')
+        obj['event_id'] = event['id']
+        obj.setdefault('uuid', str(uuid.uuid4()))
+        obj['timestamp'] = str(int(time.time()))
+        for attribute in obj.setdefault('Attribute', []):
+            self._store_attribute(attribute, event, obj)
+        self.objects[obj['id']] = (obj, event)
+        return obj
+
+    def _store_tag(self, tag):
+        if tag.get('name') not in self.tags:
+            stored = {'id': self._next_id('tag'), 'name': tag.get('name'), 'colour': tag.get('colour', '#ffffff'),
+                      'exportable': True, 'hide_tag': False}
+            self.tags[stored['name']] = stored
+        tag.setdefault('id', self.tags[tag.get('name')]['id'])
+        return self.tags[tag.get('name')]
+
+    def _find(self, table, identifier, name):
+        if identifier in table:
+            return table[identifier]
+        for entry in table.values():
+            stored = entry[0] if isinstance(entry, tuple) else entry
+            if stored.get('uuid') == identifier:
+                return entry
+        raise StubError(404, 'Invalid {}'.format(name))
+
+    # ### Dispatch ###
+
+    def handle(self, method, path, key, raw):
+        """Returns (HTTP status, JSON encoded response)"""
+        status, response = self._dispatch(method, path, key, raw)
+        with self._lock:
+            # The state can be modified by other requests, dump it while holding the lock
+            return status, json.dumps(response).encode('utf-8')
+
+    def _dispatch(self, method, path, key, raw):
+        path = urlparse(path).path
+        with self._lock:
+            self.requests.append((method, path))
+            injected = self._fail_next.pop(0) if self._fail_next else None
+            if injected is None and self.error_rate and self._random.random() < self.error_rate:
+                injected = self.error_status
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if injected is not None:
+            return injected, {'name': 'Injected error', 'message': 'Injected error', 'url': path}
+        if key != self.key:
+            message = 'Authentication failed. Please make sure you pass the API key of an API enabled user along in the Authorization header.'
+            return 403, {'name': message, 'message': message, 'url': path}
+        try:
+            body = json.loads(raw.decode('utf-8')) if raw.strip() else {}
+        except ValueError:
+            return 400, {'name': 'Invalid JSON', 'message': 'Invalid JSON', 'url': path}
+        for route_method, pattern, func in self._routes:
+            if route_method != '*' and route_method != method:
+                continue
+            match = pattern.match(path)
+            if match:
+                try:
+                    with self._lock:
+                        return 200, func(match, body)
+                except StubError as e:
+                    return e.status, {'name': e.message, 'message': e.message, 'url': path, 'errors': [e.message]}
+        return 404, {'name': 'Not Found', 'message': 'Not Found', 'url': path}
+
+    # ### Endpoints ###
+
+    def _version(self, match, body):
+        return {'version': MISP_VERSION, 'perm_sync': True}
+
+    def _pymisp_version(self, match, body):
+        return {'version': pymisp.__version__}
+
+    def _events_index(self, match, body):
+        to_return = []
+        for event in self.events.values():
+            meta = {k: v for k, v in event.items() if k not in ('Attribute', 'Object', 'Tag')}
+            meta['EventTag'] = [{'Tag': t} for t in event['Tag']]
+            meta['attribute_count'] = str(len(event['Attribute']) + sum(len(o['Attribute']) for o in event['Object']))
+            to_return.append(meta)
+        return to_return
+
+    def _get_event(self, match, body):
+        return {'Event': self._find(self.events, match.group('id'), 'event')}
+
+    def _add_event(self, match, body):
+        event = copy.deepcopy(_body_entry(body, 'Event'))
+        event.pop('id', None)
+        return {'Event': self._store_event(event)}
+
+    def _edit_event(self, match, body):
+        existing = self._find(self.events, match.group('id'), 'event')
+        event = copy.deepcopy(_body_entry(body, 'Event'))
+        event['uuid'] = existing['uuid']
+        for attribute in existing['Attribute']:
+            self.attributes.pop(attribute['id'], None)
+        for obj in existing['Object']:
+            self.objects.pop(obj['id'], None)
+            for attribute in obj['Attribute']:
+                self.attributes.pop(attribute['id'], None)
+        return {'Event': self._store_event(event, existing['id'])}
+
+    def _delete_event(self, match, body):
+        event = self._find(self.events, match.group('id'), 'event')
+        del self.events[event['id']]
+        self.attributes = {k: v for k, v in self.attributes.items() if v[1] is not event}
+        self.objects = {k: v for k, v in self.objects.items() if v[1] is not event}
+        return {'message': 'Event deleted.'}
+
+    def _publish_event(self, match, body):
+        event = self._find(self.events, match.group('id'), 'event')
+        event['published'] = True
+        event['publish_timestamp'] = str(int(time.time()))
+        return {'name': 'Publish', 'message': 'Job queued', 'url': '/events/publish/{}'.format(event['id']), 'id': event['id']}
+
+    def _add_attributes(self, match, body):
+        event = self._find(self.events, match.group('id'), 'event')
+        attributes = body if isinstance(body, list) else [body]
+        to_return = []
+        for attribute in attributes:
+            attribute = copy.deepcopy(_body_entry(attribute, 'Attribute'))
+            if isinstance(attribute, six.string_types):
+                attribute = json.loads(attribute)
+            values = attribute['value'] if isinstance(attribute.get('value'), list) else [attribute.get('value')]
+            for value in values:
+                new = dict(attribute, value=value)
+                new.pop('id', None)
+                event['Attribute'].append(self._store_attribute(new, event))
+                to_return.append(new)
+        event['timestamp'] = str(int(time.time()))
+        if len(to_return) == 1:
+            return {'Attribute': to_return[0]}
+        return {'Attribute': to_return}
+
+    def _edit_attribute(self, match, body):
+        attribute, event = self._find(self.attributes, match.group('id'), 'attribute')
+        changes = _body_entry(body, 'Attribute')
+        attribute.update({k: v for k, v in changes.items() if k not in ('id', 'uuid', 'event_id', 'object_id')})
+        attribute['timestamp'] = str(int(time.time()))
+        return {'Attribute': attribute}
+
+    def _delete_attribute(self, match, body):
+        attribute, event = self._find(self.attributes, match.group('id'), 'attribute')
+        del self.attributes[attribute['id']]
+        container = self.objects[attribute['object_id']][0] if attribute['object_id'] in self.objects else event
+        container['Attribute'] = [a for a in container['Attribute'] if a is not attribute]
+        return {'message': 'Attribute deleted.'}
+
+    def _add_object(self, match, body):
+        event = self._find(self.events, match.group('id'), 'event')
+        obj = copy.deepcopy(_body_entry(body, 'Object'))
+        obj.pop('id', None)
+        event['Object'].append(self._store_object(obj, event))
+        return {'Object': obj}
+
+    def _edit_object(self, match, body):
+        obj, event = self._find(self.objects, match.group('id'), 'object')
+        changes = copy.deepcopy(_body_entry(body, 'Object'))
+        for attribute in obj['Attribute']:
+            self.attributes.pop(attribute['id'], None)
+        obj.update({k: v for k, v in changes.items() if k not in ('id', 'uuid', 'event_id', 'Attribute')})
+        obj['Attribute'] = [self._store_attribute(a, event, obj) for a in changes.get('Attribute', [])]
+        obj['timestamp'] = str(int(time.time()))
+        return {'Object': obj}
+
+    def _delete_object(self, match, body):
+        obj, event = self._find(self.objects, match.group('id'), 'object')
+        del self.objects[obj['id']]
+        for attribute in obj['Attribute']:
+            self.attributes.pop(attribute['id'], None)
+        event['Object'] = [o for o in event['Object'] if o is not obj]
+        return {'message': 'Object deleted'}
+
+    def _add_sighting(self, match, body):
+        body = _body_entry(body, 'Sighting') or {}
+        if match.group('id'):
+            attributes = [self._find(self.attributes, match.group('id'), 'attribute')]
+        elif body.get('id') or body.get('uuid'):
+            attributes = [self._find(self.attributes, body.get('id') or body.get('uuid'), 'attribute')]
+        else:
+            values = body.get('values') or [body.get('value')]
+            attributes = [entry for entry in self.attributes.values() if entry[0].get('value') in values]
+            if not attributes:
+                raise StubError(404, 'No valid attributes found that match the criteria.')
+        for attribute, event in attributes:
+            sighting = {'id': self._next_id('sighting'), 'attribute_id': attribute['id'], 'event_id': event['id'],
+                        'type': str(body.get('type') or 0), 'source': body.get('source') or '',
+                        'date_sighting': str(body.get('timestamp') or int(time.time())), 'org_id': '1'}
+            self.sightings.append(sighting)
+        return {'message': '{} sighting{} successfully added.'.format(len(attributes), '' if len(attributes) == 1 else 's')}
+
+    def _list_sightings(self, match, body):
+        field = 'event_id' if match.group('scope') == 'event' else 'attribute_id'
+        return [{'Sighting': s} for s in self.sightings if s[field] == match.group('id')]
+
+    def _list_tags(self, match, body):
+        return {'Tag': list(self.tags.values())}
+
+    def _add_tag(self, match, body):
+        tag = _body_entry(body, 'Tag')
+        if tag.get('name') in self.tags:
+            raise StubError(403, 'A similar name already exists.')
+        return {'Tag': self._store_tag(dict(tag))}
+
+    def _tagged(self, identifier):
+        for event in self.events.values():
+            if event['uuid'] == identifier:
+                return event
+        return self._find(self.attributes, identifier, 'object')[0]
+
+    def _attach_tag(self, match, body):
+        target = self._tagged(body.get('uuid'))
+        tag = self._store_tag({'name': body.get('tag')})
+        if tag['name'] not in [t['name'] for t in target.setdefault('Tag', [])]:
+            target['Tag'].append(dict(tag))
+        return {'saved': True, 'success': 'Tag attached.', 'check_publish': True}
+
+    def _remove_tag(self, match, body):
+        target = self._tagged(body.get('uuid'))
+        target['Tag'] = [t for t in target.get('Tag', []) if t['name'] != body.get('tag')]
+        return {'saved': True, 'success': 'Tag removed.', 'check_publish': True}
+
+    def _list_feeds(self, match, body):
+        return [{'Feed': f} for f in self.feeds.values()]
+
+    def _get_feed(self, match, body):
+        return {'Feed': self._find(self.feeds, match.group('id'), 'feed')}
+
+    def _add_feed(self, match, body):
+        feed = dict(_body_entry(body, 'Feed'), id=self._next_id('feed'))
+        feed.setdefault('enabled', False)
+        self.feeds[feed['id']] = feed
+        return {'Feed': feed}
+
+    def _edit_feed(self, match, body):
+        feed = self._find(self.feeds, match.group('id'), 'feed')
+        feed.update({k: v for k, v in _body_entry(body, 'Feed').items() if k != 'id'})
+        return {'Feed': feed}
+
+    def _delete_feed(self, match, body):
+        feed = self._find(self.feeds, match.group('id'), 'feed')
+        del self.feeds[feed['id']]
+        return {'message': 'Feed deleted.'}
+
+    def _rest_search(self, match, body):
+        body = _body_entry(body, 'Event') if isinstance(body, dict) else {}
+        events = list(self.events.values())
+        if body.get('eventid'):
+            ids = [str(i) for i in _as_list(body['eventid'])]
+            events = [e for e in events if _match([e['id']], ids)]
+        if 'published' in body:
+            events = [e for e in events if bool(e['published']) == bool(body['published'])]
+        if body.get('from'):
+            events = [e for e in events if e['date'] >= body['from']]
+        if body.get('to'):
+            events = [e for e in events if e['date'] <= body['to']]
+        if body.get('tags'):
+            tags = _as_list(body['tags'])
+            events = [e for e in events if _match([t['name'] for t in e['Tag']], tags)]
+
+        def attribute_filter(attribute):
+            for field, key in (('value', 'value'), ('type', 'type'), ('category', 'category'), ('uuid', 'uuid')):
+                if body.get(key) and not _match([attribute.get(field)], _as_list(body[key])):
+                    return False
+            if body.get('to_ids') is not None and bool(attribute.get('to_ids')) != bool(int(body['to_ids'])):
+                return False
+            return True
+
+        filtering = any(body.get(k) for k in ('value', 'type', 'category', 'uuid')) or body.get('to_ids') is not None
+        if match.group('controller') == 'attributes':
+            attributes = []
+            for event in events:
+                for attribute in event['Attribute'] + [a for o in event['Object'] for a in o['Attribute']]:
+                    if attribute_filter(attribute):
+                        attributes.append(attribute)
+            return {'response': {'Attribute': attributes}}
+
+        to_return = []
+        for event in events:
+            if body.get('uuid') and event['uuid'] == body['uuid']:
+                pass
+            elif filtering:
+                attributes = [a for a in event['Attribute'] if attribute_filter(a)]
+                objects = [o for o in event['Object'] if any(attribute_filter(a) for a in o['Attribute'])]
+                if not attributes and not objects:
+                    continue
+            if body.get('metadata'):
+                event = {k: v for k, v in event.items() if k not in ('Attribute', 'Object')}
+            to_return.append({'Event': event})
+        return {'response': to_return}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pymisp.tools import analytics, columnar
+
+
+def event(date, tags, attributes):
+    return {'Event': {'id': '1', 'uuid': '', 'info': 'test', 'date': date,
+                      'Tag': [{'name': t, 'colour': '#{:06d}'.format(len(t))} for t in tags],
+                      'Attribute': [{'type': t, 'category': c, 'value': str(i)} for i, (c, t) in enumerate(attributes)]}}
+
+
+@unittest.skipUnless(analytics.has_pandas, 'pandas is required')
+class TestAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        events = [event('2017-12-01', ['tlp:white', 'osint:source-type="blog-post"'], [('Network activity', 'ip-dst')]),
+                  event('2017-12-05', ['tlp:white'], [('Network activity', 'ip-dst'), ('Payload delivery', 'md5')]),
+                  event('2017-12-09', ['tlp:green', 'Foo'], []),
+                  event('2017-12-10', [], [('Network activity', 'domain')]),
+                  event('2016-01-01', ['tlp:white'], [])]
+        self.tables = columnar.EventTables(events).to_pandas()
+
+    def test_select_in_range(self):
+        selected = analytics.select_in_range(self.tables['events'], '2017-12-05', '2017-12-09')
+        self.assertEqual(selected['event_key'].tolist(), [1, 2])
+
+    def test_tag_counts(self):
+        counts = analytics.tag_counts(self.tables)
+        self.assertEqual(counts['tlp:white'], 3)
+        self.assertEqual(counts.index[0], 'tlp:white')
+        self.assertEqual(analytics.tag_colours(self.tables)['Foo'], '#000003')
+
+    def test_tag_counts_over_time(self):
+        counts = analytics.tag_counts_over_time(self.tables, periods=2, days=5, end='2017-12-10')
+        self.assertEqual(counts.columns.tolist(), ['2017-12-05', '2017-12-10'])
+        self.assertEqual(counts.loc['tlp:white'].tolist(), [2, 0])
+        self.assertEqual(counts.loc['tlp:green'].tolist(), [0, 1])
+        trend = analytics.linear_trend(counts)
+        self.assertEqual(trend.loc['tlp:white'].tolist(), [2, 0])
+
+    def test_taxonomies(self):
+        taxonomies = analytics.tag_taxonomies(['tlp:white', 'osint:source-type="blog-post"', 'Foo'], ['tlp', 'osint'])
+        self.assertEqual(taxonomies.tolist(), ['tlp', 'osint', None])
+        groups = analytics.taxonomy_breakdown(analytics.tag_counts(self.tables).to_frame(), ['tlp', 'osint'])
+        self.assertEqual(sorted(groups['tlp'].index), ['tlp:green', 'tlp:white'])
+        self.assertEqual(groups[None].index.tolist(), ['Foo'])
+
+    def test_attribute_type_counts(self):
+        counts = analytics.attribute_type_counts(self.tables)
+        self.assertEqual(counts[('Network activity', 'ip-dst')], 2)
+        self.assertEqual(len(counts), 3)
+
+    def test_tags_per_event(self):
+        distribution = analytics.tags_per_event(self.tables, '2017-11-30', '2017-12-10', 10)
+        self.assertEqual(dict(zip(distribution['tags'], distribution['events'])), {0: 1, 1: 1, 2: 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+from pymisp import MISPEvent
+from pymisp.tools import columnar
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/mispevent_testfiles/existing_event.json', 'r') as f:
+            self.event = json.load(f)
+        self.event['Event']['Attribute'][0]['Sighting'] = [{'type': '0', 'date_sighting': '1513948642', 'source': 'test',
+                                                            'Organisation': {'name': 'CIRCL'}}]
+        self.tables = columnar.EventTables({'response': [self.event]})
+
+    def test_columns(self):
+        columns = self.tables.columns
+        nb_attributes = len(self.event['Event']['Attribute']) + sum(len(o['Attribute']) for o in self.event['Event']['Object'])
+        self.assertEqual(len(self.tables), 1)
+        self.assertEqual(len(columns['attributes']['attribute_key']), nb_attributes)
+        self.assertEqual(len(columns['objects']['object_key']), len(self.event['Event']['Object']))
+        self.assertEqual(len(columns['tags']['name']), len(set(columns['tags']['name'])))
+        self.assertEqual(columns['sightings']['attribute_key'], [0])
+        # The attributes of the objects reference their object
+        first_object = self.event['Event']['Object'][0]
+        position = columns['attributes']['uuid'].index(first_object['Attribute'][0]['uuid'])
+        self.assertEqual(columns['attributes']['object_key'][position], 0)
+
+    def test_misp_event(self):
+        event = MISPEvent()
+        event.load(self.event)
+        tables = columnar.EventTables(event)
+        self.assertEqual(tables.columns['attributes']['uuid'], self.tables.columns['attributes']['uuid'])
+
+    @unittest.skipUnless(columnar.has_pandas, 'pandas is required')
+    def test_pandas(self):
+        import numpy
+        import pandas
+        tables = self.tables.to_pandas()
+        attributes = tables['attributes']
+        self.assertEqual(attributes['timestamp'].dtype, numpy.dtype('datetime64[ns]'))
+        self.assertEqual(tables['events']['date'].dtype, numpy.dtype('datetime64[ns]'))
+        self.assertEqual(attributes['timestamp'][0], pandas.Timestamp(int(self.event['Event']['Attribute'][0]['timestamp']), unit='s'))
+        self.assertEqual(attributes['to_ids'].sum(), sum(1 for a in self.tables.columns['attributes']['to_ids'] if a))
+        tag_names = tables['event_tags'].merge(tables['tags'], on='tag_key')['name']
+        self.assertIn('tlp:white', tag_names.tolist())
+
+    @unittest.skipUnless(columnar.has_pyarrow, 'pyarrow is required')
+    def test_arrow(self):
+        tables = self.tables.to_arrow()
+        self.assertEqual(tables['attributes'].num_rows, len(self.tables.columns['attributes']['uuid']))
+        self.assertEqual(tables['sightings'].column_names, ['attribute_key', 'event_key', 'type', 'date_sighting', 'source', 'org'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pymisp import MISPEvent
+from pymisp.tools.event_diff import diff_events, merge_events
+
+
+class TestEventDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.base = self.load()
+
+    def load(self):
+        event = MISPEvent()
+        event.load_file('tests/mispevent_testfiles/existing_event.json')
+        return event
+
+    def test_no_change(self):
+        self.assertEqual(len(diff_events(self.base, self.load())), 0)
+
+    def test_diff(self):
+        new = self.load()
+        new.info = 'Changed'
+        new.add_tag('tlp:green')
+        new.Tag = [t for t in new.Tag if t.name != 'tlp:white']
+        new.attributes[0].comment = 'Comment'
+        removed = new.attributes.pop(1)
+        added = new.add_attribute('ip-dst', '8.8.8.8')
+        obj = new.objects[0]
+        obj.attributes[0].value = 'changed.exe'
+        obj.add_reference(new.objects[1].uuid, 'related-to')
+
+        changes = diff_events(self.base, new)
+        paths = dict((c.path, c) for c in changes)
+        self.assertEqual(paths[('info',)].new, 'Changed')
+        self.assertEqual(paths[('Tag', 'tlp:green')].op, 'add')
+        self.assertEqual(paths[('Tag', 'tlp:white')].op, 'remove')
+        self.assertEqual(paths[('Attribute', new.attributes[0].uuid, 'comment')].new, 'Comment')
+        self.assertEqual(paths[('Attribute', removed.uuid)].op, 'remove')
+        self.assertEqual(paths[('Attribute', added.uuid)].new['value'], '8.8.8.8')
+        self.assertEqual(paths[('Object', obj.uuid, 'Attribute', obj.attributes[0].uuid, 'value')].new, 'changed.exe')
+        self.assertEqual(paths[('Object', obj.uuid, 'ObjectReference', (new.objects[1].uuid, 'related-to'))].op, 'add')
+        self.assertEqual(len(changes), 8)
+        self.assertEqual(len(changes.filter(op='add', kind='Attribute')), 1)
+        self.assertEqual(len(changes.filter(kind='Tag')), 2)
+
+        # Applied on another copy of the base event, the result is identical to new
+        copy = self.load()
+        changes.apply(copy)
+        self.assertEqual(len(diff_events(copy, new)), 0)
+        self.assertEqual(copy.objects[0].get_attributes_by_relation(obj.attributes[0].object_relation)[0].value, 'changed.exe')
+
+        update = changes.to_update(new)['Event']
+        self.assertEqual(update['info'], 'Changed')
+        self.assertEqual(update['Tag'], [{'name': 'tlp:green'}])
+        self.assertEqual(sorted(a['uuid'] for a in update['Attribute']), sorted([new.attributes[0].uuid, removed.uuid, added.uuid]))
+        self.assertTrue([a for a in update['Attribute'] if a['uuid'] == removed.uuid][0]['deleted'])
+        self.assertEqual(len(update['Object']), 1)
+        self.assertEqual(update['Object'][0]['Attribute'][0]['value'], 'changed.exe')
+        self.assertNotIn('timestamp', update['Object'][0]['Attribute'][0])
+
+    def test_merge(self):
+        ours = self.load()
+        theirs = self.load()
+        ours.info = 'Ours'
+        ours.attributes[0].comment = 'Ours'
+        theirs.attributes[0].comment = 'Theirs'
+        theirs.attributes[1].to_ids = True
+        theirs.add_tag('tlp:green')
+        ours.add_tag('tlp:green')
+        new = theirs.add_attribute('domain', 'example.com')
+
+        changes, conflicts = merge_events(self.base, ours, theirs)
+        self.assertEqual([c.path for c in conflicts], [('Attribute', ours.attributes[0].uuid, 'comment')])
+        changes.apply(ours)
+        self.assertEqual(ours.info, 'Ours')
+        self.assertEqual(ours.attributes[0].comment, 'Ours')
+        self.assertTrue(ours.attributes[1].to_ids)
+        self.assertEqual(ours.attributes[-1].uuid, new.uuid)
+        self.assertEqual([t.name for t in ours.Tag].count('tlp:green'), 1)
+
+        ours = self.load()
+        ours.attributes[0].comment = 'Ours'
+        changes, conflicts = merge_events(self.base, ours, theirs, resolve='theirs')
+        changes.apply(ours)
+        self.assertEqual(ours.attributes[0].comment, 'Theirs')
+
+    def test_merge_removed(self):
+        ours = self.load()
+        theirs = self.load()
+        removed = ours.objects.pop(0)
+        theirs.objects[0].attributes[0].value = 'changed.exe'
+
+        changes, conflicts = merge_events(self.base, ours, theirs)
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0].ours.op, 'remove')
+        self.assertEqual(len(changes), 0)
+
+        changes, conflicts = merge_events(self.base, ours, theirs, resolve='theirs')
+        changes.apply(ours)
+        self.assertEqual(ours.objects[-1].uuid, removed.uuid)
+        self.assertEqual(ours.objects[-1].attributes[0].value, 'changed.exe')
+
+
+if __name__ == '__main__':
+    unittest.main()
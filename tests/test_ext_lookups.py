@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pymisp.tools import ext_lookups
+from pymisp.tools.ext_lookups import GalaxiesIndex, TaxonomiesIndex, _AffixIndex
+
+
+class FakeClusterValue(object):
+
+    def __init__(self, value, synonyms=()):
+        self.value = value
+        self.searchable = [value] + list(synonyms)
+
+
+class FakeCluster(dict):
+
+    def __init__(self, cluster_type, values):
+        super(FakeCluster, self).__init__((v.value, v) for v in values)
+        self.type = cluster_type
+
+
+class FakeEntry(object):
+
+    def __init__(self, expanded):
+        self.expanded = expanded
+
+
+class FakeTaxonomy(dict):
+
+    def __init__(self, name, predicates):
+        super(FakeTaxonomy, self).__init__(predicates)
+        self.name = name
+
+
+class TestExtLookups(unittest.TestCase):
+
+    def setUp(self):
+        self.clusters = {
+            'threat-actor': FakeCluster('threat-actor', [FakeClusterValue('Sofacy', ['APT28', 'Fancy Bear']),
+                                                         FakeClusterValue('Turla', ['Snake'])]),
+            'tool': FakeCluster('tool', [FakeClusterValue('X-Agent', ['Sofacy implant'])])}
+        self.taxonomies = {
+            'tlp': FakeTaxonomy('tlp', {'white': {}, 'green': {}}),
+            'admiralty-scale': FakeTaxonomy('admiralty-scale', {'source-reliability': {
+                'a': FakeEntry('Completely reliable'), 'b': FakeEntry('Usually reliable')}})}
+
+    def tearDown(self):
+        ext_lookups.reset_cache()
+
+    def test_affix_index(self):
+        index = _AffixIndex(['white', 'green', 'greenish', 'reliable'])
+        self.assertEqual(index.search('gree'), set(['green', 'greenish']))
+        self.assertEqual(index.search('ble'), set(['reliable']))
+        self.assertEqual(index.search('x'), set())
+
+    def test_galaxies(self):
+        index = GalaxiesIndex(self.clusters)
+        cluster, value = index.revert_machinetag('misp-galaxy:threat-actor="Sofacy"')
+        self.assertEqual((cluster.type, value.value), ('threat-actor', 'Sofacy'))
+        with self.assertRaises(KeyError):
+            index.revert_machinetag('misp-galaxy:threat-actor="Unknown"')
+        found = dict((cluster.type, [v.value for v in values]) for cluster, values in index.search('sofacy'))
+        self.assertEqual(found, {'threat-actor': ['Sofacy'], 'tool': ['X-Agent']})
+        self.assertEqual(index.search('SOFACY'), index.search('sofacy'))
+        self.assertEqual(index.search('nothing'), [])
+        # Substrings, across words and shorter than a trigram
+        found = dict((cluster.type, [v.value for v in values]) for cluster, values in index.search('ncy be'))
+        self.assertEqual(found, {'threat-actor': ['Sofacy']})
+        found = dict((cluster.type, [v.value for v in values]) for cluster, values in index.search('-a'))
+        self.assertEqual(found, {'tool': ['X-Agent']})
+        self.assertEqual(index.search('ylf'), [])
+
+    def test_taxonomies(self):
+        index = TaxonomiesIndex(self.taxonomies)
+        self.assertEqual(len(index.revert_machinetag('tlp:white')), 2)
+        taxonomy, predicate, entry = index.revert_machinetag('admiralty-scale:source-reliability="a"')
+        self.assertEqual(entry.expanded, 'Completely reliable')
+        self.assertEqual(index.search('tl'), ['tlp:white', 'tlp:green'])
+        self.assertEqual(index.search('reliability'), ['admiralty-scale:source-reliability="a"',
+                                                       'admiralty-scale:source-reliability="b"'])
+        self.assertEqual(index.search('usually', expanded=True), ['admiralty-scale:source-reliability="Usually reliable"'])
+
+    def test_cache(self):
+        ext_lookups._galaxies_index = GalaxiesIndex(self.clusters)
+        ext_lookups._taxonomies_index = TaxonomiesIndex(self.taxonomies)
+        tags = ['tlp:green', 'misp-galaxy:tool="X-Agent"', 'unknown']
+        galaxies = ext_lookups.revert_tags_from_galaxies(tags)
+        self.assertEqual(galaxies['misp-galaxy:tool="X-Agent"'][1].value, 'X-Agent')
+        self.assertEqual(galaxies['unknown'], [])
+        taxonomies = ext_lookups.revert_tags_from_taxonomies(tags)
+        self.assertEqual(taxonomies['tlp:green'][0].name, 'tlp')
+        self.assertEqual(taxonomies['unknown'], [])
+        self.assertEqual(ext_lookups.revert_tag_from_taxonomies('unknown'), [])
+        self.assertEqual(ext_lookups.search_taxonomies('completely'), ['admiralty-scale:source-reliability="Completely reliable"'])
+        ext_lookups.reset_cache()
+        self.assertIsNone(ext_lookups._galaxies_index)
+        self.assertIsNone(ext_lookups._taxonomies_index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pymisp.exceptions import PyMISPError
+from pymisp.tools.feed_cache import HashIndex, write_hash_index, update_hash_index
+from pymisp.tools.feed_exporter import FeedExporter, extract_event
+
+
+U = {letter: '00000000-0000-0000-0000-00000000000{}'.format(letter) for letter in 'abc'}
+
+
+def make_event(uuid, timestamp, values):
+    attributes = [{'uuid': '{}-{}'.format(uuid, i), 'type': t, 'category': 'Network activity', 'value': v,
+                   'distribution': '5', 'to_ids': True, 'id': str(i)} for i, (t, v) in enumerate(values)]
+    attributes.append({'uuid': '{}-private'.format(uuid), 'type': 'comment', 'category': 'Other', 'value': 'private',
+                       'distribution': '0'})
+    return {'Event': {'uuid': uuid, 'id': '1', 'info': 'Event {}'.format(uuid), 'timestamp': str(timestamp),
+                      'date': '2018-01-01', 'analysis': '0', 'threat_level_id': '1',
+                      'Orgc': {'name': 'ORG', 'uuid': 'org', 'id': '1'}, 'Attribute': attributes}}
+
+
+class FakeFeedMISP(object):
+    """Mimics the index and event endpoints of PyMISP"""
+
+    def __init__(self):
+        self.events = {}
+        self.fetched = []
+
+    def get_index(self, filters=None):
+        return {'response': [{'uuid': e['Event']['uuid'], 'timestamp': e['Event']['timestamp'], 'info': e['Event']['info'],
+                              'date': '2018-01-01', 'analysis': '0', 'threat_level_id': '1', 'Orgc': {'name': 'ORG'},
+                              'EventTag': [{'Tag': {'name': 'tlp:white', 'colour': '#fff'}}]}
+                             for e in self.events.values()]}
+
+    def get_event(self, uuid):
+        self.fetched.append(uuid)
+        return self.events[uuid]
+
+
+class TestFeedExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.misp = FakeFeedMISP()
+        self.misp.events[U['a']] = make_event(U['a'], 1, [('domain', 'example.com'), ('ip-dst|port', '8.8.8.8|53')])
+        self.misp.events[U['b']] = make_event(U['b'], 1, [('domain', 'example.org')])
+        self.exporter = FeedExporter(self.misp, self.output_dir, ['1', '2', '3', '4', '5'], workers=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_extract_event(self):
+        event, hashes = extract_event(self.misp.events[U['a']], ['5'])
+        self.assertNotIn('id', event['Event'])
+        self.assertEqual(len(event['Event']['Attribute']), 2)
+        self.assertEqual(len(hashes), 3)
+
+    def test_incremental_export(self):
+        summary = self.exporter.export()
+        self.assertEqual(sorted(summary['new']), [U['a'], U['b']])
+        with open(os.path.join(self.output_dir, 'manifest.json')) as f:
+            self.assertEqual(sorted(json.load(f).keys()), [U['a'], U['b']])
+        with open(os.path.join(self.output_dir, 'hashes.csv')) as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+        self.misp.fetched = []
+        summary = self.exporter.export()
+        self.assertEqual(self.misp.fetched, [])
+        self.assertEqual(summary['unchanged'], 2)
+
+        self.misp.events[U['b']] = make_event(U['b'], 2, [('domain', 'example.net'), ('domain', 'example.info')])
+        del self.misp.events[U['a']]
+        self.misp.events[U['c']] = make_event(U['c'], 1, [('domain', 'example.com')])
+        summary = self.exporter.export()
+        self.assertEqual(sorted(self.misp.fetched), [U['b'], U['c']])
+        self.assertEqual((summary['new'], summary['updated'], summary['removed']), ([U['c']], [U['b']], [U['a']]))
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, U['a'] + '.json')))
+        self.assertEqual(sorted(self.exporter.load_hashes()), [U['b'], U['c']])
+        self.assertEqual(len(self.exporter.load_hashes()[U['b']]), 2)
+        with HashIndex(os.path.join(self.output_dir, 'hashes.idx')) as index:
+            self.assertEqual(index.lookup('example.com'), [U['c']])
+            self.assertEqual(index.lookup('example.org'), [])
+
+
+class TestFeedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'hashes.idx')
+        self.uuids = ['5a3c2fda-78f4-44b7-8366-46da02de0b81', '5a3c2fee-7c8c-438a-8f7f-465402de0b81']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def md5(self, value):
+        return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+    def test_lookup(self):
+        entries = [(self.md5('value{}'.format(i)), self.uuids[i % 2]) for i in range(1000)]
+        write_hash_index(self.path, entries + entries[:10])
+        with HashIndex(self.path) as index:
+            self.assertEqual(len(index), 1000)
+            self.assertEqual(index.lookup('value3'), [self.uuids[1]])
+            self.assertEqual(index.lookup_md5(self.md5('value4')), [self.uuids[0]])
+            self.assertTrue('value999' in index)
+            self.assertFalse('value1000' in index)
+            self.assertEqual(index.lookup_many(['value1', 'foo']), {'value1': [self.uuids[1]]})
+            index.to_csv(os.path.join(self.tmp_dir, 'hashes.csv'))
+        with open(os.path.join(self.tmp_dir, 'hashes.csv')) as f:
+            self.assertEqual(sorted(line.strip() for line in f), sorted('{},{}'.format(*e) for e in entries))
+
+    def test_update(self):
+        write_hash_index(self.path, [(self.md5('foo'), self.uuids[0])])
+        update_hash_index(self.path, [(self.md5('foo'), self.uuids[1]), (self.md5('foo'), self.uuids[0])])
+        with HashIndex(self.path) as index:
+            self.assertEqual(len(index), 2)
+            self.assertEqual(sorted(index.lookup('foo')), self.uuids)
+
+    def test_invalid(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'md5,uuid\n')
+        self.assertRaises(PyMISPError, HashIndex, self.path)
+        self.assertRaises(PyMISPError, write_hash_index, self.path, [('foo', self.uuids[0])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import subprocess
+import sys
+import unittest
+
+# Cumulative import time of the pymisp package, in microseconds. The heavy dependencies (requests, jsonschema,
+# dateutil, the tools) are loaded on first use, so this stays far below the ~600ms of an eager import.
+IMPORT_BUDGET = 250000
+
+
+@unittest.skipUnless(sys.version_info >= (3, 7), 'Lazy loading requires python >= 3.7')
+class TestImportTime(unittest.TestCase):
+
+    def _run(self, code, *options):
+        process = subprocess.Popen([sys.executable] + list(options) + ['-c', code],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        self.assertEqual(process.returncode, 0, stderr)
+        return stdout.decode(), stderr.decode()
+
+    def test_budget(self):
+        timings = []
+        for _ in range(3):
+            _, stderr = self._run('import pymisp', '-X', 'importtime')
+            match = re.search(r'^import time:\s+\d+ \|\s+(\d+) \| pymisp$', stderr, re.M)
+            self.assertIsNotNone(match, stderr)
+            timings.append(int(match.group(1)))
+        self.assertLess(min(timings), IMPORT_BUDGET)
+
+    def test_lazy_modules(self):
+        stdout, _ = self._run('import sys, pymisp; print(" ".join(m for m in ("requests", "jsonschema", "dateutil", '
+                              '"pymisp.api", "pymisp.tools") if m in sys.modules))')
+        self.assertEqual(stdout.strip(), '')
+
+    def test_public_names(self):
+        stdout, _ = self._run('from pymisp import PyMISP, MISPEvent, AbstractMISPObjectGenerator, openioc; '
+                              'from pymisp.tools import GenericObjectGenerator, load_openioc; '
+                              'import pymisp; print(pymisp.tools.openioc.load_openioc is load_openioc, "PyMISP" in dir(pymisp))')
+        self.assertEqual(stdout.split(), ['True', 'True'])
+
+    def test_unknown_name(self):
+        import pymisp
+        with self.assertRaises(AttributeError):
+            pymisp.DoesNotExist
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from pymisp.exceptions import PyMISPError
+from pymisp.tools.feed_cache import write_hash_index
+from pymisp.tools.ioc_filter import BloomFilter, IOCFilters
+
+
+class TestIOCFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'iocs.bloom')
+        self.event = {'Event': {'uuid': 'b1ffc7b1-1d1b-4b3a-9d38-2f1f1a3a0c1e', 'Attribute': [
+            {'uuid': '1', 'type': 'ip-dst', 'value': '8.8.8.8', 'to_ids': True},
+            {'uuid': '2', 'type': 'domain', 'value': 'evil.example.com', 'to_ids': True},
+            {'uuid': '3', 'type': 'filename|md5', 'value': 'bad.exe|d41d8cd98f00b204e9800998ecf8427e', 'to_ids': False},
+            {'uuid': '4', 'type': 'domain', 'value': 'deleted.example.com', 'to_ids': True, 'deleted': True}]}}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_bloom_filter(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        # A new value may be reported as already present (false positive)
+        self.assertGreater(sum(bloom_filter.add('value{}'.format(i)) for i in range(1000)), 980)
+        self.assertFalse(bloom_filter.add('value0'))
+        self.assertTrue(all('value{}'.format(i) in bloom_filter for i in range(1000)))
+        false_positives = sum('other{}'.format(i) in bloom_filter for i in range(10000))
+        self.assertLess(false_positives, 200)
+        self.assertFalse(bloom_filter.saturated)
+        with self.assertRaises(PyMISPError):
+            BloomFilter(0)
+
+    def test_export(self):
+        filters = IOCFilters.from_events([self.event])
+        self.assertEqual(sorted(filters.filters), ['domain', 'filename', 'ip-dst', 'md5'])
+        self.assertEqual(filters.lookup('8.8.8.8'), ['ip-dst'])
+        self.assertEqual(filters.lookup('d41d8cd98f00b204e9800998ecf8427e'), ['md5'])
+        self.assertNotIn('deleted.example.com', filters)
+        filters.save(self.path)
+
+        loaded = IOCFilters.load(self.path)
+        self.assertEqual(loaded.to_bytes(), filters.to_bytes())
+        self.assertIn('evil.example.com', loaded)
+        self.assertNotIn('good.example.com', loaded)
+
+        # Incremental update
+        self.assertEqual(loaded.add_events(attributes=[{'uuid': '5', 'type': 'url', 'value': 'http://evil.example.com/a'}]), [])
+        self.assertEqual(loaded.lookup('http://evil.example.com/a'), ['url'])
+        saturated = loaded.add_events(attributes=[{'uuid': str(i), 'type': 'domain', 'value': 'd{}.example.com'.format(i)} for i in range(5)])
+        self.assertEqual(saturated, ['domain'])
+
+        filters = IOCFilters.from_events([self.event], per_type=False, to_ids_only=True)
+        self.assertEqual(list(filters.filters), ['all'])
+        self.assertIn('8.8.8.8', filters)
+        self.assertNotIn('bad.exe', filters)
+
+        with open(self.path, 'wb') as f:
+            f.write(filters.to_bytes()[:-1])
+        with self.assertRaises(PyMISPError):
+            IOCFilters.load(self.path)
+
+    def test_per_type_round_trip(self):
+        for per_type in (True, False):
+            for values in ([], [('8.8.8.8', 'ip-dst')], [('8.8.8.8', None)], [('8.8.8.8', 'ip-dst'), ('bad.exe', None)]):
+                filters = IOCFilters(per_type=per_type, capacity=10)
+                for value, attribute_type in values:
+                    filters.add(value, attribute_type)
+                loaded = IOCFilters.from_bytes(filters.to_bytes())
+                self.assertEqual(loaded.per_type, per_type)
+                self.assertEqual(sorted(loaded.filters), sorted(filters.filters))
+                self.assertEqual(loaded.to_bytes(), filters.to_bytes())
+
+        # The first version of the format has no flags
+        data = bytearray(IOCFilters(per_type=False).to_bytes())
+        data[8:12] = b'\x00\x01\x00\x00'
+        self.assertTrue(IOCFilters.from_bytes(bytes(data)).per_type)
+
+    def test_hash_index(self):
+        index_path = os.path.join(self.tmpdir, 'hashes.idx')
+        event_uuid = self.event['Event']['uuid']
+        write_hash_index(index_path, [(hashlib.md5(v.encode('utf-8')).hexdigest(), event_uuid) for v in ('8.8.8.8', 'bad.exe')])
+        filters = IOCFilters.from_hash_index(index_path)
+        self.assertEqual(len(filters), 2)
+        self.assertEqual(filters.lookup('bad.exe'), ['all'])
+        self.assertNotIn('evil.example.com', filters)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import json
+import unittest
+
+from pymisp import MISPEvent
+from pymisp.tools.ioc_matcher import IOCMatcher, normalize_url
+
+
+class TestIOCMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.event = {'Event': {'id': '1', 'uuid': 'event-1', 'info': 'IOCs', 'Attribute': [
+            {'uuid': 'ip', 'type': 'ip-dst', 'value': '10.0.0.0/8', 'to_ids': True},
+            {'uuid': 'ip6', 'type': 'ip-src', 'value': '2001:db8::1', 'to_ids': True},
+            {'uuid': 'domain', 'type': 'domain', 'value': 'Evil.example.com', 'to_ids': True},
+            {'uuid': 'url', 'type': 'url', 'value': 'HTTP://www.example.org:80/path/?q=1', 'to_ids': True},
+            {'uuid': 'md5', 'type': 'md5', 'value': 'D41D8CD98F00B204E9800998ECF8427E', 'to_ids': True},
+            {'uuid': 'filename|sha1', 'type': 'filename|sha1', 'value': 'bad.exe|da39a3ee5e6b4b0d3255bfef95601890afd80709', 'to_ids': False},
+            {'uuid': 'email', 'type': 'email-src', 'value': 'bad@example.net', 'to_ids': True},
+            {'uuid': 'deleted', 'type': 'email-src', 'value': 'deleted@example.net', 'to_ids': True, 'deleted': True}],
+            'Object': [{'name': 'domain-ip', 'Attribute': [
+                {'uuid': 'domain|ip', 'object_relation': 'domain-ip', 'type': 'domain|ip', 'value': 'c2.example.com|192.168.1.1', 'to_ids': True}]}]}}
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url('HTTP://www.Example.com:80/a/#top'), 'www.example.com/a')
+        self.assertEqual(normalize_url('https://www.example.com:8443/a?b=1'), 'www.example.com:8443/a?b=1')
+        self.assertEqual(normalize_url('www.example.com/a/'), 'www.example.com/a')
+
+    def test_match(self):
+        matcher = IOCMatcher(events=[self.event])
+        self.assertEqual(len(matcher), 8)
+        values = ['10.1.2.3', '11.0.0.1', '2001:db8::1', 'www.evil.example.com', 'example.com',
+                  'https://www.example.org/path?q=1', 'http://sub.evil.example.com/x', 'd41d8cd98f00b204e9800998ecf8427e',
+                  'bad.exe', 'DA39A3EE5E6B4B0D3255BFEF95601890AFD80709', 'bad@example.net', 'deleted@example.net',
+                  '192.168.1.1', 'c2.example.com', '10.1.2.3']
+        self.assertEqual(matcher.match(values), {
+            '10.1.2.3': ['ip'], '2001:db8::1': ['ip6'], 'www.evil.example.com': ['domain'],
+            'https://www.example.org/path?q=1': ['url'], 'http://sub.evil.example.com/x': ['domain'],
+            'd41d8cd98f00b204e9800998ecf8427e': ['md5'], 'bad.exe': ['filename|sha1'],
+            'DA39A3EE5E6B4B0D3255BFEF95601890AFD80709': ['filename|sha1'], 'bad@example.net': ['email'],
+            '192.168.1.1': ['domain|ip'], 'c2.example.com': ['domain|ip']})
+        self.assertEqual(matcher.match_events(['10.1.2.3']), {'10.1.2.3': ['event-1']})
+        self.assertEqual(matcher.attributes['md5']['event_id'], '1')
+
+        matcher = IOCMatcher(events={'response': [self.event]}, to_ids_only=True)
+        self.assertEqual(matcher.match(['bad.exe']), {})
+
+    def test_without_uuid(self):
+        matcher = IOCMatcher(attributes=[{'type': 'ip-dst', 'value': '8.8.8.8', 'event_id': '1'},
+                                         {'type': 'domain', 'value': 'evil.example.com', 'event_id': '2'}])
+        self.assertEqual(len(matcher), 2)
+        self.assertEqual(matcher.match(['8.8.8.8', 'evil.example.com']), {'8.8.8.8': ['local:1'], 'evil.example.com': ['local:2']})
+        self.assertEqual(matcher.attributes['local:2'], {'uuid': None, 'type': 'domain', 'value': 'evil.example.com',
+                                                         'event_id': '2', 'event_uuid': None})
+        self.assertEqual(matcher.match_events(['8.8.8.8', 'evil.example.com']), {'8.8.8.8': ['1'], 'evil.example.com': ['2']})
+
+    def test_types(self):
+        matcher = IOCMatcher(attributes=[
+            {'uuid': 'ip|port', 'type': 'ip-dst|port', 'value': '8.8.8.8|443'},
+            {'uuid': 'hostname|port', 'type': 'hostname|port', 'value': 'c2.example.com|443'},
+            {'uuid': 'impfuzzy', 'type': 'impfuzzy', 'value': '48:JsoDnjcX6T8Z1F8Q7oGt1pP8RqG:JHnjcTa8Q7TpuG'},
+            {'uuid': 'x509', 'type': 'x509-fingerprint-sha1', 'value': 'DA:39:A3:EE:5E:6B:4B:0D:32:55:BF:EF:95:60:18:90:AF:D8:07:09'}])
+        self.assertEqual(matcher.match(['8.8.8.8', 'c2.example.com', '443']), {'8.8.8.8': ['ip|port'], 'c2.example.com': ['hostname|port']})
+        self.assertEqual(matcher.match(['48:JsoDnjcX6T8Z1F8Q7oGt1pP8RqG:JHnjcTa8Q7TpuG', 'DA:39:A3:EE:5E:6B:4B:0D:32:55:BF:EF:95:60:18:90:AF:D8:07:09']),
+                         {'48:JsoDnjcX6T8Z1F8Q7oGt1pP8RqG:JHnjcTa8Q7TpuG': ['impfuzzy'],
+                          'DA:39:A3:EE:5E:6B:4B:0D:32:55:BF:EF:95:60:18:90:AF:D8:07:09': ['x509']})
+
+    def test_sources(self):
+        event = MISPEvent()
+        event.load(json.loads(json.dumps(self.event)))
+        matcher = IOCMatcher(events=[event])
+        self.assertEqual(matcher.match_events(['c2.example.com']), {'c2.example.com': ['event-1']})
+
+        attributes = [dict(a, event_id='1') for a in self.event['Event']['Attribute']]
+        matcher = IOCMatcher(attributes={'response': {'Attribute': attributes}})
+        self.assertEqual(matcher.match_events(['10.1.2.3']), {'10.1.2.3': ['1']})
+
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, 'event-1.json'), 'w') as f:
+                json.dump(self.event, f)
+            with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+                json.dump({'event-1': {'info': 'IOCs'}}, f)
+            matcher = IOCMatcher.from_directory(directory)
+            self.assertEqual(len(matcher), 8)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
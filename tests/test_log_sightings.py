@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pymisp.tools.ioc_matcher import IOCMatcher
+from pymisp.tools.log_sightings import LogSightingPipeline, extract_indicators, follow_file
+
+
+class SightingsCollector(object):
+
+    def __init__(self):
+        self.sightings = []
+
+    def add_sighting(self, sighting):
+        self.sightings.append(sighting.to_dict())
+
+
+class TestLogSightings(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = IOCMatcher(events=[{'Event': {'id': '1', 'uuid': 'event-1', 'Attribute': [
+            {'uuid': 'network', 'type': 'ip-dst', 'value': '10.0.0.0/8'},
+            {'uuid': 'domain', 'type': 'domain', 'value': 'evil.example.com'},
+            {'uuid': 'md5', 'type': 'filename|md5', 'value': 'bad.exe|d41d8cd98f00b204e9800998ecf8427e'}]}}])
+        self.lines = ['2018-01-01 12:00:{:02d} 192.168.1.{} GET http://www.example.org/index.html\n'.format(i % 60, i % 255)
+                      for i in range(500)]
+        self.lines[10] = '2018-01-01 12:00:10 10.1.2.3 GET http://sub.evil.example.com/a.php?x=1\n'
+        self.lines[20] = '2018-01-01 12:00:20 download of bad.exe, md5 D41D8CD98F00B204E9800998ECF8427E\n'
+        self.lines[30] = '2018-01-01 12:00:30 10.1.2.3 GET http://www.example.org/\n'
+
+    def test_extract(self):
+        self.assertEqual(extract_indicators('10.0.0.1 -> bob@mail.example.org: see http://evil.example.com/a?b=1, file bad.exe 2001:db8::1'),
+                         set(['10.0.0.1', 'bob@mail.example.org', 'mail.example.org', 'http://evil.example.com/a?b=1', 'bad.exe', '2001:db8::1']))
+
+    def test_pipeline(self):
+        sightings = SightingsCollector()
+        pipeline = LogSightingPipeline(self.matcher, sightings, source='proxy', chunk_size=100)
+        stats = pipeline.process_lines(iter(self.lines))
+        self.assertEqual((stats['lines'], stats['matches'], stats['sightings']), (500, 5, 4))
+        self.assertGreater(stats['lines_per_sec'], 0)
+        self.assertEqual(sorted(s['value'] for s in sightings.sightings),
+                         ['10.0.0.0/8', 'bad.exe', 'd41d8cd98f00b204e9800998ecf8427e', 'evil.example.com'])
+        self.assertEqual(set(s['source'] for s in sightings.sightings), set(['proxy']))
+
+        # Lines 10 and 30 are in different chunks, the network is sighted twice
+        by_uuid = SightingsCollector()
+        LogSightingPipeline(self.matcher, by_uuid, by_uuid=True, workers=2, chunk_size=25).process_lines(self.lines)
+        self.assertEqual(sorted(s['uuid'] for s in by_uuid.sightings), ['domain', 'md5', 'md5', 'network', 'network'])
+
+    def test_without_uuid(self):
+        self.matcher.add_attribute({'type': 'ip-dst', 'value': '10.1.2.3'})
+        self.matcher.add_attribute({'type': 'domain', 'value': 'sub.evil.example.com'})
+        sightings = SightingsCollector()
+        LogSightingPipeline(self.matcher, sightings, by_uuid=True).process_lines(self.lines[10:11])
+        # Sighted by value, as they have no uuid
+        self.assertEqual(sorted(s['uuid'] for s in sightings.sightings if 'uuid' in s), ['domain', 'network'])
+        self.assertEqual(sorted(s['value'] for s in sightings.sightings if 'value' in s), ['10.1.2.3', 'sub.evil.example.com'])
+
+    def test_follow(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'access.log')
+        try:
+            with open(path, 'w') as f:
+                f.write(self.lines[0])
+            lines = follow_file(path, poll_interval=0.01, from_start=True)
+            self.assertEqual(next(lines), self.lines[0])
+            self.assertEqual(next(lines), '')
+            with open(path, 'a') as f:
+                f.write(self.lines[10])
+            self.assertEqual(next(lines), self.lines[10])
+            # Rotation
+            os.rename(path, path + '.1')
+            with open(path, 'w') as f:
+                f.write(self.lines[20])
+            self.assertEqual([line for line in (next(lines), next(lines)) if line], [self.lines[20]])
+            lines.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pymisp import MISPEvent
+from pymisp.tools import load_warninglists
+from pymisp.tools.matching import CIDRIndex, HostnameSuffixIndex, AhoCorasick
+from pymisp.tools.load_warninglists import WarningListsMatcher
+
+
+class FakeWarninglistsMISP(object):
+    """Mimics the warninglists endpoints of PyMISP"""
+
+    def __init__(self, warninglists):
+        self.warninglists = warninglists
+        self.fetched = []
+
+    def get_warninglists(self):
+        return {'Warninglists': [{'Warninglist': {'id': i, 'name': wl['name'], 'version': wl['version']}}
+                                 for i, wl in enumerate(self.warninglists)]}
+
+    def get_warninglist(self, warninglist_id):
+        self.fetched.append(warninglist_id)
+        wl = dict(self.warninglists[int(warninglist_id)])
+        wl['WarninglistEntry'] = [{'value': v} for v in wl.pop('list')]
+        return {'Warninglist': wl}
+
+
+class TestMatching(unittest.TestCase):
+
+    def setUp(self):
+        self.warninglists = [
+            {'name': 'resolvers', 'type': 'cidr', 'list': ['8.8.8.8', '1.1.1.0/24', '2001:4860::/32', 'not-an-ip'],
+             'matching_attributes': ['ip-src', 'ip-dst', 'domain|ip']},
+            {'name': 'top', 'type': 'hostname', 'list': ['google.com', '.example.org']},
+            {'name': 'strings', 'type': 'string', 'list': ['foo.exe']},
+            {'name': 'tlds', 'type': 'substring', 'list': ['.onion', 'evil']},
+            {'name': 'phone', 'type': 'regex', 'list': ['^\\+1555']}]
+        self.matcher = WarningListsMatcher(self.warninglists)
+
+    def test_cidr_index(self):
+        index = CIDRIndex()
+        self.assertTrue(index.add('10.0.0.0/8', 'a'))
+        self.assertTrue(index.add('10.1.0.0/16', 'b'))
+        self.assertFalse(index.add('foo', 'c'))
+        self.assertEqual(index.lookup('10.1.2.3'), {'a', 'b'})
+        self.assertEqual(index.lookup('10.2.2.3'), {'a'})
+        self.assertEqual(index.lookup('11.2.2.3'), set())
+        self.assertEqual(index.lookup('example.com'), set())
+        self.assertEqual(index.lookup('10.1.2.256'), set())
+        self.assertEqual(index.lookup(' 10.1.2.3 '), {'a', 'b'})
+        self.assertEqual(index.lookup('::ffff:10.1.2.3'), set())
+
+    def test_hostname_index(self):
+        index = HostnameSuffixIndex()
+        index.add('example.com', 'a')
+        index.add('www.example.com.', 'b')
+        self.assertEqual(index.lookup('WWW.example.com'), {'a', 'b'})
+        self.assertEqual(index.lookup('example.com'), {'a'})
+        self.assertEqual(index.lookup('badexample.com'), set())
+
+    def test_aho_corasick(self):
+        automaton = AhoCorasick()
+        for i, pattern in enumerate(['he', 'she', 'his', 'hers']):
+            automaton.add(pattern, i)
+        self.assertEqual(automaton.lookup('ushers'), {0, 1, 3})
+        self.assertEqual(automaton.lookup('ahishe'), {0, 1, 2})
+        self.assertEqual(automaton.lookup('xyz'), set())
+
+    def test_warninglists_match(self):
+        self.assertEqual(self.matcher.match('8.8.8.8'), ['resolvers'])
+        self.assertEqual(self.matcher.match('1.1.1.42'), ['resolvers'])
+        self.assertEqual(self.matcher.match('2001:4860:4860::8888'), ['resolvers'])
+        self.assertEqual(self.matcher.match('not-an-ip'), ['resolvers'])
+        self.assertEqual(self.matcher.match('mail.google.com'), ['top'])
+        self.assertEqual(self.matcher.match('https://www.example.org/foo'), ['top'])
+        self.assertEqual(self.matcher.match('foo.exe'), ['strings'])
+        self.assertEqual(self.matcher.match('abcdef.onion'), ['tlds'])
+        self.assertEqual(self.matcher.match('+15551234'), ['phone'])
+        self.assertEqual(self.matcher.match('evil.google.com'), ['tlds', 'top'])
+        self.assertEqual(self.matcher.match('google.com|8.8.8.8', 'domain|ip'), ['resolvers', 'top'])
+        # Only the values of the composite types are split
+        self.assertEqual(self.matcher.match('foo.exe|bar', 'filename|md5'), ['strings'])
+        self.assertEqual(self.matcher.match('foo.exe|bar', 'text'), [])
+        self.assertEqual(self.matcher.match('foo.exe|bar'), [])
+        self.assertEqual(self.matcher.match('8.8.8.8', 'comment'), [])
+        self.assertEqual(self.matcher.match('9.9.9.9'), [])
+
+    def test_warninglists_match_values(self):
+        matches = self.matcher.match_values(['8.8.8.8', '9.9.9.9', 'google.com', '8.8.8.8'])
+        self.assertEqual(matches, {'8.8.8.8': ['resolvers'], 'google.com': ['top']})
+
+    def test_warninglists_match_event(self):
+        event = MISPEvent()
+        event.info = 'Test'
+        event.add_attribute('ip-dst', '8.8.8.8')
+        event.add_attribute('ip-dst', '9.9.9.9')
+        event.add_attribute('domain', 'www.google.com')
+        matches = self.matcher.match_event(event)
+        self.assertEqual(matches, {0: ['resolvers'], 2: ['top']})
+        matches = self.matcher.match_event(event.to_dict())
+        self.assertEqual(matches, {0: ['resolvers'], 2: ['top']})
+
+    def test_warninglists_match_event_without_uuid(self):
+        # The attributes of the objects come after the ones of the event
+        event = {'Event': {
+            'info': 'Test',
+            'Attribute': [{'type': 'ip-dst', 'value': '8.8.8.8'}, {'type': 'ip-dst', 'value': '9.9.9.9'}],
+            'Object': [{'name': 'domain-ip', 'Attribute': [{'type': 'domain', 'value': 'www.google.com'},
+                                                           {'type': 'ip-dst', 'value': '1.1.1.1'}]}]}}
+        self.assertEqual(self.matcher.match_event(event), {0: ['resolvers'], 2: ['top'], 3: ['resolvers']})
+
+    @unittest.skipUnless(load_warninglists.has_pymispwarninglists, 'pymispwarninglists is required')
+    def test_from_instance_snapshot(self):
+        for i, wl in enumerate(self.warninglists):
+            wl['version'] = 1
+            wl['description'] = 'Test {}'.format(i)
+        misp = FakeWarninglistsMISP(self.warninglists)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            snapshot_path = os.path.join(tmp_dir, 'warninglists.json')
+            wls = load_warninglists.from_instance(misp, snapshot_path=snapshot_path, workers=3)
+            self.assertEqual(sorted(wls.keys()), sorted(wl['name'] for wl in self.warninglists))
+            self.assertEqual(sorted(misp.fetched), ['0', '1', '2', '3', '4'])
+            self.assertTrue(os.path.exists(snapshot_path))
+
+            misp.fetched = []
+            self.warninglists[1]['version'] = 2
+            self.warninglists[1]['list'].append('misp-project.org')
+            wls = load_warninglists.from_instance(misp, snapshot_path=snapshot_path)
+            self.assertEqual(misp.fetched, ['1'])
+            self.assertEqual(WarningListsMatcher(wls).match('www.misp-project.org'), ['top'])
+
+            misp.fetched = []
+            load_warninglists.from_instance(misp, snapshot_path=snapshot_path)
+            self.assertEqual(misp.fetched, [])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pymisp import PyMISP
+from pymisp.metrics import MetricsAggregator, endpoint_template
+
+from tests.misp_stub_server import MISPStubServer
+
+
+class TestMetrics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MISPStubServer().start()
+        cls.server.load_events([{'Event': {'info': 'Metrics', 'Attribute': [{'type': 'ip-dst', 'value': '8.8.8.8'}]}}])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_endpoint_template(self):
+        root = 'https://misp.local/'
+        self.assertEqual(endpoint_template(root, 'https://misp.local/events/1234'), 'events/{id}')
+        self.assertEqual(endpoint_template(root, 'https://misp.local/events/5758ebf5-c898-48e6-9fe9-5665c0a83866'), 'events/{uuid}')
+        self.assertEqual(endpoint_template(root, 'https://misp.local/attributes/delete/12/1'), 'attributes/delete/{id}/{id}')
+        self.assertEqual(endpoint_template(root, 'https://misp.local/sightings/add/12.json?x=1'), 'sightings/add/{id}.json')
+        self.assertEqual(endpoint_template(root, 'https://misp.local/events/restSearch/download'), 'events/restSearch/download')
+
+    def test_aggregator(self):
+        aggregator = MetricsAggregator()
+        misp = PyMISP(self.server.url, self.server.key, metrics=aggregator)
+        for _ in range(5):
+            misp.get_event(1)
+        misp.get_event(42)
+        misp.search(values='8.8.8.8')
+        summary = aggregator.summary()
+        stats = summary[('GET', 'events/{id}')]
+        self.assertEqual(stats['count'], 6)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['statuses'], {'200': 5, '404': 1})
+        self.assertGreater(stats['response_bytes'], 0)
+        for phase in ('total', 'server', 'transfer', 'decode'):
+            self.assertGreater(stats[phase]['p50'], 0)
+        # The connection opened by the first request is kept alive
+        connects = [(key, s.samples_count('connect')) for key, s in aggregator.stats.items() if s.samples_count('connect')]
+        self.assertEqual(connects, [(('GET', 'servers/getPyMISPVersion.json'), 1)])
+        self.assertGreater(summary[('POST', 'events/restSearch/download')]['request_bytes'], 0)
+        self.assertIsNotNone(aggregator.percentile('events/{id}', 0.99))
+
+        text = aggregator.to_prometheus()
+        self.assertIn('pymisp_requests_total{endpoint="events/{id}",method="GET",status="200"} 5', text)
+        self.assertIn('pymisp_request_duration_seconds_count{endpoint="events/{id}",method="GET",phase="total"} 6', text)
+        self.assertIn('# TYPE pymisp_request_duration_seconds summary', text)
+
+    def test_disabled(self):
+        misp = PyMISP(self.server.url, self.server.key)
+        self.assertIsNone(misp.metrics)
+        self.assertEqual(misp.get_event(1)['Event']['info'], 'Metrics')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,7 @@ import json
 import sys
 from io import BytesIO
 
-from pymisp import MISPEvent, MISPSighting, MISPTag
+from pymisp import MISPEvent, MISPSighting, MISPTag, MISPAttribute
 from pymisp.exceptions import InvalidMISPObject
 
 
@@ -52,6 +52,69 @@ class TestMISPEvent(unittest.TestCase):
             ref_json = json.load(f)
         self.assertEqual(self.mispevent.to_json(), json.dumps(ref_json, sort_keys=True, indent=2))
 
+    def test_add_attributes(self):
+        self.init_event()
+        self.mispevent.add_attribute('ip-dst', '8.8.8.8')
+        new, duplicates = self.mispevent.add_attributes([
+            {'type': 'ip-dst', 'value': '8.8.8.8'}, {'type': 'ip-src', 'value': '8.8.8.8'},
+            {'type': 'domain', 'value': ['circl.lu', 'example.com', 'circl.lu']}])
+        self.assertEqual([a.value for a in new], ['8.8.8.8', 'circl.lu', 'example.com'])
+        self.assertEqual(duplicates, [{'type': 'ip-dst', 'value': '8.8.8.8'}, {'type': 'domain', 'value': 'circl.lu'}])
+        self.assertEqual(len(self.mispevent.attributes), 4)
+        # Attributes appended directly are taken into account
+        self.mispevent.add_attribute('port', 80)
+        new, duplicates = self.mispevent.add_attributes([{'type': 'port', 'value': '80'}, {'type': 'domain', 'value': 'circl.lu'}])
+        self.assertEqual((new, len(duplicates)), ([], 2))
+        new, duplicates = self.mispevent.add_attributes([{'type': 'domain', 'value': 'circl.lu'}], deduplicate=False)
+        self.assertEqual(len(new), 1)
+        self.assertEqual(len(self.mispevent.attributes), 6)
+        # Attributes removed from the list or edited in place
+        self.mispevent.attributes.pop(0)
+        self.mispevent.add_attribute('md5', 'd41d8cd98f00b204e9800998ecf8427e')
+        new, duplicates = self.mispevent.add_attributes([{'type': 'ip-dst', 'value': '8.8.8.8'}])
+        self.assertEqual((len(new), duplicates), (1, []))
+        new[0].value = '1.1.1.1'
+        new, duplicates = self.mispevent.add_attributes([{'type': 'ip-dst', 'value': '8.8.8.8'}, {'type': 'ip-dst', 'value': '1.1.1.1'}])
+        self.assertEqual(([a.value for a in new], duplicates), (['8.8.8.8'], [{'type': 'ip-dst', 'value': '1.1.1.1'}]))
+        # The keys are kept between the calls, only the new attributes are indexed
+        keys = self.mispevent._get_attribute_keys()
+        for i in range(3):
+            self.mispevent.add_attributes([{'type': 'ip-dst', 'value': '10.0.0.{}'.format(i)}])
+        self.assertIs(self.mispevent._get_attribute_keys(), keys)
+        self.assertIn(('ip-dst', '10.0.0.2'), keys)
+        attribute = self.mispevent.attributes.pop(0)
+        self.mispevent.attributes.append(attribute)
+        self.assertEqual(self.mispevent._get_attribute_keys(), keys)
+
+    def test_lazy(self):
+        eager = MISPEvent()
+        eager.load_file('tests/mispevent_testfiles/existing_event.json')
+        lazy = MISPEvent(lazy=True)
+        lazy.load_file('tests/mispevent_testfiles/existing_event.json')
+        self.assertEqual(list(lazy.attribute_fields()), list(eager.attribute_fields()))
+        fields = next(lazy.attribute_fields())
+        self.assertEqual((fields.type, fields.category, fields.to_ids), ('link', 'External analysis', False))
+        self.assertEqual(fields.tags, ('osint:source-type="blog-post"', 'osint:certainty="93"'))
+        # Nothing is created until the entities are accessed
+        self.assertTrue(all(isinstance(a, dict) for a in list.__iter__(lazy.attributes)))
+        self.assertIsInstance(lazy.attributes[1], MISPAttribute)
+        self.assertIsInstance(list.__getitem__(lazy.attributes, 0), dict)
+        # Checking the edit flag doesn't create the entities
+        self.assertFalse(lazy.edited)
+        self.assertIsInstance(list.__getitem__(lazy.attributes, 0), dict)
+        self.assertTrue(all(isinstance(o, dict) for o in list.__iter__(lazy.objects)))
+        self.assertEqual(lazy.objects[0].attributes[0].value, eager.objects[0].attributes[0].value)
+        self.assertEqual(len(lazy.attributes), len(eager.attributes))
+        self.assertEqual(lazy.to_json(), eager.to_json())
+        new, duplicates = lazy.add_attributes([{'type': 'link', 'value': eager.attributes[0].value}])
+        self.assertEqual(len(duplicates), 1)
+
+        lazy = MISPEvent(lazy=True)
+        lazy.load_file('tests/mispevent_testfiles/existing_event.json')
+        lazy.attributes[1].comment = 'edited'
+        self.assertTrue(lazy.edited)
+        self.assertIsInstance(list.__getitem__(lazy.attributes, 0), dict)
+
     def test_attribute(self):
         self.init_event()
         a = self.mispevent.add_attribute('filename', 'bar.exe')
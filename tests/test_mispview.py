@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+import json
+import unittest
+
+from pymisp import MISPEvent, EventView, view_attributes, view_events
+
+
+class TestMISPView(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/mispevent_testfiles/existing_event.json', 'r') as f:
+            self.event_dict = json.load(f)
+        self.event = MISPEvent()
+        self.event.load_file('tests/mispevent_testfiles/existing_event.json')
+
+    def test_event(self):
+        view = view_events({'response': [self.event_dict]})[0]
+        self.assertIs(view.to_dict(), self.event_dict['Event'])
+        for name in ('info', 'uuid', 'id', 'date', 'published', 'distribution', 'threat_level_id', 'analysis', 'timestamp'):
+            self.assertEqual(getattr(view, name), getattr(self.event, name), name)
+        self.assertEqual([t.name for t in view.tags], [t.name for t in self.event.tags])
+        self.assertEqual(view.Orgc['name'], self.event.Orgc['name'])
+        self.assertEqual(len(list(view.all_attributes())),
+                         len(self.event.attributes) + sum(len(o.attributes) for o in self.event.objects))
+        with self.assertRaises(AttributeError):
+            view.info = 'Read only'
+        with self.assertRaises(AttributeError):
+            view.does_not_exist
+        self.assertEqual(view.to_misp().to_json(), self.event.to_json())
+
+    def test_attributes(self):
+        view = EventView(self.event_dict)
+        for attribute, expected in zip(view.attributes, self.event.attributes):
+            for name in ('uuid', 'type', 'value', 'category', 'to_ids', 'comment', 'id', 'event_id', 'distribution', 'timestamp'):
+                self.assertEqual(getattr(attribute, name), getattr(expected, name), name)
+            self.assertEqual([t.name for t in attribute.tags], [t.name for t in expected.tags])
+        obj, expected = view.objects[0], self.event.objects[0]
+        self.assertEqual((obj.name, obj.uuid), (expected.name, expected.uuid))
+        self.assertEqual([a.value for a in obj.get_attributes_by_relation('filename')],
+                         [a.value for a in expected.get_attributes_by_relation('filename')])
+        attributes = view_attributes({'response': {'Attribute': self.event_dict['Event']['Attribute']}})
+        self.assertEqual(attributes[0].value, self.event.attributes[0].value)
+        self.assertEqual(attributes[0].to_misp().to_dict(), self.event.attributes[0].to_dict())
+
+    def test_index(self):
+        with open('tests/search_index_result.json', 'r') as f:
+            index = json.load(f)
+        events = view_events({'response': index})
+        self.assertEqual(len(events), len(index))
+        self.assertEqual(events[0].date, datetime.date(2016, 12, 1))
+        self.assertEqual(events[0].tags[0].name, 'TLP:GREEN')
+        self.assertEqual(events[0].attributes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from pymisp import MISPEvent
+from pymisp.tools.neo4j import event_to_rows, iter_event_rows, export_csv
+
+
+class TestNeo4j(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.events_dir = os.path.join(self.tmpdir, 'events')
+        os.makedirs(self.events_dir)
+        shutil.copy('tests/mispevent_testfiles/existing_event.json', self.events_dir)
+        self.event = MISPEvent()
+        self.event.load_file('tests/mispevent_testfiles/existing_event.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _read_csv(self, name):
+        with io.open(os.path.join(self.tmpdir, 'csv', '{}.csv'.format(name)), 'r', encoding='utf-8') as f:
+            return list(csv.reader(f))
+
+    def test_rows(self):
+        event_row, attribute_rows = event_to_rows(self.event)
+        self.assertEqual(event_row, {'uuid': self.event.uuid, 'info': self.event.info})
+        self.assertEqual(len(attribute_rows), len(self.event.attributes))
+        attribute = self.event.attributes[0]
+        self.assertEqual(attribute_rows[0], {'event_uuid': self.event.uuid, 'uuid': attribute.uuid, 'type': attribute.type,
+                                             'category': attribute.category, 'value': attribute.value})
+        paths = [os.path.join(self.events_dir, 'existing_event.json')]
+        self.assertEqual(list(iter_event_rows(paths, workers=1)), [(event_row, attribute_rows)])
+        self.assertEqual(list(iter_event_rows(paths, workers=2)), [(event_row, attribute_rows)])
+
+    def test_export_csv(self):
+        export_csv(self.events_dir, os.path.join(self.tmpdir, 'csv'), workers=1)
+        events = self._read_csv('events')
+        self.assertEqual(events, [['uuid:ID(Event)', 'name', ':LABEL'], [self.event.uuid, self.event.info, 'Event']])
+        attributes = self._read_csv('attributes')
+        self.assertEqual(attributes[0], ['uuid:ID(Attribute)', 'category', 'name', ':LABEL'])
+        self.assertEqual(len(attributes), len(self.event.attributes) + 1)
+        self.assertEqual(attributes[1], [self.event.attributes[0].uuid, self.event.attributes[0].category,
+                                         self.event.attributes[0].value, 'Attribute;{}'.format(self.event.attributes[0].type)])
+        values = set(a.value for a in self.event.attributes)
+        self.assertEqual(self._read_csv('values')[0], ['name:ID(Value)', ':LABEL'])
+        self.assertEqual(len(self._read_csv('values')), len(values) + 1)
+        self.assertEqual(self._read_csv('is_member')[0], [':START_ID(Event)', ':END_ID(Attribute)', ':TYPE'])
+        self.assertEqual(len(self._read_csv('is_member')), len(self.event.attributes) + 1)
+        self.assertEqual(self._read_csv('has')[0], [':START_ID(Event)', ':END_ID(Value)', ':TYPE'])
+        self.assertEqual(len(self._read_csv('has')), len(values) + 1)
+        self.assertEqual(self._read_csv('is')[0], [':START_ID(Attribute)', ':END_ID(Value)', ':TYPE'])
+        self.assertEqual(self._read_csv('is')[1], [self.event.attributes[0].uuid, self.event.attributes[0].value, 'is'])
+
+
+if __name__ == '__main__':
+    unittest.main()
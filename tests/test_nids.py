@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests_mock
+
+from pymisp import PyMISP
+from pymisp.metrics import MetricsAggregator
+from pymisp.tools.nids import NIDSExporter, rule_sid
+
+RULES = {
+    1: '# header\nalert tcp any any -> 1.2.3.4 any (msg: "MISP e1 1.2.3.4"; sid:1000001; rev:1;)\n'
+       'alert dns any any -> any any (msg: "MISP e1 evil.com"; sid:1000002; rev:1;)\n',
+    2: '# header\nalert tcp any any -> 1.2.3.4 any (msg: "MISP e1 1.2.3.4";  sid:1000001; rev:1;)\n'
+       'alert http any any -> any any (msg: "MISP e2 evil.com/foo"; sid:1000003; rev:1;)\n'
+       'alert http any any -> any any (msg: "MISP e2 other body, same sid"; sid:1000003; rev:1;)\n',
+}
+
+
+@requests_mock.Mocker()
+class TestNIDS(unittest.TestCase):
+
+    def setUp(self):
+        self.domain = 'http://misp.local/'
+        self.key = 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa'
+        with open(os.path.join(os.path.dirname(__file__), '..', 'pymisp', 'data', 'describeTypes.json'), 'r') as f:
+            self.types = json.load(f)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def initURI(self, m):
+        m.register_uri('GET', self.domain + 'servers/getVersion.json', json={"version": "2.4.62"})
+        m.register_uri('GET', self.domain + 'servers/getPyMISPVersion.json', json={"version": "2.4.62"})
+        m.register_uri('GET', self.domain + 'attributes/describeTypes.json', json=self.types)
+        for event_id, rules in RULES.items():
+            m.register_uri('GET', self.domain + 'events/nids/suricata/download/{}'.format(event_id), text=rules)
+        m.register_uri('GET', self.domain + 'events/nids/suricata/download/3', status_code=403, json={})
+        search_result = [{'Event': {'id': '1', 'Attribute': [{'to_ids': True}]}},
+                         {'Event': {'id': '2', 'Attribute': [], 'Object': [{'Attribute': [{'to_ids': True}]}]}},
+                         {'Event': {'id': '4', 'Attribute': [{'to_ids': False}]}}]
+        m.register_uri('POST', self.domain + 'events/restSearch/download', json={'response': search_result})
+
+    def test_rule_sid(self, m):
+        self.assertEqual(rule_sid('alert ip any any -> any any (msg: "foo"; sid:42; rev:1;)'), 42)
+        self.assertIsNone(rule_sid('alert ip any any -> any any (msg: "nosid:1;";)'))
+
+    def test_export(self, m):
+        self.initURI(m)
+        aggregator = MetricsAggregator()
+        misp = PyMISP(self.domain, self.key, metrics=aggregator)
+        exporter = NIDSExporter(misp, workers=2)
+        self.assertEqual(exporter.search_events(tags='foo'), ['1', '2'])
+        path = os.path.join(self.tmp_dir, 'misp.rules')
+        stats = exporter.export(path, tags='foo')
+        self.assertEqual(stats, {'events': 2, 'rules': 3, 'duplicates': 2})
+        with open(path) as f:
+            rules = [line for line in f.read().splitlines() if line and not line.startswith('#')]
+        self.assertEqual(sorted(rule_sid(r) for r in rules), [1000001, 1000002, 1000003])
+        # The rules are downloaded through the PyMISP instance
+        self.assertEqual(aggregator.summary()[('GET', 'events/nids/suricata/download/{id}')]['count'], 2)
+        self.assertEqual(m.last_request.headers['Authorization'], self.key)
+
+        stats = exporter.export(path, event_ids=[1, 2], exclude=['2'])
+        self.assertEqual(stats['rules'], 2)
+        self.assertRaises(Exception, exporter.export, path, event_ids=[1, 3])
+        # The previous file is untouched on failure
+        with open(path) as f:
+            self.assertEqual(len([line for line in f.read().splitlines() if line.startswith('alert')]), 2)
+        self.assertEqual(os.listdir(self.tmp_dir), ['misp.rules'])
+
+
+if __name__ == '__main__':
+    unittest.main()
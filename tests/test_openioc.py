@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pymisp.tools import openioc
+
+IOC = '''<?xml version="1.0" encoding="us-ascii"?>
+<ioc xmlns="http://schemas.mandiant.com/2010/ioc" id="test">
+  <short_description>Test IOC</short_description>
+  <description>Some description</description>
+  <authored_by>Someone</authored_by>
+  <authored_date>2017-01-01T00:00:00</authored_date>
+  <definition>
+    <Indicator operator="OR" id="i1">
+      <IndicatorItem id="1" condition="is">
+        <Context document="FileItem" search="FileItem/Md5sum" type="mir"/>
+        <Content type="md5">0123456789abcdef0123456789abcdef</Content>
+      </IndicatorItem>
+      <IndicatorItem id="2" condition="is">
+        <Context document="PortItem" search="PortItem/remoteIP" type="mir"/>
+        <Content type="IP">10.0.0.1:443</Content>
+      </IndicatorItem>
+      <IndicatorItem id="3" condition="is">
+        <Context document="Foo" search="Foo/Bar" type="mir"/>
+        <Content type="string">unknown</Content>
+      </IndicatorItem>
+      <Indicator operator="AND" id="i2">
+        <IndicatorItem id="4" condition="is">
+          <Context document="FileItem" search="FileItem/Md5sum" type="mir"/>
+          <Content type="md5">fedcba9876543210fedcba9876543210</Content>
+        </IndicatorItem>
+        <IndicatorItem id="5" condition="is">
+          <Context document="FileItem" search="FileItem/FileName" type="mir"/>
+          <Content type="string">evil.exe</Content>
+        </IndicatorItem>
+      </Indicator>
+    </Indicator>
+  </definition>
+</ioc>
+'''
+
+
+class TestOpenIOC(unittest.TestCase):
+
+    def test_get_mapping(self):
+        self.assertEqual(openioc.get_mapping('fileitem/md5SUM'), {'type': 'md5'})
+        self.assertFalse(openioc.get_mapping('Foo/Bar'))
+        self.assertEqual(openioc.get_composite_mapping('FileItem/Md5sum', 'FileItem/FileName'), ({'type': 'filename|md5'}, True))
+
+    def test_streaming(self):
+        event = openioc.load_openioc_stream(IOC)
+        self.assertEqual(event.info, 'Test IOC')
+        self.assertEqual(event.date.isoformat(), '2017-01-01')
+        attributes = sorted((a.category, a.type, a.value) for a in event.attributes)
+        self.assertEqual(attributes, [('External analysis', 'other', 'unknown'),
+                                      ('Network activity', 'ip-dst|port', '10.0.0.1|443'),
+                                      ('Other', 'comment', 'Some description'),
+                                      ('Other', 'comment', 'Someone'),
+                                      ('Payload delivery', 'filename|md5', 'evil.exe|fedcba9876543210fedcba9876543210'),
+                                      ('Payload delivery', 'md5', '0123456789abcdef0123456789abcdef')])
+
+    @unittest.skipUnless(openioc.has_bs4, 'BeautifulSoup is required')
+    def test_streaming_same_as_bs4(self):
+        streamed = openioc.load_openioc_stream(IOC)
+        soup = openioc.load_openioc(IOC)
+        self.assertEqual(sorted((a.type, a.value) for a in streamed.attributes),
+                         sorted((a.type, a.value) for a in soup.attributes))
+
+
+if __name__ == '__main__':
+    unittest.main()
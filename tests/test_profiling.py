@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pymisp import MISPEvent
+from pymisp.profiling import PhaseProfiler, has_tracemalloc, phase
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.event = json.dumps({'Event': {
+            'info': 'Profiling', 'date': '2017-12-01', 'Tag': [{'name': 'tlp:white'}],
+            'Attribute': [{'type': 'ip-dst', 'value': '8.8.8.{}'.format(i)} for i in range(5)],
+            'Object': [{'name': 'unknown-object', 'Attribute': [{'type': 'domain', 'value': 'example.com', 'object_relation': 'domain'}]}]}})
+
+    def test_phases(self):
+        profiler = PhaseProfiler()
+        with profiler:
+            event = MISPEvent()
+            event.load(self.event)
+            event.to_json()
+        stats = dict((row['phase'], row) for row in profiler.summary())
+        for name in ('event.json_decode', 'event.schema_validation', 'event.from_dict', 'tag.create', 'object.create',
+                     'object.add_attribute', 'to_json'):
+            self.assertEqual(stats[name]['count'], 1, name)
+        self.assertEqual(stats['attribute.create']['count'], 5)
+        # The object attribute loads describeTypes.json too
+        self.assertEqual(stats['attribute.describe_types']['count'], 6)
+        self.assertLessEqual(stats['event.from_dict']['own'], stats['event.from_dict']['total'])
+        self.assertIn('event.from_dict', profiler.format_table())
+
+        # Nothing is recorded once the profiler is inactive
+        MISPEvent().load(self.event)
+        self.assertEqual(dict((row['phase'], row) for row in profiler.summary())['event.from_dict']['count'], 1)
+
+    def test_pstats(self):
+        profiler = PhaseProfiler()
+        with profiler:
+            MISPEvent().load(self.event)
+        stats = profiler.to_pstats()
+        self.assertIn(('pymisp', 0, 'attribute.create'), stats.stats)
+        callers = stats.stats[('pymisp', 0, 'attribute.create')][4]
+        self.assertIn(('pymisp', 0, 'event.from_dict'), callers)
+        directory = tempfile.mkdtemp()
+        try:
+            profiler.dump_stats(os.path.join(directory, 'phases.prof'))
+            self.assertTrue(os.path.getsize(os.path.join(directory, 'phases.prof')) > 0)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_sampling(self):
+        profiler = PhaseProfiler(sample_rate=0, seed=1)
+        with profiler.sample():
+            with phase('to_json'):
+                pass
+        self.assertEqual(profiler.summary(), [])
+        profiler.sample_rate = 1
+        with profiler.sample():
+            with phase('to_json'):
+                pass
+        self.assertEqual(profiler.summary()[0]['count'], 1)
+
+    @unittest.skipUnless(has_tracemalloc, 'tracemalloc is required')
+    def test_allocations(self):
+        profiler = PhaseProfiler(track_allocations=True)
+        with profiler:
+            MISPEvent().load(self.event)
+        stats = dict((row['phase'], row) for row in profiler.summary())
+        self.assertGreater(stats['event.from_dict']['allocated'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
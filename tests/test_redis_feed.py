@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+from contextlib import contextmanager
+
+example_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples', 'feed-generator-from-redis')
+
+
+def _load_fromredis():
+    # The example reads its configuration from a settings module
+    settings = types.ModuleType('settings')
+    settings.host, settings.port, settings.db = '127.0.0.1', 6379, 0
+    settings.keyname_pop = ['test']
+    settings.keyname_error = 'test-error'
+    settings.batch_size = 2
+    settings.flushing_interval = 0
+    settings.compaction_interval = 3600
+    settings.daily_event_name = 'Test feed'
+    settings.org_name, settings.org_uuid = 'Test', ''
+    settings.analysis, settings.threat_level_id, settings.published = 0, 3, False
+    settings.Tag = []
+    settings.constructor_dict = {}
+    sys.modules.setdefault('settings', settings)
+    sys.path.insert(0, example_dir)
+    try:
+        import fromredis
+    finally:
+        sys.path.remove(example_dir)
+    return fromredis
+
+
+def _slice(items, start, end):
+    """Items from start to end (inclusive, negative indexes from the end), as LRANGE and LTRIM"""
+    start = max(start + len(items) if start < 0 else start, 0)
+    end = end + len(items) if end < 0 else end
+    return items[start:end + 1]
+
+
+class FakeRedis(object):
+    """In memory redis, only the list commands used by the feed generator"""
+
+    def __init__(self):
+        self.lists = {}
+
+    def lpush(self, key, *values):
+        for value in values:
+            self.lists.setdefault(key, []).insert(0, value)
+
+    def lrange(self, key, start, end):
+        return _slice(self.lists.get(key, []), start, end)
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = _slice(self.lists.get(key, []), start, end)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline(object):
+
+    def __init__(self, serv):
+        self.serv = serv
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        return [getattr(self.serv, name)(*args) for name, args in self.commands]
+
+
+class FakeGenerator(object):
+
+    def __init__(self):
+        self.attributes = []
+        self.batches = 0
+
+    @contextmanager
+    def batch(self):
+        yield self
+        self.batches += 1
+
+    def add_attribute_to_event(self, attr_type, attr_value, **attr_data):
+        self.attributes.append((attr_type, attr_value))
+        return True
+
+
+class TestRedisToMISPFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.fromredis = _load_fromredis()
+        self.serv = FakeRedis()
+        self.generator = FakeGenerator()
+        self.feed = self.fromredis.RedisToMISPFeed(serv=self.serv, generator=self.generator)
+
+    def test_consume_once(self):
+        key = 'test_attribute'
+        self.serv.lpush(key, json.dumps({'type': 'ip-dst', 'value': '1.1.1.1'}), 'not json')
+        self.serv.lpush(key, *[json.dumps({'type': 'ip-dst', 'value': '8.8.8.{}'.format(i)}) for i in range(3)])
+        # The first batch only has a valid item, the drain goes on
+        self.assertEqual(self.feed.consume_once(), 4)
+        self.assertEqual(self.generator.attributes, [('ip-dst', '1.1.1.1'), ('ip-dst', '8.8.8.0'),
+                                                     ('ip-dst', '8.8.8.1'), ('ip-dst', '8.8.8.2')])
+        self.assertEqual(self.generator.batches, 3)
+        self.assertEqual(self.serv.lists[key], [])
+        self.assertEqual(len(self.serv.lists['test-error']), 1)
+        self.assertEqual(self.feed.consume_once(), 0)
+
+    def test_pop(self):
+        key = 'test_attribute'
+        self.serv.lpush(key, *[json.dumps({'value': i}) for i in range(3)])
+        self.assertEqual(self.feed.pop(key), {'value': 0})
+        self.assertEqual(self.feed.pop_batch(key, 5), [{'value': 1}, {'value': 2}])
+        self.assertIsNone(self.feed.pop(key))
+
+    def test_throughput(self):
+        self.serv.lpush('test_attribute', *[json.dumps({'type': 'ip-dst', 'value': '8.8.8.{}'.format(i)}) for i in range(3)])
+        self.feed.consume_once()
+        self.assertGreater(self.feed.throughput(), 0)
+        # Reading the throughput doesn't reset it
+        self.assertIn('3 items processed', self.feed.format_last_action())
+        self.assertGreater(self.feed.throughput(), 0)
+
+
+class TestFeedGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.fromredis = _load_fromredis()
+        self.outputdir = tempfile.mkdtemp()
+        self.fromredis.settings.outputdir = self.outputdir
+
+    def tearDown(self):
+        shutil.rmtree(self.outputdir)
+
+    def test_recover(self):
+        generator = self.fromredis.FeedGenerator()
+        generator.add_attribute_to_event('ip-dst', '8.8.8.8')
+        event_uuid = generator.current_event_uuid
+        self.assertTrue(os.path.exists(os.path.join(self.outputdir, event_uuid + '.journal')))
+        self.assertFalse(os.path.exists(os.path.join(self.outputdir, 'hashes.csv')))
+
+        # Crash before the compaction: the restart replays the journal, and saves its hashes
+        generator = self.fromredis.FeedGenerator()
+        self.assertEqual([a.value for a in generator.current_event.attributes], ['8.8.8.8'])
+        self.assertFalse(os.path.exists(os.path.join(self.outputdir, event_uuid + '.journal')))
+        with open(os.path.join(self.outputdir, 'hashes.csv')) as f:
+            self.assertEqual(f.read().split(), ['{},{}'.format(hashlib.md5(b'8.8.8.8').hexdigest(), event_uuid)])
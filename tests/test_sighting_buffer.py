@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from pymisp import PyMISP, MISPSighting
+from pymisp.tools.sighting_buffer import SightingBuffer
+
+from tests.misp_stub_server import MISPStubServer
+
+
+class FailingMISP(object):
+
+    def __init__(self):
+        self.calls = []
+        self.fail = True
+
+    def set_sightings(self, sighting):
+        self.calls.append(sighting)
+        if self.fail:
+            raise IOError('Connection refused')
+        return {'message': 'Sighting added.'}
+
+
+class TestSightingBuffer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MISPStubServer().start()
+        cls.server.load_events([{'Event': {'info': 'Sightings', 'Attribute': [
+            {'type': 'ip-dst', 'value': '8.8.8.8'}, {'type': 'domain', 'value': 'evil.example.com'},
+            {'type': 'ip-dst', 'value': '9.9.9.9', 'uuid': '5a0c12b4-0a6c-4f6f-8a5e-2b1e0a6c4f6f'}]}}])
+        cls.misp = PyMISP(cls.server.url, cls.server.key)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.sightings = []
+
+    def test_coalesce(self):
+        sightings = SightingBuffer(self.misp, start=False)
+        for i in range(1000):
+            sightings.add(value='8.8.8.8', source='sensor', timestamp=1500000000 + i % 10)
+            sightings.add(value='evil.example.com', source='sensor', timestamp=1500000009)
+        sightings.add(uuid='5a0c12b4-0a6c-4f6f-8a5e-2b1e0a6c4f6f', source='sensor')
+        sighting = MISPSighting()
+        sighting.from_dict(value='8.8.8.8', source='other', type=1)
+        sightings.add_sighting(sighting)
+        self.assertEqual(len(sightings), 4)
+        self.assertIn({'value': '8.8.8.8', 'type': 0, 'source': 'sensor', 'timestamp': 1500000009, 'count': 1000},
+                      sightings.pending())
+
+        # One request for both values (same type and source), one for the UUID, one for the other source
+        self.assertEqual(sightings.flush(), 3)
+        self.assertEqual(len(sightings), 0)
+        self.assertEqual(sightings.stats['sent'], 4)
+        self.assertEqual(sightings.stats['coalesced'], 1998)
+        self.assertEqual(len(self.server.sightings), 4)
+        self.assertEqual(sorted((s['source'], s['type']) for s in self.server.sightings),
+                         [('other', '1'), ('sensor', '0'), ('sensor', '0'), ('sensor', '0')])
+        self.assertEqual([s['date_sighting'] for s in self.server.sightings
+                          if s['source'] == 'sensor' and s['attribute_id'] in ('1', '2')],
+                         ['1500000009', '1500000009'])
+
+        sightings.add(value='not-in-misp')
+        sightings.flush()
+        self.assertEqual(sightings.stats['rejected'], 1)
+
+    def test_background(self):
+        with SightingBuffer(self.misp, window=0.05, max_pending=10) as sightings:
+            threads = [threading.Thread(target=lambda: [sightings.add(value='value{}'.format(i)) for i in range(50)])
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(sightings), 0)
+        self.assertEqual(sightings.stats['added'], 200)
+        self.assertEqual(sightings.stats['sent'] + sightings.stats['rejected'], 200 - sightings.stats['coalesced'])
+
+    def test_backpressure(self):
+        misp = FailingMISP()
+        sightings = SightingBuffer(misp, max_pending=2, start=False)
+        self.assertTrue(sightings.add(value='a'))
+        self.assertTrue(sightings.add(value='b', timestamp=1))
+        self.assertTrue(sightings.add(value='a'))
+        self.assertFalse(sightings.add(value='c', block=False))
+        self.assertEqual(misp.calls, [])
+
+        # Without background thread, add flushes: the failed requests are kept for the next flush
+        self.assertFalse(sightings.add(value='c'))
+        self.assertEqual(len(sightings), 2)
+        self.assertEqual(sightings.stats['retried'], 2)
+        misp.fail = False
+        self.assertTrue(sightings.add(value='c'))
+        self.assertEqual(sightings.stats['sent'], 2)
+        self.assertEqual(len(sightings), 1)
+
+    def test_batches(self):
+        misp = FailingMISP()
+        misp.fail = False
+        sightings = SightingBuffer(misp, batch_size=2, start=False)
+        for i, value in enumerate(['a', 'b', 'c']):
+            sightings.add(value=value, source='sensor', timestamp=1500000000 + i * 5)
+        sightings.add(value='d', source='sensor', type=1, timestamp=1500000000)
+        self.assertEqual(sightings.flush(), 3)
+        self.assertEqual(misp.calls, [
+            {'values': ['a', 'b'], 'type': 0, 'source': 'sensor', 'timestamp': 1500000005},
+            {'values': ['c'], 'type': 0, 'source': 'sensor', 'timestamp': 1500000010},
+            {'values': ['d'], 'type': 1, 'source': 'sensor', 'timestamp': 1500000000}])
+
+        # Values seen at different times are sent with their own timestamp
+        misp.calls = []
+        sightings.add(value='a', timestamp=1500000000)
+        sightings.add(value='b', timestamp=1500000003)
+        sightings.add(value='c', timestamp=1500000030)
+        self.assertEqual(sightings.flush(), 2)
+        self.assertEqual([(c['values'], c['timestamp']) for c in misp.calls],
+                         [(['a', 'b'], 1500000003), (['c'], 1500000030)])
+        sightings.timestamp_tolerance = 0
+        misp.calls = []
+        sightings.add(value='a', timestamp=1500000000)
+        sightings.add(value='b', timestamp=1500000003)
+        self.assertEqual(sightings.flush(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
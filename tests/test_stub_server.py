@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+import requests
+
+from pymisp import PyMISP, MISPEvent, MISPObject
+
+from tests.misp_stub_server import MISPStubServer
+
+
+class TestStubServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MISPStubServer(seed=1).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.server.latency = self.server.error_rate = self.server.padding = 0
+        self.misp = PyMISP(self.server.url, self.server.key)
+
+    def _event(self):
+        event = MISPEvent()
+        event.info = 'Stub event'
+        event.add_attribute('ip-dst', '8.8.8.8', to_ids=True)
+        event.add_attribute('domain', 'example.com')
+        event.add_tag('tlp:white')
+        return self.misp.add_event(event)['Event']
+
+    def test_connection(self):
+        self.assertEqual(self.misp.describe_types, self.server.describe_types['result'])
+        self.assertEqual(self.server.requests[0], ('GET', '/servers/getPyMISPVersion.json'))
+        response = requests.get(self.server.url + 'events/1', headers={'Authorization': 'wrong'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_events(self):
+        event = self._event()
+        self.assertEqual(event['id'], '1')
+        self.assertEqual(len(event['Attribute']), 2)
+        self.assertEqual(self.misp.get_event(event['uuid'])['Event']['info'], 'Stub event')
+        self.misp.add_named_attribute(event['id'], 'url', ['http://a.example', 'http://b.example'])
+        self.assertEqual(len(self.misp.get_event(1)['Event']['Attribute']), 4)
+        self.misp.fast_publish(1)
+        self.assertTrue(self.misp.get_event(1)['Event']['published'])
+        self.assertEqual(self.misp.delete_attribute(event['Attribute'][0]['id'])['message'], 'Attribute deleted.')
+        self.assertEqual(self.misp.delete_event(1)['message'], 'Event deleted.')
+        self.assertIn('errors', self.misp.get_event(1))
+
+    def test_search(self):
+        self._event()
+        self.server.load_events([{'Event': {'info': 'Other', 'Attribute': [{'type': 'ip-dst', 'value': '1.1.1.1'}]}}])
+        self.assertEqual(len(self.misp.search(values='8.8.8.8')['response']), 1)
+        self.assertEqual(len(self.misp.search(tags='tlp:white')['response']), 1)
+        self.assertEqual(len(self.misp.search(type_attribute='ip-dst')['response']), 2)
+        attributes = self.misp.search(controller='attributes', values='1.1.%')['response']['Attribute']
+        self.assertEqual([a['value'] for a in attributes], ['1.1.1.1'])
+        self.assertEqual(len(self.misp.get_index()['response']), 2)
+
+    def test_objects_sightings_tags(self):
+        event = self._event()
+        obj = MISPObject('file', standalone=True, strict=False)
+        obj.add_attribute('filename', value='foo.exe', type='filename')
+        self.assertEqual(self.misp.add_object(event['id'], obj)['Object']['id'], '1')
+        self.assertEqual(len(self.misp.get_event(1)['Event']['Object']), 1)
+        self.misp.sighting(value='8.8.8.8', source='test')
+        self.assertEqual(len(self.misp.sighting_list(1, scope='event')['response']), 1)
+        self.misp.tag(event['uuid'], 'tlp:green')
+        self.assertEqual(sorted(t['name'] for t in self.misp.get_all_tags()['Tag']), ['tlp:green', 'tlp:white'])
+        self.assertEqual(len(self.misp.get_event(1)['Event']['Tag']), 2)
+
+    def test_feeds(self):
+        self.misp.add_feed('misp', 'https://www.circl.lu/doc/misp/feed-osint', 'CIRCL', 'network', 'CIRCL')
+        self.assertEqual(self.misp.get_feeds_list()['response'][0]['Feed']['name'], 'CIRCL')
+        self.assertEqual(self.misp.get_feed(1)['Feed']['provider'], 'CIRCL')
+        self.misp.delete_feed(1)
+        self.assertEqual(self.misp.get_feeds_list()['response'], [])
+
+    def test_knobs(self):
+        self.server.fail_next(1, 500)
+        self.assertIn('errors', self.misp.get_index())
+        self.assertNotIn('errors', self.misp.get_index())
+        self.server.padding = 1024 * 1024
+        response = requests.get(self.server.url + 'tags', headers={'Authorization': self.server.key})
+        self.assertGreater(len(response.content), 1024 * 1024)
+        self.assertEqual(response.json(), {'Tag': []})
+        self.server.padding = 0
+        self.server.latency = 0.05
+        start = time.time()
+        self.misp.get_index()
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()